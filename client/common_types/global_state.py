@@ -3,6 +3,7 @@ from typing import Literal
 from common_types.game_types import Pair
 from games.stratego.stratego_types import StrategoColor, StrategoBoard, StrategoMoveResult, StrategoRenderedTile, toggle_color
 from games.secret_game.secret_game_types import SecretGamePlayer, SecretGameMap, TurnState
+from games.secret_game.car_interpolation import CarInterpolationBuffer, CarSnapshot
 from games.lore.lore_types import LoreKind, LoreMap, map_pos_to_real_pos
 
 ValidState = Literal[
@@ -39,6 +40,13 @@ class StrategoGlobalState:
 
         self.current_move_result: StrategoMoveResult | None = None
 
+        # Set when a board update was missed. The client then asks the server for a full snapshot of the board.
+        self.needs_board_resync = False
+
+        # Set once the client asked for a snapshot, until it arrives. Missed updates are not asked for again meanwhile, 
+        # since the snapshot replaces the whole board anyways.
+        self.is_board_resync_pending = False
+
         self.ui_scale = ui_scale
 
 
@@ -72,10 +80,19 @@ class SecretGameGlobalState:
         self.turn_state: TurnState = 'straight'
 
         self.countdown: int | None = None
+        self.race_started = False
+
+        # The car states received from the server, used to smooth out the cars' movement between updates.
+        self.car_buffers = [CarInterpolationBuffer() for _ in players]
 
         self.ui_scale = ui_scale
 
 
+    def record_car_snapshot(self, player_idx: int, now: float):
+        player = self.players[player_idx]
+        self.car_buffers[player_idx].add(CarSnapshot(now, player.position[0], player.position[1], player.facing_angle))
+
+
     def get_own_data(self) -> SecretGamePlayer:
         return self.players[self.own_idx]
     
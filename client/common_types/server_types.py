@@ -1,3 +1,4 @@
+from typing import Literal
 from socket import socket
 
 BUF_SIZE = 1024
@@ -5,4 +6,9 @@ BUF_SIZE = 1024
 Size of the client-bound command buffer.
 """
 
-Connection = socket
\ No newline at end of file
+Connection = socket
+
+WireProtocol = Literal['text', 'bin1']
+"""
+The version of the client-bound protocol. `bin1` is a compact binary protocol (see `networking/binary_protocol.py`).
+"""
@@ -0,0 +1,147 @@
+"""
+Smooths the rendering of the Secret Game cars between the server's (infrequent) car state updates.
+
+* The opponent's car is rendered slightly in the past (:py:data:`INTERPOLATION_DELAY_SECS`), interpolating between
+  the two received snapshots around that time.
+* The player's own car is predicted ahead of the latest snapshot (dead reckoning) using the local turn input,
+  so that turning feels immediate.
+"""
+
+import math
+from collections import deque
+from dataclasses import dataclass
+from games.secret_game.secret_game_types import TurnState, DEFAULT_SPEED, TURN_SPEED
+
+INTERPOLATION_DELAY_SECS = 0.1
+"""
+How far in the past the other cars are rendered. Should be about two server send intervals, so
+that there is almost always a newer snapshot to interpolate towards.
+"""
+
+MAX_EXTRAPOLATION_SECS = 0.25
+"""
+How long a car keeps moving past its latest snapshot (i.e. when updates are late) before it stops.
+"""
+
+PREDICTION_STEP_SECS = 1 / 60
+"""
+Matches the server's simulation timestep, so that the prediction follows the same path as the server.
+"""
+
+SNAPSHOT_BUFFER_SIZE = 16
+
+@dataclass
+class CarSnapshot:
+    """
+    The state of a car received from the server, timestamped with the client's :py:func:`time.perf_counter` time.
+    """
+    time: float
+    x: float
+    y: float
+    angle: float
+
+
+def lerp_angle(a: float, b: float, t: float) -> float:
+    """
+    Interpolates between two angles (in radians) along the shortest arc.
+    """
+    diff = (b - a + math.pi) % math.tau - math.pi
+    return (a + diff * t) % math.tau
+
+
+class CarInterpolationBuffer:
+    """
+    The latest snapshots received for a car.
+    """
+
+    def __init__(self):
+        self.snapshots: deque[CarSnapshot] = deque(maxlen=SNAPSHOT_BUFFER_SIZE)
+
+
+    def add(self, snapshot: CarSnapshot):
+        self.snapshots.append(snapshot)
+
+
+    def estimate_speed(self) -> float:
+        """
+        Estimates the car's current speed using the last two snapshots. This accounts for the car
+        being slowed down by a wall. Teleports (i.e. respawning) are clamped to the default speed.
+        """
+        if len(self.snapshots) < 2:
+            return 0.0
+
+        older, newer = self.snapshots[-2], self.snapshots[-1]
+        dt = newer.time - older.time
+
+        if dt <= 0.0:
+            return 0.0
+
+        distance = math.hypot(newer.x - older.x, newer.y - older.y)
+        return min(distance / dt, DEFAULT_SPEED)
+
+
+    def sample(self, render_time: float) -> CarSnapshot | None:
+        """
+        Interpolates the car's state at :py:attr:`render_time`. Past the latest snapshot, the car keeps
+        moving in a straight line (for up to :py:data:`MAX_EXTRAPOLATION_SECS`).
+        """
+        if len(self.snapshots) == 0:
+            return None
+
+        if render_time <= self.snapshots[0].time:
+            return self.snapshots[0]
+
+        # Find the two snapshots around the render time (starting from the newest ones).
+        for i in range(len(self.snapshots) - 1, 0, -1):
+            older, newer = self.snapshots[i - 1], self.snapshots[i]
+
+            if older.time <= render_time <= newer.time:
+                span = newer.time - older.time
+                t = (render_time - older.time) / span if span > 0.0 else 1.0
+
+                return CarSnapshot(
+                    time=render_time,
+                    x=older.x + (newer.x - older.x) * t,
+                    y=older.y + (newer.y - older.y) * t,
+                    angle=lerp_angle(older.angle, newer.angle, t),
+                )
+
+        latest = self.snapshots[-1]
+        elapsed = min(render_time - latest.time, MAX_EXTRAPOLATION_SECS)
+        speed = self.estimate_speed()
+
+        return CarSnapshot(
+            time=render_time,
+            x=latest.x + math.cos(latest.angle) * speed * elapsed,
+            y=latest.y + math.sin(latest.angle) * speed * elapsed,
+            angle=latest.angle,
+        )
+
+
+    def predict(self, now: float, turn_state: TurnState) -> CarSnapshot | None:
+        """
+        Predicts the car's current state from its latest snapshot (dead reckoning), by simulating the
+        time since the snapshot in the same way as the server, using the locally known turn state.
+        """
+        if len(self.snapshots) == 0:
+            return None
+
+        latest = self.snapshots[-1]
+        remaining = min(now - latest.time, MAX_EXTRAPOLATION_SECS)
+
+        speed = self.estimate_speed()
+        angle_sign = 0.0 if turn_state == 'straight' else (1.0 if turn_state == 'right' else -1.0)
+
+        x, y, angle = latest.x, latest.y, latest.angle
+
+        # Same order as the server: move using the current angle, then turn.
+        while remaining > 0.0:
+            dt = min(remaining, PREDICTION_STEP_SECS)
+
+            x += math.cos(angle) * speed * dt
+            y += math.sin(angle) * speed * dt
+            angle = (angle + TURN_SPEED * angle_sign * dt) % math.tau
+
+            remaining -= dt
+
+        return CarSnapshot(time=now, x=x, y=y, angle=angle)
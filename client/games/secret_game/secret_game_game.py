@@ -6,14 +6,46 @@ from pathlib import Path
 from ui.drawing_utils import draw_sprite_on_surface, draw_text
 from common_types.game_types import SCREEN_WIDTH, SCREEN_HEIGHT, Pair
 from games.secret_game.secret_game_types import get_map_tile_sprite_name, map_pos_to_real_position, real_position_to_map_pos, MAP_RESOLUTION, TurnState
+from games.secret_game.car_interpolation import INTERPOLATION_DELAY_SECS
 import math
+import time
 
 SPITE_FOLDER = Path(__file__).parent / "assets" 
 
-def draw_map(surface: Surface, global_game_data: SecretGameGlobalState, camera_offset: Pair):
+def get_car_render_states(global_game_data: SecretGameGlobalState, now: float) -> list[tuple[Pair, float]]:
+    """
+    Gets the position and angle at which each car should be rendered. The own car is predicted from its 
+    latest server state using the local turn input, the other cars are interpolated slightly in the past 
+    (see :py:mod:`games.secret_game.car_interpolation`). Falls back to the latest server state.
+    """
+    render_states: list[tuple[Pair, float]] = []
+
+    for player_idx, player in enumerate(global_game_data.players):
+        car_buffer = global_game_data.car_buffers[player_idx]
+
+        # The cars do not move before the race starts.
+        if not global_game_data.race_started:
+            snapshot = None
+
+        elif player_idx == global_game_data.own_idx:
+            snapshot = car_buffer.predict(now, global_game_data.turn_state)
+
+        else:
+            snapshot = car_buffer.sample(now - INTERPOLATION_DELAY_SECS)
+
+        if snapshot is None:
+            render_states.append((player.position, player.facing_angle))
+
+        else:
+            render_states.append(((round(snapshot.x), round(snapshot.y)), snapshot.angle))
+
+    return render_states
+
+
+def draw_map(surface: Surface, global_game_data: SecretGameGlobalState, camera_offset: Pair, camera_pos: Pair):
     tiles = global_game_data.map.tiles
 
-    own_map_pos = real_position_to_map_pos(global_game_data.get_own_data().position)
+    own_map_pos = real_position_to_map_pos(camera_pos)
 
     min_vis_map_x = max(0, own_map_pos[0] - SCREEN_WIDTH // 2 // MAP_RESOLUTION - 1)
     max_vis_map_x = min(len(tiles[0]), own_map_pos[0] + SCREEN_WIDTH // 2 // MAP_RESOLUTION + 1)
@@ -38,18 +70,18 @@ def draw_map(surface: Surface, global_game_data: SecretGameGlobalState, camera_o
             )
 
 
-def draw_players(surface: Surface, global_game_data: SecretGameGlobalState, camera_offset: Pair):
-    p1 = global_game_data.players[0]
-    p2 = global_game_data.players[1]
+def draw_players(surface: Surface, global_game_data: SecretGameGlobalState, camera_offset: Pair, render_states: list[tuple[Pair, float]]):
+    p1_position, p1_angle = render_states[0]
+    p2_position, p2_angle = render_states[1]
 
-    p1_angle_deg = -(p1.facing_angle * 180 / math.pi)
-    p2_angle_deg = -(p2.facing_angle * 180 / math.pi)
+    p1_angle_deg = -(p1_angle * 180 / math.pi)
+    p2_angle_deg = -(p2_angle * 180 / math.pi)
 
     p1_sprite_path = f"{SPITE_FOLDER}/player_01.png"
     p2_sprite_path = f"{SPITE_FOLDER}/player_02.png"
 
-    p1_draw_location = (p1.position[0] + camera_offset[0] + MAP_RESOLUTION // 2, p1.position[1] + camera_offset[1] + MAP_RESOLUTION // 2)
-    p2_draw_location = (p2.position[0] + camera_offset[0] + MAP_RESOLUTION // 2, p2.position[1] + camera_offset[1] + MAP_RESOLUTION // 2)
+    p1_draw_location = (p1_position[0] + camera_offset[0] + MAP_RESOLUTION // 2, p1_position[1] + camera_offset[1] + MAP_RESOLUTION // 2)
+    p2_draw_location = (p2_position[0] + camera_offset[0] + MAP_RESOLUTION // 2, p2_position[1] + camera_offset[1] + MAP_RESOLUTION // 2)
 
     draw_sprite_on_surface(
         surface,
@@ -147,11 +179,14 @@ def secret_game_update(events: list[Event], surface: Surface, global_game_data:
     surface.fill((0, 0, 0))
     pygame.display.set_caption("Secret Game")
 
-    own_pos = global_game_data.get_own_data().position
+    render_states = get_car_render_states(global_game_data, time.perf_counter())
+
+    # The camera follows the rendered (predicted) own car, so that the car does not jitter on the screen.
+    own_pos = render_states[global_game_data.own_idx][0]
     camera_offset = (SCREEN_WIDTH // 2 - own_pos[0], SCREEN_HEIGHT // 2 - own_pos[1])
 
-    draw_map(surface, global_game_data, camera_offset)
-    draw_players(surface, global_game_data, camera_offset)
+    draw_map(surface, global_game_data, camera_offset, own_pos)
+    draw_players(surface, global_game_data, camera_offset, render_states)
 
     draw_race_start_countdown(surface, global_game_data)
     draw_lap_ui(surface, global_game_data)
@@ -1,8 +1,19 @@
 from dataclasses import dataclass
 from pathlib import Path
+import math
 from typing import Literal
 
 MAP_RESOLUTION = 32
+
+DEFAULT_SPEED = 10 * MAP_RESOLUTION
+"""
+The cars' speed (in pixels per second). Must match the server's.
+"""
+
+TURN_SPEED = math.pi
+"""
+The cars' turning speed (in radians per second). Must match the server's.
+"""
 MAP_FOLDER = Path(__file__).parent / "maps"
 
 TurnState = Literal['straight', 'left', 'right']
@@ -10,7 +10,7 @@ from pathlib import Path
 from common_types.global_state import StrategoGlobalState
 
 from .stratego_types import (StrategoRenderedTile, ROWS, COLS, GRID_START_LOCATION, SPRITE_WIDTH, 
-                             SPRITE_HEIGHT, StrategoColor, StrategoPieceName, get_full_color_name, parse_piece_from_encoded_str, assert_str_is_color, encoded_str_is_empty, encoded_str_is_lake)
+                             SPRITE_HEIGHT, StrategoColor, StrategoPieceName, get_full_color_name, parse_piece_from_encoded_str, assert_str_is_color, encoded_str_is_empty, encoded_str_is_lake, encoded_str_is_hidden)
 
 from common_types.game_types import Pair, row_col_to_flat_index, SCREEN_WIDTH
 import ui.drawing_utils as drawing_utils
@@ -255,7 +255,7 @@ def render_board_tiles(surface: Surface, global_game_data: StrategoGlobalState)
                     global_game_data.ui_scale,
                 )
 
-            elif (should_draw_own_piece_outside_of_attack or should_draw_pieces_involved_in_attack):
+            elif (should_draw_own_piece_outside_of_attack or should_draw_pieces_involved_in_attack) and not encoded_str_is_hidden(encoded_element_str):
                 color: StrategoColor = assert_str_is_color(encoded_element_str[0])
                 encoded_piece_str = encoded_element_str[1] # just the piece encoding without the color
 
@@ -107,6 +107,9 @@ class StrategoBoard:
 
     def __init__(self):
         self.elements = ['0' for _ in range(ROWS * COLS)]
+
+        # The sequence number of the last board update received from the server (only used with delta board sync).
+        self.seq = 0
         
     
     def to_socket_msg_repr(self) -> str:
@@ -123,6 +126,43 @@ class StrategoBoard:
         self.elements = _message_repr_to_flat_array(socket_repr)
 
 
+    def update_elements(self, elements: list[str]):
+        """
+        Updates the board's elements using the given (already parsed) flat array of elements.
+        """
+        self.elements = elements
+
+
+    def apply_snapshot(self, seq: int, elements: list[str]):
+        """
+        Replaces the whole board with a full snapshot sent by the server.
+        """
+        self.elements = elements
+        self.seq = seq
+
+
+    def apply_delta(self, seq: int, changes: list[tuple[int, str]]) -> bool:
+        """
+        Patches the changed cells (flat index, new value) in place. Returns `False` without changing the board 
+        if an update was missed (the sequence number is not the next one), in which case the board needs to be resynced.
+        """
+        if seq != self.seq + 1:
+            return False
+
+        for flat_idx, cell in changes:
+            self.elements[flat_idx] = cell
+
+        self.seq = seq
+        return True
+
+
+    def reveal_cell(self, flat_idx: int, element: str):
+        """
+        Reveals the identity of a piece (i.e. one involved in an attack) without it being a board update.
+        """
+        self.elements[flat_idx] = element
+
+
 class StrategoRenderedTile:
     """
     Used for detecting when a tile is clicked after it is rendered on the screen.
@@ -212,4 +252,11 @@ def encoded_str_is_empty(encoded_element_str: str):
 
 
 def encoded_str_is_lake(encoded_element_str: str):
-    return encoded_element_str == "XX"
\ No newline at end of file
+    return encoded_element_str == "XX"
+
+
+def encoded_str_is_hidden(encoded_element_str: str):
+    """
+    Opponent pieces that have not been revealed yet are sent without their identity (i.e. `"b?"`) by servers using fog of war.
+    """
+    return encoded_element_str[1:] == "?"
\ No newline at end of file
@@ -0,0 +1,179 @@
+"""
+This module contains the decoder for the compact binary (`bin1`) version of the client-bound commands.
+The server's encoder is in `server/wire_protocol.py`.
+
+Every `bin1` message is a frame: a header with the payload length (`u16`) and the frame kind (`u8`),
+followed by the payload. Frames with the `TEXT` kind contain a regular text command (without its terminator).
+"""
+
+import struct
+from dataclasses import dataclass
+from games.stratego.stratego_types import StrategoColor, ROWS, COLS
+
+BINARY_PROTOCOL_OPTION = 'bin1'
+"""
+The game request option (i.e. `?game+bin1`) that asks for the binary protocol.
+"""
+
+DELTA_BOARD_SYNC_OPTION = 'delta'
+"""
+The game request option (i.e. `?game+delta`) that asks for Stratego board updates to only contain the changed cells.
+"""
+
+FOG_OF_WAR_OPTION = 'fog'
+"""
+The game request option (i.e. `?game+fog`) that asks for a Stratego board where the opponent's pieces that 
+have not been revealed yet are hidden (i.e. `"b?"`).
+"""
+
+HEARTBEAT_OPTION = 'heartbeat'
+"""
+The game request option (i.e. `?game+heartbeat`) that asks the server to send a `?ping` every few seconds while 
+waiting for an opponent. The client answers each one with a `!pong`, so that the server can tell it is still alive.
+"""
+
+FRAME_HEADER = struct.Struct('!HB')
+CAR_STATE_PAYLOAD = struct.Struct('!Biif')
+BOARD_SYNC_HEADER = struct.Struct('!Ic')
+
+FRAME_KIND_TEXT = 0
+FRAME_KIND_TURN_INFO = 1
+FRAME_KIND_CAR_STATE = 2
+FRAME_KIND_BOARD_DELTA = 3
+FRAME_KIND_BOARD_SNAPSHOT = 4
+
+EMPTY_CELL_BYTE = 0
+LAKE_CELL_BYTE = 1
+BLUE_CELL_BIT = 0x80
+
+def _gen_cell_lookup_table() -> list[str]:
+    table = ['' for _ in range(256)]
+    table[LAKE_CELL_BYTE] = 'XX'
+
+    for piece_byte in range(2, BLUE_CELL_BIT):
+        table[piece_byte] = f"r{chr(piece_byte)}"
+        table[BLUE_CELL_BIT | piece_byte] = f"b{chr(piece_byte)}"
+
+    return table
+
+
+CELL_LOOKUP_TABLE = _gen_cell_lookup_table()
+"""
+Maps each board cell byte to the cell's string encoding (the same one used by `?turn-info`).
+"""
+
+
+@dataclass
+class TurnInfoFrame:
+    """
+    The decoded `bin1` version of `?turn-info`.
+    """
+    turn: StrategoColor
+    elements: list[str]
+
+
+@dataclass
+class CarStateFrame:
+    """
+    The decoded `bin1` replacement for the `?pos` and `?angle` commands of a single car.
+    """
+    player_idx: int
+    x: int
+    y: int
+    angle: float
+
+
+@dataclass
+class BoardSnapshotFrame:
+    """
+    The decoded `bin1` version of `?board-snapshot`.
+    """
+    seq: int
+    turn: StrategoColor
+    elements: list[str]
+
+
+@dataclass
+class BoardDeltaFrame:
+    """
+    The decoded `bin1` version of `?board-delta`. Contains the flat index and the new value of every changed cell.
+    """
+    seq: int
+    turn: StrategoColor
+    changes: list[tuple[int, str]]
+
+
+DecodedFrame = str | TurnInfoFrame | CarStateFrame | BoardSnapshotFrame | BoardDeltaFrame
+
+class FrameDecoder:
+    """
+    Splits a `bin1` byte stream into frames. Like :py:class:`networking.command_framer.CommandFramer`,
+    the received bytes are appended to a single `bytearray` and the consumed bytes are only removed once per call.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+
+    def feed(self, data: bytes) -> list[DecodedFrame]:
+        """
+        Adds the received data to the buffer and returns all the frames that it completed.
+        Text frames are returned as plain strings.
+        """
+        self._buffer += data
+
+        frames: list[DecodedFrame] = []
+        offset = 0
+
+        with memoryview(self._buffer) as view:
+            while len(view) - offset >= FRAME_HEADER.size:
+                payload_len, kind = FRAME_HEADER.unpack_from(view, offset)
+                payload_start = offset + FRAME_HEADER.size
+                payload_end = payload_start + payload_len
+
+                # The rest of the frame has not been received yet.
+                if payload_end > len(view):
+                    break
+
+                frames.append(decode_frame_payload(kind, view[payload_start:payload_end]))
+                offset = payload_end
+
+        del self._buffer[:offset]
+
+        return frames
+
+
+def decode_turn(turn_byte: int) -> StrategoColor:
+    return 'b' if turn_byte == ord('b') else 'r'
+
+
+def decode_frame_payload(kind: int, payload: memoryview) -> DecodedFrame:
+    if kind == FRAME_KIND_TEXT:
+        return str(payload, 'utf-8')
+
+    elif kind == FRAME_KIND_TURN_INFO:
+        elements = [CELL_LOOKUP_TABLE[cell] for cell in payload[1:1 + ROWS * COLS]]
+
+        return TurnInfoFrame(decode_turn(payload[0]), elements)
+
+    elif kind == FRAME_KIND_BOARD_SNAPSHOT:
+        seq, turn = BOARD_SYNC_HEADER.unpack_from(payload)
+        cells = payload[BOARD_SYNC_HEADER.size:BOARD_SYNC_HEADER.size + ROWS * COLS]
+
+        return BoardSnapshotFrame(seq, decode_turn(turn[0]), [CELL_LOOKUP_TABLE[cell] for cell in cells])
+
+    elif kind == FRAME_KIND_BOARD_DELTA:
+        seq, turn = BOARD_SYNC_HEADER.unpack_from(payload)
+        cells = payload[BOARD_SYNC_HEADER.size:]
+
+        # The changes are (flat index, cell) byte pairs.
+        changes = [(cells[i], CELL_LOOKUP_TABLE[cells[i + 1]]) for i in range(0, len(cells) - 1, 2)]
+
+        return BoardDeltaFrame(seq, decode_turn(turn[0]), changes)
+
+    elif kind == FRAME_KIND_CAR_STATE:
+        player_idx, x, y, angle = CAR_STATE_PAYLOAD.unpack(payload)
+
+        return CarStateFrame(player_idx, x, y, angle)
+
+    raise ValueError(f"unknown frame kind: {kind}")
@@ -1,9 +1,11 @@
 from common_types.global_state import GlobalClientState, SecretGameGlobalState, StrategoGlobalState, WordGolfGlobalState, LoreGlobalState, ValidState, SecretGamePlayer
 from typing import Callable
+import time
 from games.stratego.stratego_types import StrategoBoard, StrategoColor, StrategoMoveResult, assert_str_is_color, ROWS, COLS
 from games.secret_game.secret_game_types import SecretGameMap, get_map_path
 from games.lore import lore_unlocking
-from common_types.game_types import GameKind
+from common_types.game_types import GameKind, Pair, row_col_to_flat_index
+from networking.binary_protocol import DecodedFrame, TurnInfoFrame, CarStateFrame, BoardSnapshotFrame, BoardDeltaFrame
 
 import networking.validator as validator
 
@@ -22,8 +24,26 @@ class ServerCommandInterpreter:
         self.change_game_state = change_game_state
 
 
-    def interpret_server_command(self, data: str):
-        if data.startswith("?game-start"):
+    def interpret_server_command(self, data: DecodedFrame):
+        if isinstance(data, TurnInfoFrame):
+            self.update_using_stratego_turn_info(data.turn, data.elements)
+
+
+        elif isinstance(data, BoardSnapshotFrame):
+            self.apply_stratego_board_snapshot(data.seq, data.turn, data.elements)
+
+
+        elif isinstance(data, BoardDeltaFrame):
+            self.apply_stratego_board_delta(data.seq, data.turn, data.changes)
+
+
+        elif isinstance(data, CarStateFrame):
+            self.update_secret_game_player_position(data.player_idx, data.x, data.y)
+            self.update_secret_game_player_angle(data.player_idx, data.angle)
+            self.record_secret_game_car_snapshot(data.player_idx)
+
+
+        elif data.startswith("?game-start"):
             fields = validator.assert_field_min_amount_valid(data.split(':'), 3)
             game: GameKind = validator.assert_is_valid_game(fields[1])
 
@@ -64,15 +84,34 @@ class ServerCommandInterpreter:
         elif data.startswith("?turn-info"):
             fields = validator.assert_field_amount_valid(data.split(':'), 2 + ROWS * COLS)
             current_turn = assert_str_is_color(fields[1])
-            board_repr = ':'.join(fields[2:])
 
-            self.update_using_stratego_turn_info(current_turn, board_repr)
+            self.update_using_stratego_turn_info(current_turn, fields[2:])
+
+
+        elif data.startswith("?board-snapshot"):
+            fields = validator.assert_field_amount_valid(data.split(':'), 3 + ROWS * COLS)
+            seq = int(fields[1])
+            current_turn = assert_str_is_color(fields[2])
+
+            self.apply_stratego_board_snapshot(seq, current_turn, fields[3:])
+
+
+        elif data.startswith("?board-delta"):
+            fields = validator.assert_field_min_amount_valid(data.split(':'), 3)
+            seq = int(fields[1])
+            current_turn = assert_str_is_color(fields[2])
+
+            # The changed cells are (flat index, new value) pairs.
+            change_fields = fields[3:]
+            changes = [(int(change_fields[i]), change_fields[i + 1]) for i in range(0, len(change_fields) - 1, 2)]
+
+            self.apply_stratego_board_delta(seq, current_turn, changes)
 
 
         elif data.startswith("?move-result"):
             print(f"Received the following move result CMD: {data}")
 
-            fields = validator.assert_field_amount_valid(data.split(':'), 6)
+            fields = validator.assert_field_min_amount_valid(data.split(':'), 6)
             kind = fields[1]
             r_atk = int(fields[2])
             c_atk = int(fields[3])
@@ -80,6 +119,10 @@ class ServerCommandInterpreter:
             c_def = int(fields[5])
             move_result = StrategoMoveResult(kind=kind, attacking_pos=(r_atk, c_atk), defending_pos=(r_def, c_def)) # type: ignore
 
+            # Servers using fog of war also send the identity of the pieces involved in an attack.
+            if len(fields) == 8:
+                self.reveal_stratego_pieces([(move_result.attacking_pos, fields[6]), (move_result.defending_pos, fields[7])])
+
             self.receive_stratego_move_result(move_result)
 
 
@@ -160,7 +203,9 @@ class ServerCommandInterpreter:
             player_idx = int(fields[1])
             angle = float(fields[2])
 
+            # The server sends a car's `?angle` after its `?pos`, so the car's state is complete at this point.
             self.update_secret_game_player_angle(player_idx, angle)
+            self.record_secret_game_car_snapshot(player_idx)
 
         elif data.startswith("?lap-completion"):
             fields = validator.assert_field_amount_valid(data.split(':'), 3)
@@ -227,7 +272,40 @@ class ServerCommandInterpreter:
         self.change_game_state('in_secret_game')
 
 
-    def update_using_stratego_turn_info(self, current_turn: StrategoColor, board_repr: str):
+    def update_using_stratego_turn_info(self, current_turn: StrategoColor, board_elements: list[str]):
+        assert self.client_state.stratego_state, "Stratego state was None"
+
+        self.start_stratego_turn(current_turn)
+
+        # Update the board with the data from the server.
+        board: StrategoBoard = self.client_state.stratego_state.board
+        board.update_elements(board_elements)
+
+
+    def apply_stratego_board_snapshot(self, seq: int, current_turn: StrategoColor, board_elements: list[str]):
+        assert self.client_state.stratego_state, "Stratego state was None"
+
+        self.start_stratego_turn(current_turn)
+
+        self.client_state.stratego_state.board.apply_snapshot(seq, board_elements)
+        self.client_state.stratego_state.is_board_resync_pending = False
+
+
+    def apply_stratego_board_delta(self, seq: int, current_turn: StrategoColor, changes: list[tuple[int, str]]):
+        assert self.client_state.stratego_state, "Stratego state was None"
+
+        self.start_stratego_turn(current_turn)
+
+        # A board update was missed, so the board is out of sync until the server sends a snapshot.
+        if not self.client_state.stratego_state.board.apply_delta(seq, changes):
+            print(f"ERROR: missed a board update (expected #{self.client_state.stratego_state.board.seq + 1}, got #{seq})")
+
+            # Only ask once, the requested snapshot is on its way otherwise.
+            if not self.client_state.stratego_state.is_board_resync_pending:
+                self.client_state.stratego_state.needs_board_resync = True
+
+
+    def start_stratego_turn(self, current_turn: StrategoColor):
         assert self.client_state.stratego_state, "Stratego state was None"
 
         # Update the turn.
@@ -237,9 +315,12 @@ class ServerCommandInterpreter:
         # to be reset anyways due to the new turn).
         self.client_state.stratego_state.current_move_result = None
 
-        # Update the board with the data from the server.
-        board: StrategoBoard = self.client_state.stratego_state.board
-        board.update_elements_with_socket_repr(board_repr)
+
+    def reveal_stratego_pieces(self, revealed_pieces: list[tuple[Pair, str]]):
+        assert self.client_state.stratego_state, "Stratego state was None"
+
+        for (r, c), element in revealed_pieces:
+            self.client_state.stratego_state.board.reveal_cell(row_col_to_flat_index(r, c, COLS), element)
 
 
     def receive_stratego_move_result(self, move_result: StrategoMoveResult):
@@ -298,6 +379,17 @@ class ServerCommandInterpreter:
             self.client_state.word_golf_state.received_alerts\
                 .append(f"'{opp_username}' sent a word! Now you have {own_word_amt} words to solve.")
 
+        elif kind == "invalid-guess":
+            alert_fields = validator.assert_field_min_amount_valid(alert_fields, 3)
+            reason, guess = alert_fields[1], alert_fields[2]
+
+            if reason == "wrong-length":
+                alert = f"'{guess}' does not have the right amount of letters."
+            else:
+                alert = f"'{guess}' is not in the word list."
+
+            self.client_state.word_golf_state.received_alerts.append(alert)
+
         else:
             print(f"ERROR: unknown alert kind '{kind}'")
 
@@ -312,6 +404,7 @@ class ServerCommandInterpreter:
         assert self.client_state.secret_game_state, "Secret Game state was None"
 
         self.client_state.secret_game_state.countdown = None
+        self.client_state.secret_game_state.race_started = True
 
 
     def update_secret_game_player_position(self, player_idx: int, new_x: int, new_y: int):
@@ -326,6 +419,12 @@ class ServerCommandInterpreter:
         self.client_state.secret_game_state.players[player_idx].facing_angle = angle
 
 
+    def record_secret_game_car_snapshot(self, player_idx: int):
+        assert self.client_state.secret_game_state, "Secret Game state was None"
+
+        self.client_state.secret_game_state.record_car_snapshot(player_idx, time.perf_counter())
+
+
     def update_secret_game_player_lap_completion(self, player_idx: int, completed_laps: int):
         assert self.client_state.secret_game_state, "Secret Game state was None"
 
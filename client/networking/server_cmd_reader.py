@@ -1,14 +1,22 @@
 import socket
-from common_types.server_types import BUF_SIZE, Connection
+from common_types.server_types import BUF_SIZE, Connection, WireProtocol
+from networking.command_framer import CommandFramer
+from networking.binary_protocol import FrameDecoder, DecodedFrame
 from queue import Queue
 
 class ServerCommandReader:
-    def __init__(self, server_conn: Connection, valid_cmd_prefixes: tuple[str, ...], server_cmd_queue: Queue[str]):
+    def __init__(
+        self,
+        server_conn: Connection,
+        valid_cmd_prefixes: tuple[str, ...],
+        server_cmd_queue: Queue[DecodedFrame],
+        protocol: WireProtocol = 'text',
+    ):
         self.server_conn = server_conn
         self.valid_cmd_prefixes = valid_cmd_prefixes
         self.server_cmd_queue = server_cmd_queue
 
-        self.buffer = ""
+        self.framer = CommandFramer() if protocol == 'text' else FrameDecoder()
 
 
     def read_incoming_commands(self) -> bool:
@@ -17,26 +25,26 @@ class ServerCommandReader:
         """
 
         try:
-            data = self.server_conn.recv(BUF_SIZE).decode()
-            self.buffer += data
+            data = self.server_conn.recv(BUF_SIZE)
 
-            while (cmd_end := self.buffer.find('\\')) != -1:
-                server_cmd = self.buffer[:cmd_end]
-
-                self.buffer = self.buffer[cmd_end+1:] # +1 for skipping past the trailing `\`
+            for server_cmd in self.framer.feed(data):
+                # Binary frames are already decoded, so they are forwarded as-is.
+                if not isinstance(server_cmd, str):
+                    self.server_cmd_queue.put(server_cmd)
+                    continue
 
                 if not server_cmd.startswith('?'):
                     raise Exception(f"received invalid command: {server_cmd}")
-                
+
                 if server_cmd.startswith(self.valid_cmd_prefixes):
                     self.server_cmd_queue.put(server_cmd)
 
-                    if data.startswith("?game-over"):
+                    if server_cmd.startswith("?game-over"):
                         # Return `False` to signify that the client should stop.
                         return False
                 else:
-                    print(f"ERROR: received unknown data from server: '{data}'")
+                    print(f"ERROR: received unknown data from server: '{server_cmd}'")
 
             return True
 
-        except socket.timeout: return True
\ No newline at end of file
+        except socket.timeout: return True
@@ -4,15 +4,43 @@ Do not run this file directly. Instead call it as a library (e.g. `import socket
 
 import socket
 from queue import Queue
-from common_types.server_types import BUF_SIZE
+from common_types.server_types import BUF_SIZE, WireProtocol
 from networking.server_cmd_reader import ServerCommandReader
+from networking.binary_protocol import BINARY_PROTOCOL_OPTION, DELTA_BOARD_SYNC_OPTION, FOG_OF_WAR_OPTION, HEARTBEAT_OPTION, FRAME_HEADER, DecodedFrame, decode_frame_payload
 from games.stratego.stratego_types import StrategoStartingPlayerInfo
 from games.word_golf.word_golf_types import WordGolfStartingPlayerInfo
 from games.secret_game.secret_game_types import SecretGameStartingPlayerInfo
 
 PORT = 49300 # The port used by the server
 
-def connect(server_command_queue: Queue[str], client_queue: Queue[str]):
+PREFERRED_PROTOCOL: WireProtocol = 'text'
+"""
+The client-bound protocol asked for in the game request. Servers that do not support 
+the binary protocol keep using the text protocol, which the client then falls back to.
+"""
+
+USE_DELTA_BOARD_SYNC = True
+"""
+Asks the server to only send the changed cells of the Stratego board each turn. Servers that 
+do not support delta board sync keep sending the full board (which the client also handles).
+"""
+
+USE_FOG_OF_WAR = True
+"""
+Asks the server to hide the identity of the opponent's Stratego pieces (until they are revealed in an attack). 
+The client never draws the opponent's pieces outside of attacks, so this only makes the board smaller.
+"""
+
+USE_HEARTBEAT = True
+"""
+Asks the server to ping the client while it waits for an opponent, so that the server can tell a client that 
+is waiting apart from a dead connection. Servers that do not support heartbeats never send `?ping`.
+"""
+
+PING_CMD = "?ping"
+PONG_CMD = "!pong\\"
+
+def connect(server_command_queue: Queue[DecodedFrame], client_queue: Queue[str]):
     while True:
         
         # Wait for the client to decide to play.
@@ -43,7 +71,96 @@ def connect(server_command_queue: Queue[str], client_queue: Queue[str]):
                 print(f"ERROR: Unknown client message: '{client_msg}'")
 
 
-def connect_stratego(server_host: str, server_command_queue: Queue[str], client_queue: Queue[str], starting_player_info: StrategoStartingPlayerInfo):
+def get_game_request_prefix(delta_board_sync: bool = False, fog_of_war: bool = False) -> str:
+    """
+    Returns the first field of a game request, along with the options that the client wants (i.e. `?game+bin1+delta`).
+    """
+    fields = ["?game"]
+
+    if PREFERRED_PROTOCOL == 'bin1':
+        fields.append(BINARY_PROTOCOL_OPTION)
+
+    if delta_board_sync:
+        fields.append(DELTA_BOARD_SYNC_OPTION)
+
+    if fog_of_war:
+        fields.append(FOG_OF_WAR_OPTION)
+
+    if USE_HEARTBEAT:
+        fields.append(HEARTBEAT_OPTION)
+
+    return '+'.join(fields)
+
+
+def recv_exact(s: socket.socket, amt: int) -> bytes:
+    """
+    Receives exactly `amt` bytes (retrying on timeouts).
+    """
+    data = bytearray()
+
+    while len(data) < amt:
+        try:
+            chunk = s.recv(amt - len(data))
+
+            if not chunk:
+                raise ConnectionResetError("the server closed the connection")
+
+            data += chunk
+
+        except socket.timeout: pass
+
+    return bytes(data)
+
+
+def wait_for_game_start(s: socket.socket, server_command_queue: Queue[DecodedFrame]) -> WireProtocol:
+    """
+    Waits for the server to confirm that the game has started and forwards the game start command to the UI.
+    Returns the protocol that the server is using for the client-bound commands.
+    """
+    while True:
+        try:
+            peeked = s.recv(1, socket.MSG_PEEK)
+
+            if not peeked:
+                raise ConnectionResetError("the server closed the connection")
+
+            # Text commands always start with `?`, so anything else is a binary frame.
+            if peeked == b'?':
+                data = s.recv(BUF_SIZE).decode()
+
+                # The server pings the client until the game starts (see `USE_HEARTBEAT`).
+                while data.startswith(f"{PING_CMD}\\"):
+                    s.sendall(PONG_CMD.encode())
+                    data = data.removeprefix(f"{PING_CMD}\\")
+
+                if data == "":
+                    continue
+
+                if data.startswith("?game-start"):
+                    server_command_queue.put(data)
+                    return 'text'
+
+                print(f"ERROR: Unknown server response: '{data}'")
+
+            else:
+                # Only read the game start frame, the following frames are read by the command reader.
+                payload_len, kind = FRAME_HEADER.unpack(recv_exact(s, FRAME_HEADER.size))
+                frame = decode_frame_payload(kind, memoryview(recv_exact(s, payload_len)))
+
+                if frame == PING_CMD:
+                    s.sendall(PONG_CMD.encode())
+                    continue
+
+                if isinstance(frame, str) and frame.startswith("?game-start"):
+                    server_command_queue.put(frame)
+                    return 'bin1'
+
+                print(f"ERROR: Unknown server response: '{frame}'")
+
+        except socket.timeout: pass
+
+
+def connect_stratego(server_host: str, server_command_queue: Queue[DecodedFrame], client_queue: Queue[str], starting_player_info: StrategoStartingPlayerInfo):
     """
     Connects to the server. Sends commands from the server back 
     through the server command queue. Receives user messages from the client queue.
@@ -56,22 +173,10 @@ def connect_stratego(server_host: str, server_command_queue: Queue[str], client_
         s.settimeout(1.0)
 
         # Tell the server that this client wants to play Stratego under the given username and starting deck.
-        s.sendall(f"?game:stratego:{starting_player_info.username}:{starting_player_info.starting_deck_repr}".encode())
+        s.sendall(f"{get_game_request_prefix(delta_board_sync=USE_DELTA_BOARD_SYNC, fog_of_war=USE_FOG_OF_WAR)}:stratego:{starting_player_info.username}:{starting_player_info.starting_deck_repr}".encode())
 
         # Wait for the server to confirm that the game has started.
-        while True:
-            try:
-                data = s.recv(BUF_SIZE).decode()
-
-                if data.startswith("?game-start"):
-                    # Forward the game start command to the UI.
-                    server_command_queue.put(data)
-                    break
-
-                else:
-                    print(f"ERROR: Unknown server response: '{data}'")
-
-            except socket.timeout: pass
+        protocol = wait_for_game_start(s, server_command_queue)
 
         print("LOG: starting Stratego game on client...")
 
@@ -81,10 +186,13 @@ def connect_stratego(server_host: str, server_command_queue: Queue[str], client_
             server_conn=s,
             valid_cmd_prefixes=(
                 '?turn-info',
+                '?board-snapshot',
+                '?board-delta',
                 '?move-result',
                 '?game-over',
             ),
             server_cmd_queue=server_command_queue,
+            protocol=protocol,
         )
 
         while client_running:
@@ -101,11 +209,16 @@ def connect_stratego(server_host: str, server_command_queue: Queue[str], client_
                     print(f"LOG: trying to send move command: '{data}'")
                     s.sendall(data.encode())
 
+                # Ask the server for a full board snapshot (after missing a board update).
+                elif data.startswith('!board-resync'):
+                    print("LOG: asking the server to resync the board")
+                    s.sendall(data.encode())
+
                 else:
                     print(f"ERROR: Unknown client message '{data}'")
 
 
-def connect_word_golf(server_host: str, server_command_queue: Queue[str], client_queue: Queue[str], starting_player_info: WordGolfStartingPlayerInfo):
+def connect_word_golf(server_host: str, server_command_queue: Queue[DecodedFrame], client_queue: Queue[str], starting_player_info: WordGolfStartingPlayerInfo):
     """
     Connects to the server. Sends commands from the server back 
     through the server command queue. Receives user messages from the client queue.
@@ -118,22 +231,10 @@ def connect_word_golf(server_host: str, server_command_queue: Queue[str], client
         s.settimeout(1.0)
 
         # Tell the server that this client wants to play Word Golf with the given username.
-        s.sendall(f"?game:word_golf:{starting_player_info.username}".encode())
+        s.sendall(f"{get_game_request_prefix()}:word_golf:{starting_player_info.username}".encode())
 
         # Wait for the server to confirm that the game has started.
-        while True:
-            try:
-                data = s.recv(BUF_SIZE).decode()
-
-                if data.startswith("?game-start"):
-                    # Forward the game start command to the UI.
-                    server_command_queue.put(data)
-                    break
-
-                else:
-                    print(f"ERROR: Unknown server response: '{data}'")
-
-            except socket.timeout: pass
+        protocol = wait_for_game_start(s, server_command_queue)
 
         print("LOG: starting Word Golf game on client...")
 
@@ -149,6 +250,7 @@ def connect_word_golf(server_host: str, server_command_queue: Queue[str], client
                 '?game-over',
             ),
             server_cmd_queue=server_command_queue,
+            protocol=protocol,
         )
 
         while client_running:
@@ -174,7 +276,7 @@ def connect_word_golf(server_host: str, server_command_queue: Queue[str], client
 
 def connect_secret_game(
     server_host: str, 
-    server_command_queue: Queue[str], 
+    server_command_queue: Queue[DecodedFrame], 
     client_queue: Queue[str], 
     starting_player_info: SecretGameStartingPlayerInfo,
 ):
@@ -190,22 +292,10 @@ def connect_secret_game(
         s.settimeout(1.0)
 
         # Tell the server that this client wants to play the secret game.
-        s.sendall(f"?game:secret_game:{starting_player_info.username}".encode())
+        s.sendall(f"{get_game_request_prefix()}:secret_game:{starting_player_info.username}".encode())
 
         # Wait for the server to confirm that the game has started.
-        while True:
-            try:
-                data = s.recv(BUF_SIZE).decode()
-
-                if data.startswith("?game-start"):
-                    # Forward the game start command to the UI.
-                    server_command_queue.put(data)
-                    break
-
-                else:
-                    print(f"ERROR: Unknown server response: '{data}'")
-
-            except socket.timeout: pass
+        protocol = wait_for_game_start(s, server_command_queue)
 
         print("LOG: starting Secret Game on client...")
 
@@ -222,6 +312,7 @@ def connect_secret_game(
                 '?game-over',
             ),
             server_cmd_queue=server_command_queue,
+            protocol=protocol,
         )
 
         while client_running:
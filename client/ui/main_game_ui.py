@@ -14,6 +14,7 @@ import games.lore.lore_unlocking as lore_unlocking
 from ui.main_game_ui_sub_menus import MainGameSubMenus
 from games.secret_game.secret_game_background_activator import SecretGameBackgroundActivator
 from networking.server_cmd_interpreter import ServerCommandInterpreter
+from networking.binary_protocol import DecodedFrame
 from games.secret_dlc_store.secret_dlc_store import start_getting_dlc
 from games.secret_dlc_store.secret_dlc_store_update import SecretDLCStoreUpdate
 from games.secret_paint_game.secret_paint_game_launcher import launch_secret_paint_game
@@ -29,7 +30,7 @@ class MainGameUI:
             game_state='main_menu',
         )
 
-        self.server_cmd_queue: queue.Queue[str] = queue.Queue()
+        self.server_cmd_queue: queue.Queue[DecodedFrame] = queue.Queue()
         self.client_cmd_queue: queue.Queue[str] = queue.Queue()
 
         self.secret_dlc_store_update_queue: queue.Queue[SecretDLCStoreUpdate] = queue.Queue()
@@ -169,6 +170,11 @@ class MainGameUI:
                 if move_cmd is not None:
                     self.client_cmd_queue.put(move_cmd)
 
+                if self.client_state.stratego_state.needs_board_resync:
+                    self.client_state.stratego_state.needs_board_resync = False
+                    self.client_state.stratego_state.is_board_resync_pending = True
+                    self.client_cmd_queue.put("!board-resync\\")
+
             elif game_state == 'loading_stratego_game':
                 pygame.display.set_caption("Loading a Stratego game...")
                 self.sub_menus.loading_window_stratego.update(events)
@@ -0,0 +1,196 @@
+"""
+Benchmark for the batched Secret Game physics. First checks that `BatchedRacePhysics` gives the same results as
+`SecretGameGame.step_race` (the cars' positions, angles, lap states and laps after every tick, and the winner) for
+the same turn inputs on every map, including races that are won with both cars about to cross the line. Then times
+a tick of many races with both engines.
+
+Requires NumPy. Run from the `server` folder: `uv run benchmarks/bench_batched_physics.py`
+"""
+
+import contextlib
+import io
+import math
+import random
+import socket
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from secret_game.batched_physics import BatchedRacePhysics
+from secret_game.map import MAP_REGISTRY, Map
+from secret_game.secret_game_game import SecretGameGame
+from secret_game.secret_game_types import SecretGamePlayer, TurnState, MAP_RESOLUTION
+
+CHECK_TICK_AMT = 5_000
+TURN_CHANGE_CHANCE = 0.05
+
+# Rounding differences between NumPy's and `math`'s trigonometry.
+POSITION_TOLERANCE = 1e-6
+
+RACE_AMTS = [1, 10, 100, 1_000]
+TIMED_TICK_AMT = 200
+
+def create_players(conns: list[socket.socket], map_: Map) -> list[SecretGamePlayer]:
+    return [SecretGamePlayer(conn, f"player_{i + 1}", map_.get_spawn_position(i)) for i, conn in enumerate(conns)]
+
+
+def set_near_win(players: list[SecretGamePlayer], laps: int, tiles_behind: list[float]):
+    """
+    Puts the cars one line crossing away from winning, moved back by the given amount of tiles.
+    """
+    for player, tiles in zip(players, tiles_behind):
+        assert player.position
+        player.position.translate(-tiles * MAP_RESOLUTION, 0.0)
+        player.completed_laps = laps - 1
+        player.lap_state = 'looking_for_line'
+
+
+def assert_same_state(tick: int, game: SecretGameGame, batched_players: list[SecretGamePlayer], batched_winner_idx: int | None):
+    for player_idx, (player, batched_player) in enumerate(zip(game.players, batched_players)):
+        assert player.position and batched_player.position
+        where = f"tick {tick}, player {player_idx}"
+
+        assert math.isclose(player.position.x, batched_player.position.x, abs_tol=POSITION_TOLERANCE), f"{where}: x {player.position.x} != {batched_player.position.x}"
+        assert math.isclose(player.position.y, batched_player.position.y, abs_tol=POSITION_TOLERANCE), f"{where}: y {player.position.y} != {batched_player.position.y}"
+        assert math.isclose(player.facing_angle, batched_player.facing_angle, abs_tol=POSITION_TOLERANCE), f"{where}: angle {player.facing_angle} != {batched_player.facing_angle}"
+        assert player.speed == batched_player.speed, f"{where}: speed {player.speed} != {batched_player.speed}"
+        assert player.lap_state == batched_player.lap_state, f"{where}: lap state {player.lap_state} != {batched_player.lap_state}"
+        assert player.completed_laps == batched_player.completed_laps, f"{where}: laps {player.completed_laps} != {batched_player.completed_laps}"
+
+    winner_idx = game.result.winner_idx if game.result else None
+    assert winner_idx == batched_winner_idx, f"tick {tick}: winner {winner_idx} != {batched_winner_idx}"
+
+
+def check_race(conns: list[socket.socket], map_: Map, seed: int, tiles_behind: list[float] | None = None) -> tuple[int, int | None]:
+    """
+    Runs a race with both engines side by side, with random turn inputs. Returns the amount of ticks and the winner.
+    """
+    rng = random.Random(seed)
+
+    players = create_players(conns, map_)
+    batched_players = create_players(conns, map_)
+
+    if tiles_behind is not None:
+        set_near_win(players, SecretGameGame.REQUIRED_LAPS, tiles_behind)
+        set_near_win(batched_players, SecretGameGame.REQUIRED_LAPS, tiles_behind)
+
+    game = SecretGameGame(players, map_)
+
+    physics = BatchedRacePhysics()
+    race = physics.add_race(batched_players, map_, SecretGameGame.REQUIRED_LAPS, now=0.0)
+
+    for tick in range(1, CHECK_TICK_AMT + 1):
+        for player_idx, player in enumerate(players):
+            if tiles_behind is None and rng.random() < TURN_CHANGE_CHANCE:
+                turn_state: TurnState = rng.choice(['straight', 'left', 'right'])
+                player.turn_state = turn_state
+                physics.set_turn_state(race, player_idx, turn_state)
+
+        # Silence the wall hit and lap logs.
+        with contextlib.redirect_stdout(io.StringIO()):
+            game.step_race()
+
+            # Halfway through the tick, so that rounding never makes the batch run one tick more or less.
+            physics.advance((tick + 0.5) * physics.deltatime)
+        winner_idx = physics.sync_race(race, batched_players)
+
+        assert physics.tick_amt == tick
+        assert_same_state(tick, game, batched_players, winner_idx)
+
+        if not game.is_running:
+            return tick, winner_idx
+
+    return CHECK_TICK_AMT, None
+
+
+def check_equivalence(conns: list[socket.socket]):
+    print(f"Checking the batched physics against `SecretGameGame.step_race` ({CHECK_TICK_AMT} ticks per race):")
+
+    for map_id in MAP_REGISTRY.get_map_ids():
+        map_ = MAP_REGISTRY.get_map(map_id)
+
+        for seed in range(5):
+            tick_amt, _ = check_race(conns, map_, seed)
+            print(f"* map {map_id}, random turns (seed {seed}): same state for {tick_amt} ticks")
+
+        # Both cars cross the line on the same tick (only the first one moves and wins), and then the second one
+        # crosses it first (the first one still moves on the winning tick).
+        for tiles_behind, expected_winner_idx in (([0.0, 0.0], 0), ([0.5, 0.0], 1)):
+            tick_amt, winner_idx = check_race(conns, map_, 0, tiles_behind)
+            assert winner_idx == expected_winner_idx, f"expected player {expected_winner_idx} to win, not {winner_idx}"
+
+            print(f"* map {map_id}, cars {tiles_behind} tiles from winning: same state for {tick_amt} ticks, player {winner_idx} won")
+
+
+def time_scalar_tick(games: list[SecretGameGame]) -> float:
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+
+        for _ in range(TIMED_TICK_AMT):
+            for game in games:
+                game.step_race()
+
+        return (time.perf_counter() - start) / TIMED_TICK_AMT
+
+
+def time_batched_tick(physics: BatchedRacePhysics, races_and_players: list) -> float:
+    start = time.perf_counter()
+
+    for tick in range(1, TIMED_TICK_AMT + 1):
+        physics.advance((tick + 0.5) * physics.deltatime)
+
+        # Every game reads its cars back when it is stepped.
+        for race, players in races_and_players:
+            physics.sync_race(race, players)
+
+    return (time.perf_counter() - start) / TIMED_TICK_AMT
+
+
+def time_engines(conns: list[socket.socket]):
+    map_ = MAP_REGISTRY.get_map(MAP_REGISTRY.get_map_ids()[0])
+
+    print(f"Time per tick of all the races (2 cars each), over {TIMED_TICK_AMT} ticks:")
+
+    for race_amt in RACE_AMTS:
+        games = []
+        physics = BatchedRacePhysics()
+        races_and_players = []
+
+        for race_idx in range(race_amt):
+            players = create_players(conns, map_)
+            batched_players = create_players(conns, map_)
+
+            # Make the cars drive in circles, so that they cross tile boundaries (and sometimes walls).
+            for player_list in (players, batched_players):
+                player_list[0].turn_state = 'left'
+                player_list[1].turn_state = 'right'
+
+            games.append(SecretGameGame(players, map_))
+            races_and_players.append((physics.add_race(batched_players, map_, SecretGameGame.REQUIRED_LAPS, now=0.0), batched_players))
+
+        scalar_secs = time_scalar_tick(games)
+        batched_secs = time_batched_tick(physics, races_and_players)
+
+        print(f"* {race_amt:5} races: step_race {scalar_secs * 1_000:8.3f} ms, batched {batched_secs * 1_000:8.3f} ms")
+
+
+def main():
+    conn_pairs = [socket.socketpair() for _ in range(2)]
+    conns = [server_conn for server_conn, _ in conn_pairs]
+
+    # Silence the map loading logs.
+    with contextlib.redirect_stdout(io.StringIO()):
+        MAP_REGISTRY.get_map_ids()
+
+    check_equivalence(conns)
+    time_engines(conns)
+
+    for server_conn, client_conn in conn_pairs:
+        server_conn.close()
+        client_conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Micro-benchmark for command framing. Compares the old string-based framing (re-slicing the buffer 
+after every command) with `CommandFramer` on a burst of 10k commands.
+
+Run from the `server` folder: `uv run benchmarks/bench_command_framing.py`
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from command_framer import CommandFramer
+from server_types import BUF_SIZE
+
+BURST_CMD_AMT = 10_000
+ROUNDS = 5
+
+def frame_with_str_buffer(chunks: list[bytes], errors: str = 'strict') -> list[str]:
+    """
+    The framing that the command readers used before `CommandFramer`.
+    """
+    buffer = ""
+    commands = []
+
+    for chunk in chunks:
+        buffer += chunk.decode(errors=errors)
+
+        while (cmd_end := buffer.find('\\')) != -1:
+            commands.append(buffer[:cmd_end])
+            buffer = buffer[cmd_end+1:]
+
+    return commands
+
+
+def frame_with_framer(chunks: list[bytes]) -> list[str]:
+    framer = CommandFramer()
+    commands = []
+
+    for chunk in chunks:
+        commands.extend(framer.feed(chunk))
+
+    return commands
+
+
+def split_into_chunks(data: bytes, chunk_size: int) -> list[bytes]:
+    return [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+
+def time_best_of(frame, chunks: list[bytes]) -> float:
+    best = float('inf')
+
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        frame(chunks)
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def main():
+    # A mix of short commands and board-sized commands (with some non-ASCII usernames).
+    commands = [
+        f"?pos:{i % 2}:{i}:{i * 2}" if i % 3 else f"?turn-info:r:{':'.join(['rB'] * 100)}:ñandú"
+        for i in range(BURST_CMD_AMT)
+    ]
+    burst = "".join(f"{cmd}\\" for cmd in commands).encode()
+
+    scenarios = {
+        "one read": [burst],
+        f"{BUF_SIZE} byte reads": split_into_chunks(burst, BUF_SIZE),
+    }
+
+    print(f"Framing a burst of {BURST_CMD_AMT} commands ({len(burst)} bytes), best of {ROUNDS}:")
+
+    for name, chunks in scenarios.items():
+        assert frame_with_framer(chunks) == commands
+
+        # The old framing cannot decode chunks that split a multi-byte character.
+        try:
+            old_ok = frame_with_str_buffer(chunks) == commands
+        except UnicodeDecodeError:
+            old_ok = False
+
+        # Time the old framing with decode errors replaced, so that it processes the whole burst.
+        old_secs = time_best_of(lambda c: frame_with_str_buffer(c, errors='replace'), chunks)
+        new_secs = time_best_of(frame_with_framer, chunks)
+
+        print(f"* {name}:")
+        print(f"    str buffer:     {old_secs * 1000:8.2f} ms ({BURST_CMD_AMT / old_secs:12,.0f} cmds/s){'' if old_ok else ' (FAILED to decode)'}")
+        print(f"    CommandFramer:  {new_secs * 1000:8.2f} ms ({BURST_CMD_AMT / new_secs:12,.0f} cmds/s)")
+        print(f"    speedup:        {old_secs / new_secs:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Benchmark for the timers of the games on an event loop. Simulates many Secret Game-like games (each with a fixed
+tick rate and frequent player input) on a single loop, comparing the old `GameTask.advance` (which cancelled and
+rescheduled the game's timer after every step) with the current one (which keeps the timer while the game's
+deadline does not change, on a loop that compacts its cancelled timers). Reports the timer heap size and time.
+
+Run from the `server` folder: `uv run benchmarks/bench_game_timers.py`
+"""
+
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import event_loop
+import game_pool
+from event_loop import EventLoop
+from game_pool import GameTask
+
+GAME_AMT = 1_000
+TICK_HZ = 60
+# The chance of a game receiving input on each simulated millisecond (around 20 inputs per second).
+INPUT_CHANCE = 0.02
+SIMULATED_SECS = 3.0
+
+class SimulatedClock:
+    """
+    Stands in for the `time` module of the loop and the tasks, so that the simulation does not depend on how fast it runs.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+
+    def perf_counter(self) -> float:
+        return self.now
+
+
+class TickingGame:
+    """
+    A minimal step-based game that ticks at a fixed rate (like a Secret Game race).
+    """
+
+    def __init__(self, start_at: float):
+        self.players = []
+        self.next_tick_at = start_at
+
+
+    def step(self, now: float) -> float:
+        while self.next_tick_at <= now:
+            self.next_tick_at += 1 / TICK_HZ
+
+        return self.next_tick_at
+
+
+    def is_over(self) -> bool:
+        return False
+
+
+class ReschedulingGameTask(GameTask):
+    def advance(self):
+        """
+        The `GameTask.advance` from before keeping unchanged timers.
+        """
+        deadline = self.game.step(game_pool.time.perf_counter())
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        self._timer = self.loop.call_at(deadline, self.on_timer)
+
+
+def simulate(task_type: type[GameTask], compact: bool) -> tuple[float, int, float, int]:
+    """
+    Returns the simulation's run time (in seconds), the amount of scheduled timers, and the average and maximum 
+    timer heap size.
+    """
+    clock = SimulatedClock()
+    game_pool.time = clock  # type: ignore[assignment]
+    event_loop.time = clock  # type: ignore[assignment]
+
+    loop = EventLoop("bench")
+
+    if not compact:
+        loop._on_timer_cancelled = lambda: None  # type: ignore[method-assign]
+
+    rng = random.Random(0)
+    tasks = [task_type(loop, TickingGame(start_at=rng.random() / TICK_HZ)) for _ in range(GAME_AMT)]  # type: ignore[arg-type]
+
+    for task in tasks:
+        task.advance()
+
+    heap_size_sum = 0
+    max_heap_size = 0
+    ms_amt = int(SIMULATED_SECS * 1000)
+
+    start = time.perf_counter()
+
+    for _ in range(ms_amt):
+        clock.now += 0.001
+
+        for task in tasks:
+            if rng.random() < INPUT_CHANCE:
+                task.advance()
+
+        loop._run_due_timers()
+
+        heap_size_sum += len(loop._timers)
+        max_heap_size = max(max_heap_size, len(loop._timers))
+
+    secs = time.perf_counter() - start
+
+    # The loop numbers every timer it schedules.
+    scheduled_timer_amt = next(loop._timer_seq)
+
+    game_pool.time = time
+    event_loop.time = time
+
+    return secs, scheduled_timer_amt, heap_size_sum / ms_amt, max_heap_size
+
+
+def main():
+    print(f"Simulating {GAME_AMT} games ticking at {TICK_HZ} Hz on one loop for {SIMULATED_SECS} s:")
+
+    for name, task_type, compact in [
+        ("reschedule every step", ReschedulingGameTask, False),
+        ("keep unchanged timers + compaction", GameTask, True),
+    ]:
+        secs, scheduled_timer_amt, average_heap_size, max_heap_size = simulate(task_type, compact)
+
+        print(f"* {name}:")
+        print(f"    scheduled timers: {scheduled_timer_amt:8}")
+        print(f"    timer heap size:  {average_heap_size:8.0f} average, {max_heap_size} max")
+        print(f"    run time:         {secs * 1000:8.1f} ms (including the simulated input)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Micro-benchmark for the Secret Game race simulation. Compares the old car movement (allocating a movement `Vector`
+and a new position `Vector` with `+` for every car on every tick) with the in-place `Vector.translate` that
+`SecretGameGame.move_player` uses now. Counts the `Vector` allocations per tick and times the ticks.
+
+Run from the `server` folder: `uv run benchmarks/bench_vector_allocations.py`
+"""
+
+import contextlib
+import io
+import math
+import socket
+import sys
+import time
+from pathlib import Path
+from types import MethodType
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from secret_game.map import MAP_REGISTRY
+from secret_game.secret_game_game import SecretGameGame
+from secret_game.secret_game_types import SecretGamePlayer, Vector
+
+TICK_AMT = 20_000
+ROUNDS = 5
+
+def move_player_with_vector_add(game: SecretGameGame, player: SecretGamePlayer):
+    """
+    The car movement that `SecretGameGame.move_player` used before updating the position in place.
+    """
+    movement = Vector(
+        x=math.cos(player.facing_angle) * player.speed * game.deltatime,
+        y=math.sin(player.facing_angle) * player.speed * game.deltatime,
+    )
+    assert player.position
+    player.position = player.position + movement
+
+
+def create_game(conns: list[socket.socket]) -> SecretGameGame:
+    map_id = MAP_REGISTRY.get_map_ids()[0]
+    map_ = MAP_REGISTRY.get_map(map_id)
+
+    players = [SecretGamePlayer(conn, f"player_{i + 1}", map_.get_spawn_position(i)) for i, conn in enumerate(conns)]
+
+    # Make the cars drive in circles, so that they cross tile boundaries (and sometimes walls).
+    players[0].turn_state = 'left'
+    players[1].turn_state = 'right'
+
+    return SecretGameGame(players, map_)
+
+
+def run_ticks(game: SecretGameGame, tick_amt: int):
+    # Silence the wall hit logs.
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(tick_amt):
+            game.step_race()
+
+
+def count_vector_allocations(game: SecretGameGame, tick_amt: int) -> int:
+    allocation_amt = 0
+    original_init = Vector.__init__
+
+    def counting_init(self, *args, **kwargs):
+        nonlocal allocation_amt
+        allocation_amt += 1
+        original_init(self, *args, **kwargs)
+
+    Vector.__init__ = counting_init
+
+    try:
+        run_ticks(game, tick_amt)
+    finally:
+        Vector.__init__ = original_init
+
+    return allocation_amt
+
+
+def time_best_of(game: SecretGameGame, tick_amt: int) -> float:
+    best = float('inf')
+
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        run_ticks(game, tick_amt)
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def main():
+    conn_pairs = [socket.socketpair() for _ in range(2)]
+    conns = [server_conn for server_conn, _ in conn_pairs]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        old_game = create_game(conns)
+        new_game = create_game(conns)
+
+    old_game.move_player = MethodType(move_player_with_vector_add, old_game)
+
+    print(f"Simulating {TICK_AMT} race ticks (2 cars), best of {ROUNDS}:")
+
+    for name, game in {"Vector +": old_game, "Vector.translate": new_game}.items():
+        allocations_per_tick = count_vector_allocations(game, TICK_AMT) / TICK_AMT
+        secs = time_best_of(game, TICK_AMT)
+
+        print(f"* {name}:")
+        print(f"    Vector allocations per tick: {allocations_per_tick:6.2f}")
+        print(f"    time per tick:               {secs / TICK_AMT * 1_000_000:6.2f} us")
+
+    for server_conn, client_conn in conn_pairs:
+        server_conn.close()
+        client_conn.close()
+
+
+if __name__ == "__main__":
+    main()
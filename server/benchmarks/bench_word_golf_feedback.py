@@ -0,0 +1,120 @@
+"""
+Benchmark for the Word Golf feedback generation. Compares the old `gen_feedback` (building two dicts and scanning
+the actual word for every guess) with the precomputed `AnswerProfile`s on every (actual word, guess) pair of the
+word list, and checks that both generate the same feedback for all of them.
+
+Run from the `server` folder: `uv run benchmarks/bench_word_golf_feedback.py`
+"""
+
+import contextlib
+import io
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from word_golf.feedback import feedback_code_to_str
+from word_golf.word_dictionary import get_word_dictionary
+
+ROUNDS = 3
+
+def gen_feedback_with_dicts(actual_word: str, guess: str) -> str:
+    """
+    The feedback generation that `WordGolfGame.gen_feedback` used before the answer profiles.
+    """
+    feedback = []
+
+    actual_letter_freq = {}
+    correct_guess_amt = {}
+
+    for i in range(len(actual_word)):
+        actual_letter_freq.setdefault(actual_word[i], 0)
+        correct_guess_amt.setdefault(actual_word[i], 0)
+        actual_letter_freq[actual_word[i]] += 1
+
+        if guess[i] == actual_word[i]:
+            correct_guess_amt[guess[i]] += 1
+
+    for i in range(len(actual_word)):
+        if actual_word[i] == guess[i]:
+            feedback.append(f'O{guess[i]}')
+
+        elif guess[i] in actual_word and correct_guess_amt[guess[i]] < actual_letter_freq[guess[i]]:
+            feedback.append(f'!{guess[i]}')
+
+        else:
+            feedback.append(f'X{guess[i]}')
+
+    return "".join(feedback)
+
+
+def run_old(words: tuple[str, ...]):
+    for actual_word in words:
+        for guess in words:
+            gen_feedback_with_dicts(actual_word, guess)
+
+
+def run_profiles(words: tuple[str, ...]):
+    dictionary = get_word_dictionary()
+
+    for actual_word in words:
+        profile = dictionary.get_answer_profile(actual_word)
+
+        for guess in words:
+            feedback_code_to_str(profile.gen_feedback_code(guess), guess)
+
+
+def run_profile_codes(words: tuple[str, ...]):
+    dictionary = get_word_dictionary()
+
+    for actual_word in words:
+        profile = dictionary.get_answer_profile(actual_word)
+
+        for guess in words:
+            profile.gen_feedback_code(guess)
+
+
+def time_best_of(run, words: tuple[str, ...]) -> float:
+    best = float('inf')
+
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        run(words)
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def main():
+    with contextlib.redirect_stdout(io.StringIO()):
+        dictionary = get_word_dictionary()
+
+    words = dictionary.words
+    pair_amt = len(words) ** 2
+
+    print(f"Checking the feedback of all {pair_amt:,} word pairs ({len(words)} words)...")
+
+    for actual_word in words:
+        profile = dictionary.get_answer_profile(actual_word)
+
+        for guess in words:
+            expected = gen_feedback_with_dicts(actual_word, guess)
+            feedback = feedback_code_to_str(profile.gen_feedback_code(guess), guess)
+
+            assert feedback == expected, f"feedback mismatch for '{guess}' (actual word '{actual_word}'): '{feedback}' != '{expected}'"
+
+    print(f"All pairs match. Generating the feedback of all pairs, best of {ROUNDS}:")
+
+    old_secs = time_best_of(run_old, words)
+    profile_secs = time_best_of(run_profiles, words)
+    code_secs = time_best_of(run_profile_codes, words)
+
+    print(f"    dicts:                  {old_secs * 1000:8.1f} ms ({pair_amt / old_secs:12,.0f} guesses/s)")
+    print(f"    profiles:               {profile_secs * 1000:8.1f} ms ({pair_amt / profile_secs:12,.0f} guesses/s)")
+    print(f"    profiles (codes only):  {code_secs * 1000:8.1f} ms ({pair_amt / code_secs:12,.0f} guesses/s)")
+    print(f"    speedup:                {old_secs / profile_secs:8.1f}x ({old_secs / code_secs:.1f}x for the codes only)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+This module contains the framer that splits a socket's byte stream into `\\`-terminated commands.
+The client has a copy of this module (`client/networking/command_framer.py`), both sides frame commands the same way.
+"""
+
+COMMAND_TERMINATOR = ord('\\')
+
+class CommandFramer:
+    """
+    Splits a byte stream into commands in linear time. The received bytes are appended to a single
+    `bytearray` and only the newly received bytes are scanned for terminators. All the complete commands
+    are then decoded and split in one go, instead of re-slicing a string buffer after every command.
+
+    Commands are framed at the byte level and only decoded once they are complete. The terminator (`\\`) is
+    an ASCII byte that never appears inside a multi-byte UTF-8 sequence, so a character split across two
+    reads is never decoded in halves.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+        # The buffer has no terminator before this offset.
+        self._scan_offset = 0
+
+
+    def feed(self, data: bytes) -> list[str]:
+        """
+        Adds the received data to the buffer and returns all the commands that it completed (without their terminator).
+        """
+        self._buffer += data
+
+        # Only the newly received bytes can contain a terminator.
+        last_cmd_end = self._buffer.rfind(COMMAND_TERMINATOR, self._scan_offset)
+
+        if last_cmd_end == -1:
+            self._scan_offset = len(self._buffer)
+            return []
+
+        # Decode all the complete commands at once and split them on their terminators.
+        with memoryview(self._buffer) as view:
+            commands = str(view[:last_cmd_end], 'utf-8').split('\\')
+
+        # Drop the consumed commands (+1 for the trailing `\`). The rest of the buffer is an incomplete command.
+        del self._buffer[:last_cmd_end + 1]
+        self._scan_offset = len(self._buffer)
+
+        return commands
@@ -1,5 +1,7 @@
 import socket
 from server_types import Connection, BUF_SIZE
+from command_framer import CommandFramer
+from wire_protocol import PONG_CMD
 from collections import deque
 
 class ClientCommandReader:
@@ -8,28 +10,32 @@ class ClientCommandReader:
         self._connections = connections
         self._valid_cmd_prefixes = valid_cmd_prefixes
 
-        self._command_buffers = ["" for _ in range(len(self._connections))]
+        self._framers = [CommandFramer() for _ in range(len(self._connections))]
         self._player_cmds: list[deque[str]] = [deque() for _ in range(len(self._connections))]
 
 
     def _gather_incoming_commands(self, conn_idx: int):
         try:
             conn = self._connections[conn_idx]
-            data = conn.recv(BUF_SIZE).decode()
-            self._command_buffers[conn_idx] += data
+            raw_data = conn.recv(BUF_SIZE)
 
-            while (cmd_end := self._command_buffers[conn_idx].find('\\')) != -1:
-                client_cmd = self._command_buffers[conn_idx][:cmd_end]
-
-                self._command_buffers[conn_idx] = self._command_buffers[conn_idx][cmd_end+1:] # +1 for skipping past the trailing `\`
+            # An empty read means that the client closed its side of the connection.
+            if not raw_data:
+                raise ConnectionResetError(f"client #{conn_idx} disconnected")
 
+            for client_cmd in self._framers[conn_idx].feed(raw_data):
+                # Server-bound commands always start with `!`.
                 if not client_cmd.startswith('!'):
-                    raise Exception(f"received invalid command: {client_cmd}")
-                
-                if client_cmd.startswith(self._valid_cmd_prefixes):
+                    print(f"ERROR: ignoring invalid command from client: '{client_cmd}'")
+
+                elif client_cmd.startswith(self._valid_cmd_prefixes):
                     self._player_cmds[conn_idx].appendleft(client_cmd)
+
+                # The answer to a heartbeat that was sent right before the game started.
+                elif client_cmd.startswith(PONG_CMD): pass
+
                 else:
-                    print(f"ERROR: received unknown data from client: '{data}'")
+                    print(f"ERROR: received unknown data from client: '{client_cmd}'")
 
         except socket.timeout: pass
 
@@ -38,4 +44,4 @@ class ClientCommandReader:
         self._gather_incoming_commands(conn_idx)
 
         while len(self._player_cmds[conn_idx]) > 0:
-            yield self._player_cmds[conn_idx].pop()
\ No newline at end of file
+            yield self._player_cmds[conn_idx].pop()
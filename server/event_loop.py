@@ -0,0 +1,199 @@
+"""
+This module contains a small `selectors`-based event loop. Each loop multiplexes many client
+connections (and timers) on a single thread, so idle connections do not cost any CPU.
+"""
+
+import heapq
+import itertools
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+from server_types import Connection, BUF_SIZE
+
+# The timer heap is only compacted once it has at least this many cancelled timers, and they make up more than 
+# half of the heap (so that the compaction cost is amortized over the cancellations).
+MIN_CANCELLED_TIMERS_TO_COMPACT = 64
+
+class TimerHandle:
+    """
+    Returned when scheduling a callback on an event loop. Can be used to cancel the callback
+    before it runs.
+    """
+
+    def __init__(self, when: float, callback: Callable[[], None], loop: 'EventLoop | None' = None):
+        self.when = when
+        self.callback = callback
+        self.cancelled = False
+
+        # The loop whose timer heap has this handle (until it is popped from it).
+        self._loop = loop
+
+
+    def cancel(self):
+        if self.cancelled:
+            return
+
+        self.cancelled = True
+
+        if self._loop is not None:
+            self._loop._on_timer_cancelled()
+
+
+class EventLoop:
+    """
+    A single-threaded event loop. Readers and timers must only be added or removed from the loop's
+    own thread; other threads need to go through `call_soon_threadsafe`. Timers use `time.perf_counter`
+    seconds, the same clock that the game engines use.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+        self._selector = selectors.DefaultSelector()
+
+        # Min-heap of (when, sequence number, handle). The sequence number breaks ties so
+        # that handles never get compared.
+        self._timers: list[tuple[float, int, TimerHandle]] = []
+        self._timer_seq = itertools.count()
+
+        # The amount of cancelled timers that are still in the heap. Games reschedule their timer whenever their 
+        # next deadline changes, so without compaction the heap would fill up with cancelled timers.
+        self._cancelled_timer_amt = 0
+
+        self._pending_callbacks: deque[Callable[[], None]] = deque()
+        self._pending_callbacks_lock = threading.Lock()
+
+        # Writing a byte to this socket pair wakes up the loop when a callback is
+        # added from another thread.
+        self._wakeup_recv, self._wakeup_send = socket.socketpair()
+        self._wakeup_recv.setblocking(False)
+        self._wakeup_send.setblocking(False)
+        self._selector.register(self._wakeup_recv, selectors.EVENT_READ, self._drain_wakeup)
+
+
+    def add_reader(self, conn: Connection, callback: Callable[[], None]):
+        """
+        Calls `callback` every time `conn` has data to read (or has been closed by the peer).
+        """
+        self._selector.register(conn, selectors.EVENT_READ, callback)
+
+
+    def remove_reader(self, conn: Connection):
+        try:
+            self._selector.unregister(conn)
+
+        # The connection was not registered (or is already closed).
+        except (KeyError, ValueError): pass
+
+
+    def call_at(self, when: float, callback: Callable[[], None]) -> TimerHandle:
+        handle = TimerHandle(when, callback, loop=self)
+        heapq.heappush(self._timers, (when, next(self._timer_seq), handle))
+        return handle
+
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> TimerHandle:
+        return self.call_at(time.perf_counter() + delay, callback)
+
+
+    def call_soon_threadsafe(self, callback: Callable[[], None]):
+        """
+        Schedules `callback` to run on the loop's thread. Can be called from any thread.
+        """
+        with self._pending_callbacks_lock:
+            self._pending_callbacks.append(callback)
+
+        try:
+            self._wakeup_send.send(b'\0')
+
+        # The wakeup socket is already full, so the loop is going to wake up anyways.
+        except BlockingIOError: pass
+
+
+    def start_in_thread(self) -> threading.Thread:
+        thread = threading.Thread(target=self.run_forever, name=self.name)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+
+    def run_forever(self):
+        while True:
+            for key, _ in self._selector.select(self._get_select_timeout()):
+                self._run_callback(key.data)
+
+            self._run_pending_callbacks()
+            self._run_due_timers()
+
+
+    def _get_select_timeout(self) -> float | None:
+        if len(self._pending_callbacks) > 0:
+            return 0
+
+        # Discard cancelled timers so that they don't wake up the loop.
+        while len(self._timers) > 0 and self._timers[0][2].cancelled:
+            self._pop_timer()
+
+        if len(self._timers) == 0:
+            return None # block until a connection is ready
+
+        return max(0, self._timers[0][0] - time.perf_counter())
+
+
+    def _run_pending_callbacks(self):
+        with self._pending_callbacks_lock:
+            callbacks = self._pending_callbacks
+            self._pending_callbacks = deque()
+
+        for callback in callbacks:
+            self._run_callback(callback)
+
+
+    def _run_due_timers(self):
+        now = time.perf_counter()
+
+        while len(self._timers) > 0 and self._timers[0][0] <= now:
+            handle = self._pop_timer()
+
+            if not handle.cancelled:
+                self._run_callback(handle.callback)
+
+
+    def _pop_timer(self) -> TimerHandle:
+        _, _, handle = heapq.heappop(self._timers)
+
+        # Cancelling the handle from now on does not affect the heap.
+        handle._loop = None
+
+        if handle.cancelled:
+            self._cancelled_timer_amt -= 1
+
+        return handle
+
+
+    def _on_timer_cancelled(self):
+        self._cancelled_timer_amt += 1
+
+        if self._cancelled_timer_amt >= MIN_CANCELLED_TIMERS_TO_COMPACT and self._cancelled_timer_amt * 2 > len(self._timers):
+            self._timers = [timer for timer in self._timers if not timer[2].cancelled]
+            heapq.heapify(self._timers)
+            self._cancelled_timer_amt = 0
+
+
+    def _run_callback(self, callback: Callable[[], None]):
+        try:
+            callback()
+
+        # A failing callback should not take down every other connection on the loop.
+        except Exception as e:
+            print(f"ERROR: unhandled exception on event loop '{self.name}': {e!r}")
+
+
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup_recv.recv(BUF_SIZE): pass
+        except BlockingIOError: pass
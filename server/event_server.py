@@ -0,0 +1,310 @@
+"""
+Do not run this script directly. Instead, call it as a library (e.g. `import event_server`).
+
+This is an opt-in alternative to `socket_server.run`. Instead of using one thread per client, all
+the connections are multiplexed on a small number of event loops (one per core). The games are driven
+through their `start`/`on_input`/`step` interface, so no game ever blocks a loop while waiting for
+input. The protocol is exactly the same, so existing clients work unchanged.
+"""
+
+import itertools
+import os
+import socket
+import threading
+import time
+from typing import Callable
+
+import socket_server
+from socket_server import HOST, PORT, GAME_START_PROCESSING_DELAY_SECS, get_local_ip, get_match_queue
+from server_types import Connection, BUF_SIZE
+from event_loop import EventLoop, TimerHandle
+from game_pool import Game, GamePool
+from matchmaking import EvictionReason
+from heartbeat import HeartbeatMonitor, WaitingPlayer, is_connection_alive, enable_keepalive, is_only_pongs, HEARTBEAT_INTERVAL_SECS, GAME_REQUEST_TIMEOUT_SECS, GAME_REQUEST_SETTLE_SECS
+
+from stratego.stratego_player import StrategoPlayer
+
+from word_golf.word_golf_types import WordGolfPlayer
+
+class EventServer:
+    """
+    Accepts clients, reads their game requests, pairs them up and runs their games, all on event loops.
+    """
+
+    def __init__(self, loop_amt: int):
+        self.loops = [EventLoop(f"event-loop-{i}") for i in range(loop_amt)]
+
+        # Connections are spread out over the loops in a round-robin fashion.
+        self._loop_cycle = itertools.cycle(self.loops)
+
+        # The games run on the same loops (which are started by `run`), on the one running the fewest games.
+        self.game_pool = GamePool(self.loops)
+        self._loop_cycle_lock = threading.Lock()
+
+        self._listener: Connection | None = None
+
+        # The loop that is watching each waiting player's connection.
+        self._waiting_conn_loops: dict[Connection, EventLoop] = {}
+
+        # Each loop pings the waiting players that it is watching.
+        self._heartbeat_monitors = {loop: HeartbeatMonitor() for loop in self.loops}
+
+        # Drops the clients that do not send their game request in time (and then ends their request once they stop sending).
+        self._game_request_timers: dict[Connection, TimerHandle] = {}
+
+        # The part of each client's game request that has been read so far, since it can be split across several reads.
+        self._game_request_buffers: dict[Connection, bytes] = {}
+
+
+    def pick_loop(self) -> EventLoop:
+        with self._loop_cycle_lock:
+            return next(self._loop_cycle)
+
+
+    def run(self):
+        local_ip = get_local_ip()
+
+        # AF_INET: socket family is IPv4
+        # SOCK_STREAM: socket type is TCP (lossless)
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.bind((HOST, PORT))
+            s.listen()
+            s.setblocking(False)
+            self._listener = s
+
+            print(f"LOG: Server listening on {local_ip}:{PORT} ({len(self.loops)} event loops)")
+
+            # Dead players are evicted right before being paired up, so that their opponent keeps waiting for a live one instead.
+            for match_queue in (socket_server.STRATEGO_MATCH_QUEUE, socket_server.WORD_GOLF_MATCH_QUEUE, socket_server.SECRET_GAME_MATCH_QUEUE):
+                match_queue.start(on_match=self.on_match, is_alive=lambda player: is_connection_alive(player.conn), on_evict=self.on_dead_player_at_pairing)
+
+            for loop in self.loops:
+                loop.call_later(HEARTBEAT_INTERVAL_SECS, lambda loop=loop: self.run_heartbeats(loop))
+
+            for loop in self.loops[1:]:
+                loop.start_in_thread()
+
+            # The first loop accepts the new clients and runs on the main thread.
+            self.loops[0].add_reader(s, self.on_accept)
+            self.loops[0].run_forever()
+
+
+    def on_accept(self):
+        assert self._listener
+
+        try:
+            conn, addr = self._listener.accept()
+        except BlockingIOError: return
+
+        print(f"LOG: Handling connection from {addr}")
+
+        # Reads are only done when the loop reports that the socket is readable, so it never blocks.
+        conn.settimeout(None)
+
+        loop = self.pick_loop()
+        loop.call_soon_threadsafe(lambda: self.wait_for_game_request(loop, conn))
+
+
+    def wait_for_game_request(self, loop: EventLoop, conn: Connection):
+        loop.add_reader(conn, lambda: self.on_game_request(loop, conn))
+        self._game_request_timers[conn] = loop.call_later(GAME_REQUEST_TIMEOUT_SECS, lambda: self.on_game_request_timeout(loop, conn))
+
+
+    def on_game_request_timeout(self, loop: EventLoop, conn: Connection):
+        print(f"LOG: Dropping a client that did not choose a game in {GAME_REQUEST_TIMEOUT_SECS} seconds")
+
+        self._game_request_timers.pop(conn, None)
+        self._game_request_buffers.pop(conn, None)
+        loop.remove_reader(conn)
+        conn.close()
+
+
+    def on_game_request(self, loop: EventLoop, conn: Connection):
+        try:
+            raw_data = conn.recv(BUF_SIZE)
+        except ConnectionError:
+            raw_data = b''
+
+        # The client disconnected before choosing a game.
+        if not raw_data:
+            self._game_request_timers.pop(conn).cancel()
+            self._game_request_buffers.pop(conn, None)
+            loop.remove_reader(conn)
+            conn.close()
+            return
+
+        buffer = self._game_request_buffers.get(conn, b'') + raw_data
+
+        if not socket_server.is_game_request_start(buffer):
+            print(f"ERROR: unknown client response: '{buffer.decode(errors='replace')}'")
+            self._game_request_buffers.pop(conn, None)
+            return
+
+        self._game_request_buffers[conn] = buffer
+
+        # Waits for the rest of the last field, in case it was split across several reads.
+        if socket_server.has_game_request_fields(buffer):
+            self._game_request_timers.pop(conn).cancel()
+            self._game_request_timers[conn] = loop.call_later(GAME_REQUEST_SETTLE_SECS, lambda: self.on_game_request_complete(loop, conn))
+
+
+    def on_game_request_complete(self, loop: EventLoop, conn: Connection):
+        self._game_request_timers.pop(conn, None)
+        loop.remove_reader(conn)
+
+        # Undecodable bytes are replaced, so that they are rejected like any other malformed request.
+        data = self._game_request_buffers.pop(conn).decode(errors='replace')
+        print(f"LOG: got data ({data})")
+
+        player = socket_server.create_player_from_game_request(conn, data)
+
+        if player is None:
+            conn.close()
+            return
+
+        self.queue_player(loop, player)
+
+
+    def queue_player(self, loop: EventLoop, player: WaitingPlayer):
+        match_queue = get_match_queue(player)
+
+        # Watch the waiting player's connection so that they leave the queue if they disconnect (or stop answering the heartbeats).
+        enable_keepalive(player.conn)
+        self._waiting_conn_loops[player.conn] = loop
+        loop.add_reader(player.conn, lambda: self.on_waiting_player_readable(loop, player))
+        self._heartbeat_monitors[loop].watch(player)
+
+        match_queue.join(player)
+
+
+    def requeue_player(self, player: WaitingPlayer):
+        """
+        Puts a player who was paired up back in their queue, watched by another loop.
+        """
+        loop = self.pick_loop()
+        loop.call_soon_threadsafe(lambda: self.queue_player(loop, player))
+
+
+    def on_waiting_player_readable(self, loop: EventLoop, player: WaitingPlayer):
+        try:
+            raw_data = player.conn.recv(BUF_SIZE)
+        except ConnectionError:
+            raw_data = b''
+
+        if raw_data:
+            self._heartbeat_monitors[loop].on_heard(player)
+
+            if not is_only_pongs(raw_data):
+                print(f"ERROR: ignoring data sent by '{player.username}' before their game started: '{raw_data!r}'")
+
+            return
+
+        self.evict_waiting_player(loop, player, 'disconnected')
+
+
+    def evict_waiting_player(self, loop: EventLoop, player: WaitingPlayer, reason: EvictionReason):
+        """
+        Called on the loop that is watching the player. If the player was already paired up, their game 
+        is going to notice the disconnect instead.
+        """
+        loop.remove_reader(player.conn)
+        self._heartbeat_monitors[loop].unwatch(player)
+
+        match_queue = get_match_queue(player)
+
+        if match_queue.cancel(player, reason):
+            print(f"LOG: Evicted '{player.username}' while waiting for a game ({reason}). Queue: {match_queue.stats}")
+
+            self._waiting_conn_loops.pop(player.conn, None)
+            player.conn.close()
+
+
+    def run_heartbeats(self, loop: EventLoop):
+        """
+        Pings the players waiting on the loop every `HEARTBEAT_INTERVAL_SECS` and evicts the idle ones.
+        """
+        for player, reason in self._heartbeat_monitors[loop].tick(time.perf_counter()):
+            self.evict_waiting_player(loop, player, reason)
+
+        loop.call_later(HEARTBEAT_INTERVAL_SECS, lambda: self.run_heartbeats(loop))
+
+
+    def on_dead_player_at_pairing(self, player: WaitingPlayer):
+        """
+        Called on a matchmaker thread after the player was evicted by the liveness check.
+        """
+        waiting_loop = self._waiting_conn_loops.pop(player.conn)
+
+        def forget():
+            waiting_loop.remove_reader(player.conn)
+            self._heartbeat_monitors[waiting_loop].unwatch(player)
+            player.conn.close()
+
+        waiting_loop.call_soon_threadsafe(forget)
+
+
+    def on_match(self, player1, player2):
+        """
+        Called on a matchmaker thread. Stops watching the players' connections on the loops where 
+        they were waiting, and then starts their game on a loop.
+        """
+        self.detach_waiting_players([player1, player2], then=lambda: self.start_game(player1, player2))
+
+
+    def detach_waiting_players(self, players: list, then: Callable[[], None]):
+        """
+        Removes the players' connections from the loops that were watching them while they were waiting 
+        (one loop at a time, on each loop's own thread) and then calls `then` on the last loop.
+        """
+        if len(players) == 0:
+            then()
+            return
+
+        conn = players[0].conn
+        waiting_loop = self._waiting_conn_loops.pop(conn)
+
+        def detach():
+            waiting_loop.remove_reader(conn)
+            self._heartbeat_monitors[waiting_loop].unwatch(players[0])
+            self.detach_waiting_players(players[1:], then)
+
+        waiting_loop.call_soon_threadsafe(detach)
+
+
+    def start_game(self, player1, player2):
+        """
+        Called on a loop's thread. The game is then started on the loop that is running the fewest games.
+        """
+        if not socket_server.check_paired_players_alive([player1, player2], rejoin=self.requeue_player):
+            return
+
+        game: Game
+
+        try:
+            if isinstance(player1, StrategoPlayer):
+                game = socket_server.create_stratego_game(player1, player2)
+                start_delay = 0.0
+
+            elif isinstance(player1, WordGolfPlayer):
+                game = socket_server.create_word_golf_game(player1, player2)
+                start_delay = GAME_START_PROCESSING_DELAY_SECS
+
+            else:
+                game = socket_server.create_secret_game_game(player1, player2)
+                start_delay = GAME_START_PROCESSING_DELAY_SECS
+
+        # i.e. a player disconnected right before their game started.
+        except (ConnectionResetError, BrokenPipeError) as e:
+            socket_server.close_unstarted_game([player1, player2], e)
+            return
+
+        # Give the clients time to process the game's start.
+        self.game_pool.submit(game, start_delay=start_delay)
+
+
+def run(loop_amt: int | None = None):
+    """
+    Runs the server in event loop mode. Uses one event loop per core by default.
+    """
+    server = EventServer(loop_amt or os.cpu_count() or 1)
+    server.run()
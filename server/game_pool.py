@@ -0,0 +1,190 @@
+"""
+This module contains the driver of step-based games on event loops, and the bounded pool of event loop threads
+that runs the games of the thread-per-client server (see `socket_server.py`).
+"""
+
+import threading
+import time
+from typing import Callable, Self
+
+from server_types import Connection
+from event_loop import EventLoop, TimerHandle
+
+from stratego.stratego_game import StrategoGame
+from word_golf.word_golf_game import WordGolfGame
+from secret_game.secret_game_game import SecretGameGame
+
+Game = StrategoGame | WordGolfGame | SecretGameGame
+
+class GameTask:
+    """
+    Drives a game on an event loop. The game's connections are read only when they have data, and
+    the game is only stepped after receiving input or when the deadline returned by its last step is reached.
+    """
+
+    def __init__(self, loop: EventLoop, game: Game, on_finish: Callable[[], None] | None = None):
+        self.loop = loop
+        self.game = game
+
+        # Called (on the loop's thread) after the game ends.
+        self.on_finish = on_finish
+
+        self._timer: TimerHandle | None = None
+
+
+    def get_connections(self) -> list[Connection]:
+        return [player.conn for player in self.game.players]
+
+
+    def start(self):
+        for player_idx, conn in enumerate(self.get_connections()):
+            self.loop.add_reader(conn, lambda player_idx=player_idx: self.on_readable(player_idx))
+
+        try:
+            self.game.start()
+
+        except (ConnectionResetError, BrokenPipeError):
+            self.game.abort()
+
+        except Exception as e:
+            self.abort_after_error(e)
+
+        self.advance()
+
+
+    def on_readable(self, player_idx: int):
+        try:
+            for cmd in self.game.command_reader.yield_commands(player_idx):
+                self.game.on_input(player_idx, cmd)
+
+        # End the game if a connection error occurs.
+        except (ConnectionResetError, BrokenPipeError):
+            self.game.abort()
+
+        # i.e. a command that could not be decoded or parsed.
+        except Exception as e:
+            self.abort_after_error(e)
+
+        self.advance()
+
+
+    def abort_after_error(self, error: Exception):
+        """
+        Abruptly ends a game that raised an unexpected error, so that it is ended (and its connections closed)
+        instead of staying registered on the loop.
+        """
+        print(f"ERROR: aborting a game after an unexpected error: {error!r}")
+        self.game.abort()
+
+
+    def on_timer(self):
+        self._timer = None
+        self.advance()
+
+
+    def advance(self):
+        """
+        Steps the game and schedules the next step (if the game needs one).
+        """
+        deadline = None
+
+        if not self.game.is_over():
+            try:
+                deadline = self.game.step(time.perf_counter())
+
+            except (ConnectionResetError, BrokenPipeError):
+                self.game.abort()
+
+            except Exception as e:
+                self.abort_after_error(e)
+
+        if self.game.is_over():
+            deadline = None
+
+        # Most steps keep the same deadline (i.e. input between two ticks), so the timer is only 
+        # rescheduled when the deadline changes.
+        if self._timer is not None and self._timer.when != deadline:
+            self._timer.cancel()
+            self._timer = None
+
+        if self.game.is_over():
+            self.finish()
+
+        elif deadline is not None and self._timer is None:
+            self._timer = self.loop.call_at(deadline, self.on_timer)
+
+
+    def finish(self):
+        for conn in self.get_connections():
+            self.loop.remove_reader(conn)
+
+        self.game.end()
+
+        for conn in self.get_connections():
+            conn.close()
+
+        if self.on_finish is not None:
+            self.on_finish()
+
+
+class GamePool:
+    """
+    Runs any amount of games on a fixed number of event loops, so the thread count (and memory) stays flat
+    as the concurrent games grow. Each game goes to the loop that is running the fewest games, where it is driven
+    through its `start`/`on_input`/`step` interface by a `GameTask`. Every wait of a game (i.e. its start delay
+    or its next timed phase) is a timer on its loop, so no game ever sleeps on a thread.
+
+    The pool does not start the loops, so that it can also use loops that are already running (see `with_threads`).
+    """
+
+    def __init__(self, loops: list[EventLoop]):
+        self.loops = loops
+
+        # The amount of games running on each loop.
+        self._running_game_amts = [0 for _ in self.loops]
+        self._lock = threading.Lock()
+
+
+    @classmethod
+    def with_threads(cls, thread_amt: int) -> Self:
+        """
+        Creates a pool with `thread_amt` loops, each running on its own thread.
+        """
+        loops = [EventLoop(f"game-pool-{i}") for i in range(thread_amt)]
+
+        for loop in loops:
+            loop.start_in_thread()
+
+        return cls(loops)
+
+
+    def submit(self, game: Game, start_delay: float = 0.0, on_finish: Callable[[], None] | None = None):
+        """
+        Starts the game on one of the pool's loops after `start_delay` seconds. Can be called from any thread. 
+        `on_finish` is called on the game's loop after the game ends.
+        """
+        with self._lock:
+            loop_idx = min(range(len(self.loops)), key=lambda i: self._running_game_amts[i])
+            self._running_game_amts[loop_idx] += 1
+
+            running_game_amt = sum(self._running_game_amts)
+
+        loop = self.loops[loop_idx]
+        print(f"LOG: Running game on '{loop.name}' ({running_game_amt} games on {len(self.loops)} threads)")
+
+        def finish():
+            with self._lock:
+                self._running_game_amts[loop_idx] -= 1
+
+            if on_finish is not None:
+                on_finish()
+
+        task = GameTask(loop, game, on_finish=finish)
+        start_at = time.perf_counter() + start_delay
+
+        loop.call_soon_threadsafe(lambda: loop.call_at(start_at, task.start))
+
+
+    def get_running_game_amt(self) -> int:
+        with self._lock:
+            return sum(self._running_game_amts)
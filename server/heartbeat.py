@@ -0,0 +1,158 @@
+"""
+This module contains the liveness checks for the clients that are waiting for an opponent.
+
+Clients that add the `heartbeat` option to their game request (e.g. `?game+heartbeat:word_golf:...`) receive a `?ping`
+every `HEARTBEAT_INTERVAL_SECS` while they wait, which they answer with `!pong`. A waiting client that has not been
+heard from in `WAITING_IDLE_TIMEOUT_SECS` is considered dead and evicted from its queue. Clients without the option
+are never pinged (older clients do not know the command), so only TCP keepalives detect their dead connections.
+"""
+
+import select
+import socket
+import time
+
+from server_types import Connection
+from matchmaking import EvictionReason
+from send_batcher import MSG_DONTWAIT, send_without_blocking
+from wire_protocol import encode_command, PING_CMD, PONG_CMD
+
+from stratego.stratego_player import StrategoPlayer
+from word_golf.word_golf_types import WordGolfPlayer
+from secret_game.secret_game_types import SecretGamePlayer
+
+WaitingPlayer = StrategoPlayer | WordGolfPlayer | SecretGamePlayer
+
+HEARTBEAT_INTERVAL_SECS = 5.0
+
+# A client that uses heartbeats is evicted after missing 3 pings in a row.
+WAITING_IDLE_TIMEOUT_SECS = 3 * HEARTBEAT_INTERVAL_SECS
+
+# How long a client has to send its `?game` request after connecting.
+GAME_REQUEST_TIMEOUT_SECS = 60.0
+
+# The `?game` request has no terminator, so it is complete once the client stops sending for this long (in case it
+# was split across several reads).
+GAME_REQUEST_SETTLE_SECS = 0.05
+
+# Detects the dead connections of the clients that do not use heartbeats (where the platform supports tuning it).
+KEEPALIVE_IDLE_SECS = 10
+KEEPALIVE_INTERVAL_SECS = 5
+KEEPALIVE_PROBE_AMT = 3
+
+class HeartbeatMonitor:
+    """
+    Pings the waiting players that asked for heartbeats and tracks when each waiting player was last heard from.
+    Not thread-safe: it must only be used by the thread (or event loop) that watches the waiting players' connections.
+    """
+
+    def __init__(self):
+        # The watched players (by their connection, since the dataclass players are not hashable), along with
+        # when they were last heard from.
+        self._watched: dict[Connection, tuple[WaitingPlayer, float]] = {}
+
+
+    def watch(self, player: WaitingPlayer, now: float | None = None):
+        self._watched[player.conn] = (player, time.perf_counter() if now is None else now)
+
+
+    def unwatch(self, player: WaitingPlayer):
+        self._watched.pop(player.conn, None)
+
+
+    def on_heard(self, player: WaitingPlayer, now: float | None = None):
+        """
+        Called when any data (i.e. a `!pong`) is received from a waiting player.
+        """
+        if player.conn in self._watched:
+            self.watch(player, now)
+
+
+    def get_watched_amt(self) -> int:
+        return len(self._watched)
+
+
+    def tick(self, now: float) -> list[tuple[WaitingPlayer, EvictionReason]]:
+        """
+        Pings every watched player that uses heartbeats. Returns the players that should be evicted (which are not
+        watched anymore), either because they went idle or because the ping could not be sent.
+        """
+        evicted: list[tuple[WaitingPlayer, EvictionReason]] = []
+
+        for player, last_heard_at in list(self._watched.values()):
+            if not player.heartbeat:
+                continue
+
+            if now - last_heard_at > WAITING_IDLE_TIMEOUT_SECS:
+                evicted.append((player, 'idle'))
+                continue
+
+            data = encode_command(PING_CMD, player.protocol)
+
+            try:
+                # A waiting client's send buffer only ever holds pings, so a full one means that it stopped reading.
+                if send_without_blocking(player.conn, data) != len(data):
+                    evicted.append((player, 'idle'))
+
+            except OSError:
+                evicted.append((player, 'disconnected'))
+
+        for player, _ in evicted:
+            self.unwatch(player)
+
+        return evicted
+
+
+def is_only_pongs(data: bytes) -> bool:
+    """
+    Returns `True` if the data that a waiting client sent only contains answers to the heartbeats.
+    """
+    return all(cmd == '' or cmd.startswith(PONG_CMD) for cmd in data.decode(errors='replace').split('\\'))
+
+
+def is_connection_alive(conn: Connection) -> bool:
+    """
+    Checks (without blocking or consuming any data) whether the client closed its side of the connection.
+    Can be called from a thread other than the one reading from the connection.
+    """
+    try:
+        readable, _, _ = select.select([conn], [], [], 0)
+
+        if not readable:
+            return True
+
+        return conn.recv(1, socket.MSG_PEEK | (MSG_DONTWAIT or 0)) != b''
+
+    # The data was read by the connection's reader in the meantime.
+    except BlockingIOError:
+        return True
+
+    # The connection was reset (or already closed).
+    except (OSError, ValueError):
+        return False
+
+
+def enable_keepalive(conn: Connection):
+    """
+    Makes the OS probe the connection while it is idle, so that a client that vanished (i.e. lost its network)
+    without closing the connection is eventually noticed as disconnected.
+    """
+    try:
+        conn.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+    # Not a TCP socket (i.e. a socket pair).
+    except OSError:
+        return
+
+    for option_name, value in (
+        ('TCP_KEEPIDLE', KEEPALIVE_IDLE_SECS),
+        ('TCP_KEEPINTVL', KEEPALIVE_INTERVAL_SECS),
+        ('TCP_KEEPCNT', KEEPALIVE_PROBE_AMT),
+    ):
+        option = getattr(socket, option_name, None)
+
+        if option is None:
+            continue
+
+        try:
+            conn.setsockopt(socket.IPPROTO_TCP, option, value)
+        except OSError: pass
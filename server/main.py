@@ -1,23 +1,67 @@
 import contextlib
 import io
+import os
 
 import socket_server
+import event_server
+import multi_worker
 import sys
 
-def main():
-    socket_server.run()
-    
+def main(use_event_loop: bool, use_batched_physics: bool, worker_amt: int | None):
+    if use_batched_physics:
+        socket_server.enable_batched_physics()
+
+    if use_event_loop:
+        if worker_amt is not None:
+            print("ERROR: worker processes are not supported in event loop mode. Using a single process")
+
+        event_server.run()
+
+    elif worker_amt is not None:
+        multi_worker.run(worker_amt)
+
+    else:
+        socket_server.run()
+
+
+def parse_worker_amt(arg: str) -> int | None:
+    """
+    Parses the `workers` (one worker per core) or `workers=N` argument. Returns `None` if the argument is not one of them.
+    """
+    if arg == "workers":
+        return os.cpu_count() or 1
+
+    if arg.startswith("workers=") and arg.removeprefix("workers=").isdigit():
+        return max(1, int(arg.removeprefix("workers=")))
+
+    return None
+
 
 if __name__ == "__main__":
     args = sys.argv[1:]
 
+    # `event` runs the server in (opt-in) event loop mode, instead of using one thread per client.
+    use_event_loop = "event" in args
+    args = [arg for arg in args if arg != "event"]
+
+    # `batched-physics` simulates all Secret Game races in a single vectorized step (requires NumPy).
+    use_batched_physics = "batched-physics" in args
+    args = [arg for arg in args if arg != "batched-physics"]
+
+    # `workers` (or `workers=N`) runs the games on several worker processes that share the port.
+    worker_amt = None
+
+    for arg in args:
+        worker_amt = parse_worker_amt(arg) or worker_amt
+
+    args = [arg for arg in args if parse_worker_amt(arg) is None]
+
     if len(args) == 0:
-        main()
+        main(use_event_loop, use_batched_physics, worker_amt)
 
-    elif args[0] == "host":
+    elif args[0] == "host" and len(args) == 1:
         with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
-            main() # run with no terminal
+            main(use_event_loop, use_batched_physics, worker_amt) # run with no terminal
 
     else:
         print(f"ERROR: unknown command arguments: {' '.join(args)}")
-
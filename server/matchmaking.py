@@ -0,0 +1,162 @@
+"""
+This module contains the matchmaking queues that pair up players waiting for a game.
+"""
+
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Generic, Literal, TypeVar
+
+P = TypeVar('P')
+
+# Why a waiting player was removed from their queue without being paired up:
+# * `disconnected`: the client closed its connection while waiting.
+# * `idle`: the client stopped answering the heartbeats (see `heartbeat.py`).
+# * `dead-at-pairing`: the client's connection was found closed by the liveness check right before pairing.
+EvictionReason = Literal['disconnected', 'idle', 'dead-at-pairing']
+
+@dataclass
+class MatchQueueStats:
+    matches: int = 0
+    # Clients that disconnected while waiting.
+    evictions: int = 0
+    # Clients that stopped answering the heartbeats while waiting.
+    idle_evictions: int = 0
+    # Clients whose connection was dead when they were about to be paired up.
+    dead_at_pairing: int = 0
+
+
+    def record_eviction(self, reason: EvictionReason):
+        if reason == 'disconnected':
+            self.evictions += 1
+        elif reason == 'idle':
+            self.idle_evictions += 1
+        else:
+            self.dead_at_pairing += 1
+
+
+class MatchQueue(Generic[P]):
+    """
+    A queue of players waiting for a particular game. Joining the queue never blocks. Instead, a matchmaker
+    thread sleeps on a condition variable until at least two players are waiting, atomically pops the
+    two oldest players and hands them to the `on_match` callback given to `start`.
+
+    The `on_match` callback runs on the matchmaker thread, so it should hand the game off to another
+    thread (or event loop) instead of running it directly.
+
+    If an `is_alive` check is given to `start`, both players are checked right before being paired up. A dead
+    player is evicted (and handed to `on_evict`) while the other one goes back to the front of the queue.
+    """
+
+    def __init__(self, game_name: str):
+        self.game_name = game_name
+
+        self._waiting_players: deque[P] = deque()
+        self._condition = threading.Condition()
+
+        self._on_match: Callable[[P, P], None] | None = None
+        self._is_alive: Callable[[P], bool] | None = None
+        self._on_evict: Callable[[P], None] | None = None
+
+        self.stats = MatchQueueStats()
+
+
+    def start(self, on_match: Callable[[P, P], None], is_alive: Callable[[P], bool] | None = None, on_evict: Callable[[P], None] | None = None):
+        """
+        Starts the matchmaker thread for this queue.
+        """
+        self._on_match = on_match
+        self._is_alive = is_alive
+        self._on_evict = on_evict
+
+        thread = threading.Thread(target=self._run_matchmaker, name=f"{self.game_name}-matchmaker")
+        thread.daemon = True
+        thread.start()
+
+
+    def join(self, player: P):
+        with self._condition:
+            self._waiting_players.append(player)
+            self._condition.notify()
+
+
+    def cancel(self, player: P, reason: EvictionReason = 'disconnected') -> bool:
+        """
+        Removes a waiting player from the queue (i.e. when they disconnect). Returns `False` if
+        the player was not waiting anymore (i.e. they were already paired up).
+        """
+        with self._condition:
+            try:
+                self._waiting_players.remove(player)
+
+            except ValueError:
+                return False
+
+            self.stats.record_eviction(reason)
+            return True
+
+
+    def is_waiting(self, player: P) -> bool:
+        with self._condition:
+            return player in self._waiting_players
+
+
+    def get_waiting_player_amt(self) -> int:
+        with self._condition:
+            return len(self._waiting_players)
+
+
+    def _run_matchmaker(self):
+        assert self._on_match
+
+        while True:
+            with self._condition:
+                # Wait for an opponent to join.
+                self._condition.wait_for(lambda: len(self._waiting_players) >= 2)
+
+                player1 = self._waiting_players.popleft()
+                player2 = self._waiting_players.popleft()
+
+            if not self._check_alive(player1, player2):
+                continue
+
+            with self._condition:
+                self.stats.matches += 1
+
+            try:
+                self._on_match(player1, player2)
+
+            # A failed game start should not stop the matchmaker.
+            except Exception as e:
+                print(f"ERROR: could not start {self.game_name} game: {e!r}")
+
+
+    def _check_alive(self, player1: P, player2: P) -> bool:
+        """
+        Returns `True` if both players are alive. Otherwise, evicts the dead ones and puts the other one
+        back at the front of the queue.
+        """
+        if self._is_alive is None:
+            return True
+
+        players_alive = [(player1, self._is_alive(player1)), (player2, self._is_alive(player2))]
+
+        if all(is_alive for _, is_alive in players_alive):
+            return True
+
+        with self._condition:
+            # In reverse, so that the oldest player ends up at the front.
+            for player, is_alive in reversed(players_alive):
+                if is_alive:
+                    self._waiting_players.appendleft(player)
+                else:
+                    self.stats.record_eviction('dead-at-pairing')
+
+        for player, is_alive in players_alive:
+            if not is_alive:
+                print(f"LOG: Evicted a dead {self.game_name} player right before pairing. Queue: {self.stats}")
+
+                if self._on_evict:
+                    self._on_evict(player)
+
+        return False
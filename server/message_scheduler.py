@@ -0,0 +1,151 @@
+"""
+This module contains the scheduler for the messages that a game sends to a player outside of its state syncs (i.e. alerts).
+"""
+
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable
+
+# Tolerance for the floating point error of the token refills (so a message is not held back for a few nanoseconds).
+TOKEN_EPSILON = 1e-9
+
+@dataclass
+class DeliveryStats:
+    """
+    Counters for the messages delivered by a `MessageScheduler`. The latency of a message is the time from the event
+    that scheduled it until it was written to its connection (see `MessageScheduler.record_written`).
+    """
+    delivered: int = 0
+    total_latency_secs: float = 0.0
+    max_latency_secs: float = 0.0
+
+
+    def record(self, latency_secs: float):
+        self.delivered += 1
+        self.total_latency_secs += latency_secs
+        self.max_latency_secs = max(self.max_latency_secs, latency_secs)
+
+
+    def merge(self, other: 'DeliveryStats'):
+        self.delivered += other.delivered
+        self.total_latency_secs += other.total_latency_secs
+        self.max_latency_secs = max(self.max_latency_secs, other.max_latency_secs)
+
+
+    def get_average_latency_secs(self) -> float:
+        return self.total_latency_secs / self.delivered if self.delivered > 0 else 0.0
+
+
+class MessageScheduler:
+    """
+    Keeps a queue of outbound messages per player and delivers them on every `deliver` call, independently of
+    whether the game has any state to sync.
+
+    By default every queued message is delivered right away. If `max_per_sec` is set, each player gets a token
+    bucket instead: up to `burst` messages go out at once, and after that one more every `1 / max_per_sec`
+    seconds. Messages over the budget stay queued (in order) and `deliver` returns when the next one is due.
+    """
+
+    def __init__(self, player_amt: int, max_per_sec: float | None = None, burst: int = 1):
+        if max_per_sec is not None and max_per_sec <= 0:
+            raise ValueError(f"max_per_sec must be positive, got {max_per_sec}")
+
+        if burst < 1:
+            raise ValueError(f"burst must be at least 1, got {burst}")
+
+        self.max_per_sec = max_per_sec
+        self.burst = burst
+
+        # The time each message was scheduled at, along with the message.
+        self._queues: list[deque[tuple[float, str]]] = [deque() for _ in range(player_amt)]
+
+        # When each message that was delivered but not written yet was scheduled.
+        self._unwritten: list[list[float]] = [[] for _ in range(player_amt)]
+
+        # The remaining budget of each player, as of `_refilled_at` (only used when rate limited).
+        self._tokens = [float(burst) for _ in range(player_amt)]
+        self._refilled_at: list[float | None] = [None for _ in range(player_amt)]
+
+        self.stats = [DeliveryStats() for _ in range(player_amt)]
+
+
+    def schedule(self, player_idx: int, message: str, now: float | None = None):
+        """
+        Queues a message for the player. `now` (in `time.perf_counter` seconds) is when the event that caused
+        the message happened, which defaults to the current time.
+        """
+        if now is None:
+            now = time.perf_counter()
+
+        self._queues[player_idx].append((now, message))
+
+
+    def has_pending(self, player_idx: int) -> bool:
+        return len(self._queues[player_idx]) > 0
+
+
+    def deliver(self, now: float, send: Callable[[int, str], None]) -> float | None:
+        """
+        Calls `send` with every message that is within its player's budget. Returns the time (in `time.perf_counter`
+        seconds) when the next held back message can be delivered, or `None` if nothing was held back.
+        """
+        next_due_at = None
+
+        for player_idx, queue in enumerate(self._queues):
+            if self.max_per_sec is not None:
+                self._refill(player_idx, now)
+
+            while len(queue) > 0 and (self.max_per_sec is None or self._tokens[player_idx] >= 1 - TOKEN_EPSILON):
+                scheduled_at, message = queue.popleft()
+                send(player_idx, message)
+
+                self._unwritten[player_idx].append(scheduled_at)
+
+                if self.max_per_sec is not None:
+                    self._tokens[player_idx] -= 1
+
+            if len(queue) > 0:
+                assert self.max_per_sec is not None
+                due_at = now + (1 - self._tokens[player_idx]) / self.max_per_sec
+
+                if next_due_at is None or due_at < next_due_at:
+                    next_due_at = due_at
+
+        return next_due_at
+
+
+    def record_written(self, player_idx: int, now: float):
+        """
+        Called (with the current `time.perf_counter` time) once every message delivered to the player so far
+        has been written to their connection. Records the latency of those messages.
+        """
+        unwritten = self._unwritten[player_idx]
+
+        for scheduled_at in unwritten:
+            self.stats[player_idx].record(now - scheduled_at)
+
+        unwritten.clear()
+
+
+    def _refill(self, player_idx: int, now: float):
+        assert self.max_per_sec is not None
+        refilled_at = self._refilled_at[player_idx]
+
+        if refilled_at is not None:
+            refill = (now - refilled_at) * self.max_per_sec
+            self._tokens[player_idx] = min(float(self.burst), self._tokens[player_idx] + refill)
+
+        self._refilled_at[player_idx] = now
+
+
+    def get_total_stats(self) -> DeliveryStats:
+        """
+        Returns the delivery stats of all players combined.
+        """
+        total = DeliveryStats()
+
+        for stats in self.stats:
+            total.merge(stats)
+
+        return total
@@ -0,0 +1,420 @@
+"""
+Do not run this script directly. Instead, call it as a library (e.g. `import multi_worker`).
+
+This is an opt-in alternative to `socket_server.run` that spreads the games over several processes, so that
+they are not all limited to a single core by the GIL. The supervisor process forks the worker processes, which
+all listen on `PORT` through `SO_REUSEPORT` (so the kernel spreads the new connections between them) and read
+the clients' `?game` requests. Two players who want to play each other may land on different workers, so the
+matchmaking is done by a single lobby on the supervisor:
+
+1. A worker forwards each game request to the lobby, along with the client's socket (passed as a file
+   descriptor over the worker's Unix socket).
+2. The lobby keeps the waiting clients, and drops the ones that disconnect (or stop answering the heartbeats)
+   while waiting.
+3. Once two (live) clients want the same game, the lobby hands both sockets to the worker with the fewest running
+   games, which then runs the game on its game pool (exactly like `socket_server` does).
+
+The protocol is exactly the same, so existing clients work unchanged.
+"""
+
+import json
+import multiprocessing
+import os
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable
+
+import socket_server
+from socket_server import get_local_ip
+from server_types import Connection, BUF_SIZE
+from matchmaking import MatchQueueStats, EvictionReason
+from heartbeat import HeartbeatMonitor, is_connection_alive, is_only_pongs, enable_keepalive, HEARTBEAT_INTERVAL_SECS
+
+from stratego.stratego_player import StrategoPlayer
+from word_golf.word_golf_types import WordGolfPlayer
+from secret_game.secret_game_types import SecretGamePlayer
+
+# The largest message sent between the lobby and a worker (a JSON object, plus up to 2 sockets).
+LOBBY_MSG_SIZE = 64 * 1024
+MAX_SOCKETS_PER_LOBBY_MSG = 2
+
+LobbyMsg = dict[str, Any]
+
+def send_lobby_msg(channel: Connection, msg: LobbyMsg, conns: list[Connection] | None = None):
+    """
+    Sends a message (and the given sockets) over a lobby channel. Since the channel is a `SOCK_SEQPACKET`
+    socket, each message is sent (and received) as a whole, so several threads can send on the same channel.
+    """
+    fds = [conn.fileno() for conn in conns] if conns is not None else []
+    socket.send_fds(channel, [json.dumps(msg).encode()], fds)
+
+
+def recv_lobby_msg(channel: Connection) -> tuple[LobbyMsg, list[Connection]] | None:
+    """
+    Receives a message (and the sockets that came with it) from a lobby channel. Returns `None` if the
+    other side of the channel was closed.
+    """
+    try:
+        data, fds, _, _ = socket.recv_fds(channel, LOBBY_MSG_SIZE, MAX_SOCKETS_PER_LOBBY_MSG)
+    except ConnectionError:
+        return None
+
+    conns = [socket.socket(fileno=fd) for fd in fds]
+
+    if not data:
+        for conn in conns:
+            conn.close()
+
+        return None
+
+    return json.loads(data), conns
+
+
+def get_game_starter(player: StrategoPlayer | WordGolfPlayer | SecretGamePlayer) -> Callable[..., None]:
+    if isinstance(player, StrategoPlayer):
+        return socket_server.start_stratego_game
+    elif isinstance(player, WordGolfPlayer):
+        return socket_server.start_word_golf_game
+    else:
+        return socket_server.start_secret_game_game
+
+
+@dataclass
+class WaitingClient:
+    conn: Connection
+    # The client's `?game` command, which is forwarded to the worker that runs their game.
+    request: str
+    player: StrategoPlayer | WordGolfPlayer | SecretGamePlayer
+    worker_idx: int
+
+
+@dataclass
+class LobbyStats(MatchQueueStats):
+    # Matches between two clients that connected to different workers.
+    cross_worker_matches: int = 0
+
+
+class Lobby:
+    """
+    The cross-process matchmaking lobby. Runs on the supervisor's main thread and multiplexes the worker
+    channels and the waiting clients' sockets with a selector, so it needs no locking.
+    """
+
+    def __init__(self, channels: list[Connection]):
+        self.channels = channels
+        # The amount of games running on each worker, or `None` if the worker died.
+        self.running_game_amts: list[int | None] = [0 for _ in channels]
+
+        # The waiting clients of each game (by the game's name), oldest first.
+        self.waiting_clients: dict[str, deque[WaitingClient]] = {}
+
+        self.stats = LobbyStats()
+
+        self.heartbeat_monitor = HeartbeatMonitor()
+        self._next_heartbeat_at = time.perf_counter() + HEARTBEAT_INTERVAL_SECS
+
+        # The game that each waiting client is waiting for, along with the client.
+        self._waiting_clients_by_conn: dict[Connection, tuple[str, WaitingClient]] = {}
+
+        self._selector = selectors.DefaultSelector()
+
+        for worker_idx, channel in enumerate(channels):
+            self._selector.register(channel, selectors.EVENT_READ, lambda worker_idx=worker_idx: self.on_worker_msg(worker_idx))
+
+
+    def run_forever(self):
+        while True:
+            for key, _ in self._selector.select(max(0.0, self._next_heartbeat_at - time.perf_counter())):
+                key.data()
+
+            now = time.perf_counter()
+
+            if now >= self._next_heartbeat_at:
+                self.run_heartbeats(now)
+                self._next_heartbeat_at = now + HEARTBEAT_INTERVAL_SECS
+
+
+    def run_heartbeats(self, now: float):
+        """
+        Pings the waiting clients and evicts the idle ones.
+        """
+        for player, reason in self.heartbeat_monitor.tick(now):
+            game_name, client = self._waiting_clients_by_conn[player.conn]
+            self.evict_waiting_client(game_name, client, reason)
+
+
+    def on_worker_msg(self, worker_idx: int):
+        received = recv_lobby_msg(self.channels[worker_idx])
+
+        if received is None:
+            print(f"ERROR: Worker #{worker_idx} died. Its games were lost and no new games are sent to it")
+            self._selector.unregister(self.channels[worker_idx])
+            self.running_game_amts[worker_idx] = None
+            return
+
+        msg, conns = received
+
+        if msg["kind"] == "join":
+            self.add_waiting_client(worker_idx, conns[0], msg["request"])
+
+        elif msg["kind"] == "game-over":
+            running_game_amt = self.running_game_amts[worker_idx]
+
+            if running_game_amt is not None:
+                self.running_game_amts[worker_idx] = running_game_amt - 1
+
+        else:
+            print(f"ERROR: unknown lobby message from worker #{worker_idx}: {msg}")
+
+
+    def add_waiting_client(self, worker_idx: int, conn: Connection, request: str):
+        player = socket_server.create_player_from_game_request(conn, request)
+
+        if player is None:
+            conn.close()
+            return
+
+        game_name = request.split(':')[1]
+        client = WaitingClient(conn, request, player, worker_idx)
+
+        enable_keepalive(conn)
+
+        self.waiting_clients.setdefault(game_name, deque()).append(client)
+        self._waiting_clients_by_conn[conn] = (game_name, client)
+        self._selector.register(conn, selectors.EVENT_READ, lambda: self.on_waiting_client_readable(game_name, client))
+        self.heartbeat_monitor.watch(player)
+
+        self.match_waiting_clients(game_name)
+
+
+    def on_waiting_client_readable(self, game_name: str, client: WaitingClient):
+        try:
+            raw_data = client.conn.recv(BUF_SIZE)
+        except ConnectionError:
+            raw_data = b''
+
+        if raw_data:
+            self.heartbeat_monitor.on_heard(client.player)
+
+            if not is_only_pongs(raw_data):
+                print(f"ERROR: ignoring data sent by '{client.player.username}' before their game started: '{raw_data!r}'")
+
+            return
+
+        self.evict_waiting_client(game_name, client, 'disconnected')
+
+
+    def evict_waiting_client(self, game_name: str, client: WaitingClient, reason: EvictionReason):
+        # The client is not in the queue anymore if it was found dead right before pairing.
+        if client in self.waiting_clients[game_name]:
+            self.waiting_clients[game_name].remove(client)
+
+        self.forget_waiting_client(client)
+        self.stats.record_eviction(reason)
+
+        print(f"LOG: Evicted '{client.player.username}' while waiting for a game ({reason}). Lobby: {self.stats}")
+
+
+    def forget_waiting_client(self, client: WaitingClient):
+        """
+        Stops watching the client's connection and closes the lobby's copy of it.
+        """
+        self._selector.unregister(client.conn)
+        self.heartbeat_monitor.unwatch(client.player)
+        self._waiting_clients_by_conn.pop(client.conn, None)
+        client.conn.close()
+
+
+    def match_waiting_clients(self, game_name: str):
+        """
+        Pairs up the two oldest waiting clients of the game (if there are two) and starts their game on a worker.
+        """
+        waiting_clients = self.waiting_clients[game_name]
+
+        while len(waiting_clients) >= 2:
+            worker_idx = self.pick_worker()
+
+            if worker_idx is None:
+                print(f"ERROR: no workers left to run a {game_name} game")
+                return
+
+            client_1 = waiting_clients.popleft()
+            client_2 = waiting_clients.popleft()
+
+            # Evict the clients whose connection died since they were last watched, so that a live client is never
+            # paired with a dead one. The live client goes back to the front of the queue.
+            clients_alive = [(client_1, is_connection_alive(client_1.conn)), (client_2, is_connection_alive(client_2.conn))]
+
+            if not all(is_alive for _, is_alive in clients_alive):
+                for client, is_alive in reversed(clients_alive):
+                    if is_alive:
+                        waiting_clients.appendleft(client)
+                    else:
+                        self.evict_waiting_client(game_name, client, 'dead-at-pairing')
+
+                continue
+
+            try:
+                send_lobby_msg(
+                    self.channels[worker_idx],
+                    {"kind": "match", "requests": [client_1.request, client_2.request]},
+                    [client_1.conn, client_2.conn],
+                )
+
+            # The worker died (its channel is unregistered once the lobby reads its end of file).
+            except OSError as e:
+                print(f"ERROR: could not send a {game_name} game to worker #{worker_idx}: {e!r}")
+                self.running_game_amts[worker_idx] = None
+
+                waiting_clients.appendleft(client_2)
+                waiting_clients.appendleft(client_1)
+                continue
+
+            # The worker has its own copies of the sockets now.
+            for client in (client_1, client_2):
+                self.forget_waiting_client(client)
+
+            self.running_game_amts[worker_idx] += 1  # type: ignore[operator]
+            self.stats.matches += 1
+
+            if client_1.worker_idx != client_2.worker_idx:
+                self.stats.cross_worker_matches += 1
+
+            print(
+                f"LOG: Paired '{client_1.player.username}' (worker #{client_1.worker_idx}) and '{client_2.player.username}' " +
+                f"(worker #{client_2.worker_idx}) for {game_name} on worker #{worker_idx}. Lobby: {self.stats}"
+            )
+
+
+    def pick_worker(self) -> int | None:
+        """
+        Returns the (alive) worker that is running the fewest games.
+        """
+        alive_worker_idxs = [i for i, amt in enumerate(self.running_game_amts) if amt is not None]
+
+        if len(alive_worker_idxs) == 0:
+            return None
+
+        return min(alive_worker_idxs, key=lambda i: self.running_game_amts[i])  # type: ignore[arg-type, return-value]
+
+
+def run_worker(worker_idx: int, channel: Connection, inherited_channels: list[Connection]):
+    """
+    Runs on a forked worker process. Accepts clients and forwards their game requests to the lobby,
+    while running the games that the lobby sends back.
+    """
+    # The lobby's ends of this worker's channel and of the channels of the workers forked before it. Otherwise the
+    # worker would keep the lobby's end of its own channel open, and never notice that the lobby went away.
+    for inherited_channel in inherited_channels:
+        inherited_channel.close()
+
+    thread = threading.Thread(target=receive_matches, args=(worker_idx, channel), name=f"worker-{worker_idx}-matches")
+    thread.daemon = True
+    thread.start()
+
+    with socket_server.create_listener(reuse_port=True) as s:
+        print(f"LOG: Worker #{worker_idx} (pid {os.getpid()}) accepting connections")
+        socket_server.accept_clients(s, lambda conn, addr: forward_client_to_lobby(channel, conn))
+
+
+def forward_client_to_lobby(channel: Connection, conn: Connection):
+    data = socket_server.read_game_request(conn)
+
+    # The client disconnected before choosing a game.
+    if data is None:
+        return
+
+    send_client_to_lobby(channel, conn, data)
+
+
+def send_client_to_lobby(channel: Connection, conn: Connection, request: str):
+    """
+    Sends the client's game request to the lobby, which then waits for an opponent for them.
+    """
+    send_lobby_msg(channel, {"kind": "join", "request": request}, [conn])
+
+    # The lobby has its own copy of the socket now.
+    conn.close()
+
+
+def receive_matches(worker_idx: int, channel: Connection):
+    """
+    Starts the games that the lobby sends to this worker. Exits the worker if the lobby goes away, since no
+    new clients could be paired up anymore.
+    """
+    while True:
+        received = recv_lobby_msg(channel)
+
+        if received is None:
+            print(f"ERROR: Worker #{worker_idx} lost its connection to the lobby. Exiting")
+            os._exit(1)
+
+        msg, conns = received
+
+        if msg["kind"] != "match":
+            print(f"ERROR: unknown lobby message: {msg}")
+            continue
+
+        player_1, player_2 = [
+            socket_server.create_player_from_game_request(conn, request)
+            for conn, request in zip(conns, msg["requests"])
+        ]
+        assert player_1 is not None and player_2 is not None, "the lobby only sends valid game requests"
+
+        start_game = get_game_starter(player_1)
+
+        # The lobby needs to know when the game ends, since it balances the games by how many each worker is running.
+        notify_game_over = lambda: send_lobby_msg(channel, {"kind": "game-over"})
+
+        requests = dict(zip(conns, msg["requests"]))
+
+        # A player whose opponent disconnected since the lobby paired them up goes back to the lobby.
+        if not socket_server.check_paired_players_alive([player_1, player_2], rejoin=lambda player: send_client_to_lobby(channel, player.conn, requests[player.conn])):
+            notify_game_over()
+            continue
+
+        try:
+            start_game(player_1, player_2, notify_game_over)
+
+        # The game never started (i.e. a player disconnected before receiving `?game-start`).
+        except Exception as e:
+            socket_server.close_unstarted_game([player_1, player_2], e)
+            notify_game_over()
+
+
+def run(worker_amt: int | None = None):
+    """
+    Runs the server on several worker processes (one per core by default), with a shared lobby on this process.
+    """
+    worker_amt = worker_amt or os.cpu_count() or 1
+
+    if not hasattr(socket, "SO_REUSEPORT"):
+        print("ERROR: SO_REUSEPORT is not supported on this platform. Running a single process instead")
+        socket_server.run()
+        return
+
+    # The workers are forked before this process starts any threads.
+    context = multiprocessing.get_context("fork")
+    channels: list[Connection] = []
+
+    for worker_idx in range(worker_amt):
+        lobby_end, worker_end = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+
+        process = context.Process(
+            target=run_worker,
+            args=(worker_idx, worker_end, [*channels, lobby_end]),
+            name=f"worker-{worker_idx}",
+            daemon=True,
+        )
+        process.start()
+
+        worker_end.close()
+        channels.append(lobby_end)
+
+    print(f"LOG: Server listening on {get_local_ip()}:{socket_server.PORT} ({worker_amt} worker processes)")
+
+    Lobby(channels).run_forever()
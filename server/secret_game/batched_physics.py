@@ -0,0 +1,361 @@
+"""
+This module contains an optional physics engine that simulates the cars of every active Secret Game race at once.
+
+Instead of each `SecretGameGame` stepping its own two cars with per-player Python calls, the state of all the cars
+(position, angle, speed, turn input, lap state and completed laps) is kept in NumPy arrays, and every tick advances
+all of them with a handful of vectorized operations. The races share a single fixed-timestep clock: whichever race
+is stepped first advances the whole batch, and every race then reads its own cars' state back (see `sync_race`).
+
+Given the same turn inputs, every tick gives the same result as `SecretGameGame.step_race` (see
+`benchmarks/bench_batched_physics.py`). Since the clock is shared, the timing differs from a race with its own clock:
+* A race's ticks are in phase with the batch's clock, so its first tick can come up to one tick earlier.
+* A race's cars keep moving while its game is not stepped, since any race advances the whole batch (the game reads
+  their state back on its next step).
+* When the batch falls behind, the skipped ticks are skipped for every race at once.
+
+NumPy is an optional dependency. When it is not installed, `is_batched_physics_available` returns `False`
+and the races keep using their own physics.
+"""
+
+import math
+import threading
+
+from secret_game.map import Map
+from secret_game.tile import TileCode
+from secret_game.secret_game_types import (
+    SecretGamePlayer,
+    LapState,
+    TurnState,
+    MAP_RESOLUTION,
+    DEFAULT_SPEED,
+    TURN_SPEED,
+    SIMULATION_HZ,
+    MAX_SIMULATION_LAG_SECS,
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Indexed by lap state code.
+LAP_STATES: tuple[LapState, ...] = ('initial', 'looking_for_line', 'looking_for_checkpoint_a', 'looking_for_checkpoint_b')
+
+LAP_STATE_INITIAL = 0
+LAP_STATE_LOOKING_FOR_LINE = 1
+LAP_STATE_LOOKING_FOR_CHECKPOINT_A = 2
+LAP_STATE_LOOKING_FOR_CHECKPOINT_B = 3
+
+TURN_SIGNS: dict[TurnState, float] = {'straight': 0.0, 'left': -1.0, 'right': 1.0}
+
+# The type of each per-car array.
+_CAR_ARRAY_DTYPES = {
+    'pos_x': 'float64',
+    'pos_y': 'float64',
+    'angle': 'float64',
+    'speed': 'float64',
+    'turn_sign': 'float64',
+    'lap_state': 'int8',
+    'completed_laps': 'int32',
+    'spawn_x': 'float64',
+    'spawn_y': 'float64',
+    'race_row': 'int64',
+    'grid_offset': 'int64',
+    'grid_width': 'int64',
+    'grid_height': 'int64',
+}
+
+def is_batched_physics_available() -> bool:
+    return np is not None
+
+
+class BatchedRace:
+    """
+    A race registered in a `BatchedRacePhysics`. Its cars are the rows `first_row` to `first_row + car_amt - 1`
+    of the batch's arrays (which move when other races are removed).
+    """
+
+    def __init__(self, map_: Map, car_amt: int, required_laps: int):
+        self.map = map_
+        self.car_amt = car_amt
+        self.required_laps = required_laps
+
+        self.first_row = 0
+        self.winner_idx: int | None = None
+
+
+class BatchedRacePhysics:
+    """
+    Simulates the cars of all the registered races in one vectorized step per tick. Thread safe, since the
+    races can be stepped from different threads (or event loops).
+
+    The collision checks are the same as `SecretGameGame.check_collision` (a swept check of the tiles touched
+    during the tick), which relies on a car never moving more than one tile per tick.
+    """
+
+    def __init__(self, simulation_hz: int = SIMULATION_HZ):
+        if np is None:
+            raise RuntimeError("batched physics requires NumPy")
+
+        self.deltatime = 1 / simulation_hz
+
+        if DEFAULT_SPEED * self.deltatime > MAP_RESOLUTION:
+            raise ValueError(f"the simulation rate is too low for batched physics: {simulation_hz} Hz")
+
+        self._lock = threading.Lock()
+        self._races: list[BatchedRace] = []
+
+        self._accumulated_time = 0.0
+        self._last_timestamp: float | None = None
+
+        for name, dtype in _CAR_ARRAY_DTYPES.items():
+            setattr(self, name, np.zeros(0, dtype=dtype))
+
+        self.grid = np.zeros(0, dtype='uint8')
+        self.tick_amt = 0
+
+
+    def add_race(self, players: list[SecretGamePlayer], map_: Map, required_laps: int, now: float) -> BatchedRace:
+        """
+        Registers a race, starting from its players' current state. Its cars start moving on the batch's next tick.
+        """
+        race = BatchedRace(map_, len(players), required_laps)
+
+        new_values = {
+            'pos_x': [p.position.x for p in players if p.position],
+            'pos_y': [p.position.y for p in players if p.position],
+            'angle': [p.facing_angle for p in players],
+            'speed': [p.speed for p in players],
+            'turn_sign': [TURN_SIGNS[p.turn_state] for p in players],
+            'lap_state': [LAP_STATES.index(p.lap_state) for p in players],
+            'completed_laps': [p.completed_laps for p in players],
+            'spawn_x': [map_.get_spawn_position(i).x for i in range(len(players))],
+            'spawn_y': [map_.get_spawn_position(i).y for i in range(len(players))],
+            'race_row': [0] * len(players),
+            'grid_offset': [0] * len(players),
+            'grid_width': [map_.width] * len(players),
+            'grid_height': [map_.height] * len(players),
+        }
+
+        assert len(new_values['pos_x']) == len(players), "every player needs a position"
+
+        with self._lock:
+            race.first_row = len(self.pos_x)
+
+            for name, dtype in _CAR_ARRAY_DTYPES.items():
+                setattr(self, name, np.concatenate((getattr(self, name), np.array(new_values[name], dtype=dtype))))
+
+            self._races.append(race)
+            self._rebuild_race_layout()
+
+            if self._last_timestamp is None:
+                self._last_timestamp = now
+
+        return race
+
+
+    def remove_race(self, race: BatchedRace):
+        with self._lock:
+            if race not in self._races:
+                return
+
+            rows = np.arange(race.first_row, race.first_row + race.car_amt)
+
+            for name in _CAR_ARRAY_DTYPES:
+                setattr(self, name, np.delete(getattr(self, name), rows))
+
+            self._races.remove(race)
+            self._rebuild_race_layout()
+
+            if len(self._races) == 0:
+                self._last_timestamp = None
+                self._accumulated_time = 0.0
+
+
+    def set_turn_state(self, race: BatchedRace, player_idx: int, turn_state: TurnState):
+        with self._lock:
+            self.turn_sign[race.first_row + player_idx] = TURN_SIGNS[turn_state]
+
+
+    def advance(self, now: float) -> float:
+        """
+        Simulates every tick of all the races that is due by `now`. Returns when the next tick is due.
+        """
+        with self._lock:
+            if self._last_timestamp is None:
+                return now + self.deltatime
+
+            # Races on other threads may call this with a slightly older time.
+            if now > self._last_timestamp:
+                self._accumulated_time += now - self._last_timestamp
+                self._last_timestamp = now
+
+            # Drop the ticks that cannot be caught up on (i.e. after the server stalled).
+            if self._accumulated_time > MAX_SIMULATION_LAG_SECS:
+                print(f"LOG: Batched Secret Game physics fell behind by {self._accumulated_time:.3f}s, skipping ticks")
+                self._accumulated_time = self.deltatime
+
+            while self._accumulated_time >= self.deltatime:
+                self._tick()
+                self._accumulated_time -= self.deltatime
+
+            return now + (self.deltatime - self._accumulated_time)
+
+
+    def sync_race(self, race: BatchedRace, players: list[SecretGamePlayer]) -> int | None:
+        """
+        Copies the state of the race's cars back to its players. Returns the index of the winner, if the race has one.
+        """
+        with self._lock:
+            for player_idx, player in enumerate(players):
+                row = race.first_row + player_idx
+
+                assert player.position
+                player.position.set(float(self.pos_x[row]), float(self.pos_y[row]))
+                player.facing_angle = float(self.angle[row])
+                player.speed = float(self.speed[row])
+                player.lap_state = LAP_STATES[self.lap_state[row]]
+                player.completed_laps = int(self.completed_laps[row])
+
+            return race.winner_idx
+
+
+    def _rebuild_race_layout(self):
+        """
+        Recomputes the rows of every race and packs the tile grids of the maps in use into a single array.
+        """
+        grid_offsets: dict[int, int] = {}
+        grids = []
+        grid_size = 0
+
+        for race in self._races:
+            map_key = id(race.map)
+
+            if map_key not in grid_offsets:
+                grid_offsets[map_key] = grid_size
+                grids.append(np.frombuffer(race.map.tile_codes, dtype='uint8'))
+                grid_size += len(race.map.tile_codes)
+
+        row = 0
+
+        for race_row, race in enumerate(self._races):
+            race.first_row = row
+            rows = slice(row, row + race.car_amt)
+
+            self.race_row[rows] = race_row
+            self.grid_offset[rows] = grid_offsets[id(race.map)]
+
+            row += race.car_amt
+
+        self.grid = np.concatenate(grids) if len(grids) > 0 else np.zeros(0, dtype='uint8')
+
+
+    def _tick(self):
+        """
+        Runs one fixed-length tick for every car. The same as `SecretGameGame.step_race`, but vectorized.
+        """
+        if len(self.pos_x) == 0:
+            return
+
+        self.tick_amt += 1
+        dt = self.deltatime
+
+        racing = np.array([race.winner_idx is None for race in self._races], dtype=bool)[self.race_row]
+
+        start_x, start_y = self.pos_x.copy(), self.pos_y.copy()
+        start_angle, start_speed = self.angle.copy(), self.speed.copy()
+        start_lap_state, start_laps = self.lap_state.copy(), self.completed_laps.copy()
+
+        # Move using the current angle, then turn.
+        distance = np.where(racing, self.speed, 0.0) * dt
+        self.pos_x += np.cos(self.angle) * distance
+        self.pos_y += np.sin(self.angle) * distance
+
+        turned_angle = (self.angle + TURN_SPEED * self.turn_sign * dt) % math.tau
+        self.angle = np.where(racing, turned_angle, self.angle)
+
+        # Since a car moves at most one tile per tick, its top-left corner touches at most three tiles: the starting one,
+        # the ending one and (when moving diagonally into a new column and row) the one whose boundary it crosses first.
+        start_cell_x = np.floor(start_x / MAP_RESOLUTION).astype('int64')
+        start_cell_y = np.floor(start_y / MAP_RESOLUTION).astype('int64')
+        end_cell_x = np.floor(self.pos_x / MAP_RESOLUTION).astype('int64')
+        end_cell_y = np.floor(self.pos_y / MAP_RESOLUTION).astype('int64')
+
+        dx = (self.pos_x - start_x) / MAP_RESOLUTION
+        dy = (self.pos_y - start_y) / MAP_RESOLUTION
+        start_frac_x = start_x / MAP_RESOLUTION - start_cell_x
+        start_frac_y = start_y / MAP_RESOLUTION - start_cell_y
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_boundary_at = np.where(dx > 0.0, (1.0 - start_frac_x) / dx, np.where(dx < 0.0, start_frac_x / -dx, np.inf))
+            y_boundary_at = np.where(dy > 0.0, (1.0 - start_frac_y) / dy, np.where(dy < 0.0, start_frac_y / -dy, np.inf))
+
+        diagonal = (end_cell_x != start_cell_x) & (end_cell_y != start_cell_y)
+        x_first = x_boundary_at < y_boundary_at
+
+        mid_cell_x = np.where(diagonal & x_first, end_cell_x, start_cell_x)
+        mid_cell_y = np.where(diagonal & ~x_first, end_cell_y, start_cell_y)
+
+        hit_wall = np.zeros(len(self.pos_x), dtype=bool)
+        died = np.zeros(len(self.pos_x), dtype=bool)
+
+        for cell_x, cell_y in ((start_cell_x, start_cell_y), (mid_cell_x, mid_cell_y), (end_cell_x, end_cell_y)):
+            # The car is exactly one tile big, so its corners are always in the 2x2 tiles starting at its top-left corner's tile.
+            for offset_x, offset_y in ((0, 0), (1, 0), (0, 1), (1, 1)):
+                tile_codes = self._get_tile_codes(cell_x + offset_x, cell_y + offset_y)
+                alive = racing & ~died
+
+                hit_wall |= alive & (tile_codes == TileCode.WALL)
+
+                on_line = alive & (tile_codes == TileCode.LINE)
+                completed_lap = on_line & (self.lap_state == LAP_STATE_LOOKING_FOR_LINE)
+                self.completed_laps += completed_lap
+                self.lap_state[on_line & ((self.lap_state == LAP_STATE_INITIAL) | completed_lap)] = LAP_STATE_LOOKING_FOR_CHECKPOINT_A
+
+                on_checkpoint_a = alive & (tile_codes == TileCode.LAP_CHECK_A) & (self.lap_state == LAP_STATE_LOOKING_FOR_CHECKPOINT_A)
+                self.lap_state[on_checkpoint_a] = LAP_STATE_LOOKING_FOR_CHECKPOINT_B
+
+                on_checkpoint_b = alive & (tile_codes == TileCode.LAP_CHECK_B) & (self.lap_state == LAP_STATE_LOOKING_FOR_CHECKPOINT_B)
+                self.lap_state[on_checkpoint_b] = LAP_STATE_LOOKING_FOR_LINE
+
+                # Reset the cars that enter a Dead Zone. The rest of their movement is discarded.
+                in_dead_zone = alive & (tile_codes == TileCode.DEAD_ZONE)
+                self.pos_x[in_dead_zone] = self.spawn_x[in_dead_zone]
+                self.pos_y[in_dead_zone] = self.spawn_y[in_dead_zone]
+                self.angle[in_dead_zone] = 0.0
+                self.lap_state[in_dead_zone] = LAP_STATE_INITIAL
+                died |= in_dead_zone
+
+        self.speed = np.where(racing, np.where(hit_wall, DEFAULT_SPEED / 4, DEFAULT_SPEED), self.speed)
+
+        # The first car (in player order) to complete all its laps wins its race.
+        required_laps = np.array([race.required_laps for race in self._races], dtype='int32')[self.race_row]
+
+        for row in np.flatnonzero(racing & (self.completed_laps == required_laps)):
+            race = self._races[self.race_row[row]]
+
+            if race.winner_idx is not None:
+                continue
+
+            race.winner_idx = int(row) - race.first_row
+
+            # `step_race` stops at the winner, so the cars after it in the race do not move on the winning tick.
+            later_rows = slice(int(row) + 1, race.first_row + race.car_amt)
+
+            self.pos_x[later_rows] = start_x[later_rows]
+            self.pos_y[later_rows] = start_y[later_rows]
+            self.angle[later_rows] = start_angle[later_rows]
+            self.speed[later_rows] = start_speed[later_rows]
+            self.lap_state[later_rows] = start_lap_state[later_rows]
+            self.completed_laps[later_rows] = start_laps[later_rows]
+
+
+    def _get_tile_codes(self, map_x, map_y):
+        """
+        Looks up the tile code under every car. Tiles outside of a car's map are treated as track.
+        """
+        in_bounds = (map_x >= 0) & (map_x < self.grid_width) & (map_y >= 0) & (map_y < self.grid_height)
+        grid_idx = np.where(in_bounds, self.grid_offset + map_y * self.grid_width + map_x, 0)
+
+        return np.where(in_bounds, self.grid[grid_idx], TileCode.TRACK)
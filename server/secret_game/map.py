@@ -1,61 +1,235 @@
 from pathlib import Path
+from typing import Iterator
+import math
 import random
-from secret_game.tile import Tile, parse_tile_kind
-from secret_game.secret_game_types import real_position_from_map_position
+import threading
+from secret_game.tile import TileCode, parse_tile_code
+from secret_game.secret_game_types import Vector, real_position_from_map_position, MAP_RESOLUTION
 
 MAPS_FOLDER = Path(__file__).parent / "maps"
-MAP_AMT = sum(1 for item in MAPS_FOLDER.iterdir() if item.is_file() and item.name.startswith("map_"))
 
 class Map:
+    """
+    A map compiled into a flat, row-major byte array with one tile code (see `TileCode`) per tile.
+
+    Maps are shared by every race that uses them (see `MapRegistry`), so they must not be modified after being read.
+    """
+
     def __init__(self, file_name: str):
         self.read_map_data(file_name)
 
 
     def read_map_data(self, file_name: str):
-        self.grid: list[list[Tile]] = []
         p1_spawn_map_pos = None
         p2_spawn_map_pos = None
 
         with open(file_name, 'r') as f:
-            r = 0
+            lines = [raw_line.rstrip() for raw_line in f.readlines()]
 
-            for raw_line in f.readlines():
-                line = raw_line.rstrip()
-                row = []
+        self.width = max((len(line) for line in lines), default=0)
+        self.height = len(lines)
 
-                for c in range(len(line)):
-                    x, y = c, r
+        # Shorter rows are padded with track tiles (i.e. their trailing spaces were stripped).
+        tile_codes = bytearray(self.width * self.height)
 
-                    kind = parse_tile_kind(line[c])
+        for r, line in enumerate(lines):
+            row_start = r * self.width
 
-                    if kind == 'spawnpoint_p1':
-                        p1_spawn_map_pos = (x, y)
+            for c, ch in enumerate(line):
+                code = parse_tile_code(ch)
 
-                    elif kind == 'spawnpoint_p2':
-                        p2_spawn_map_pos = (x, y)
+                if code == TileCode.SPAWNPOINT_P1:
+                    p1_spawn_map_pos = (c, r)
 
-                    row.append(Tile(map_pos=(x, y), kind=kind))
+                elif code == TileCode.SPAWNPOINT_P2:
+                    p2_spawn_map_pos = (c, r)
 
-                self.grid.append(row)
-                r += 1
+                tile_codes[row_start + c] = code
+
+        self.tile_codes = bytes(tile_codes)
 
         assert p1_spawn_map_pos, "No P1 spawn position found in map"
         assert p2_spawn_map_pos, "No P2 spawn position found in map"
 
         self.p1_spawn_map_pos = real_position_from_map_position(p1_spawn_map_pos)
         self.p2_spawn_map_pos = real_position_from_map_position(p2_spawn_map_pos)
-        
-    
-    def get_tile(self, map_x: int, max_y: int) -> Tile | None:
-        if map_x >= 0 and map_x < len(self.grid[0]) and max_y >= 0 and max_y < len(self.grid):
-            r, c = max_y, map_x
-            return self.grid[r][c]
+
+
+    def get_spawn_position(self, player_idx: int) -> Vector:
+        """
+        Returns a copy of the player's spawn position (so that moving the player does not move the shared map's spawn point).
+        """
+        spawn_pos = self.p1_spawn_map_pos if player_idx == 0 else self.p2_spawn_map_pos
+        return Vector(x=spawn_pos.x, y=spawn_pos.y)
+
+
+    def get_tile_code(self, map_x: int, map_y: int) -> int | None:
+        """
+        Returns the code of the tile at the given map position, or `None` if it is outside of the map.
+        """
+        if 0 <= map_x < self.width and 0 <= map_y < self.height:
+            return self.tile_codes[map_y * self.width + map_x]
         else:
             return None
+
+
+def traverse_map_cells(start_x: float, start_y: float, end_x: float, end_y: float) -> Iterator[tuple[int, int]]:
+    """
+    Yields every map cell that the segment between two real positions passes through, in order (starting with 
+    the start position's cell and ending with the end position's cell), using a DDA grid traversal. 
+    When the segment crosses exactly through a cell corner, both neighbouring cells are yielded.
+    """
+    x0, y0 = start_x / MAP_RESOLUTION, start_y / MAP_RESOLUTION
+    x1, y1 = end_x / MAP_RESOLUTION, end_y / MAP_RESOLUTION
+
+    cell_x, cell_y = math.floor(x0), math.floor(y0)
+    yield cell_x, cell_y
+
+    step_amt = abs(math.floor(x1) - cell_x) + abs(math.floor(y1) - cell_y)
+
+    if step_amt == 0:
+        return
+
+    dx, dy = x1 - x0, y1 - y0
+
+    # The distance (as a fraction of the segment) to the next vertical / horizontal cell boundary, and between boundaries.
+    if dx > 0.0:
+        step_x, next_x_boundary, x_boundary_spacing = 1, (cell_x + 1 - x0) / dx, 1 / dx
+    elif dx < 0.0:
+        step_x, next_x_boundary, x_boundary_spacing = -1, (x0 - cell_x) / -dx, 1 / -dx
+    else:
+        step_x, next_x_boundary, x_boundary_spacing = 0, math.inf, math.inf
+
+    if dy > 0.0:
+        step_y, next_y_boundary, y_boundary_spacing = 1, (cell_y + 1 - y0) / dy, 1 / dy
+    elif dy < 0.0:
+        step_y, next_y_boundary, y_boundary_spacing = -1, (y0 - cell_y) / -dy, 1 / -dy
+    else:
+        step_y, next_y_boundary, y_boundary_spacing = 0, math.inf, math.inf
+
+    for _ in range(step_amt):
+        if next_x_boundary < next_y_boundary:
+            cell_x += step_x
+            next_x_boundary += x_boundary_spacing
+        else:
+            cell_y += step_y
+            next_y_boundary += y_boundary_spacing
+
+        yield cell_x, cell_y
+
+
+class _MapEntry:
+    def __init__(self, path: Path, modified_time_ns: int, map_: Map):
+        self.path = path
+        self.modified_time_ns = modified_time_ns
+        self.map = map_
+
+
+class MapRegistry:
+    """
+    Process-wide cache of the compiled maps in a folder (the `map_XXX.txt` files), so that a map is only read and 
+    compiled once and then shared by every race that uses it.
+
+    Maps are hot-reloaded: whenever a map is requested, its file's modification time is checked (a single `stat`) and 
+    the map is recompiled if it changed. The folder is only rescanned for added or removed maps when its own 
+    modification time changes. If a changed map fails to compile, the previous version keeps being used.
+    """
+
+    def __init__(self, maps_folder: Path):
+        self.maps_folder = maps_folder
+
+        self._lock = threading.Lock()
+        self._entries: dict[int, _MapEntry] = {}
+        self._folder_modified_time_ns: int | None = None
+
+
+    def get_map_ids(self) -> list[int]:
+        with self._lock:
+            self._refresh_folder()
+            return sorted(self._entries.keys())
+
+
+    def get_map(self, map_id: int) -> Map:
+        with self._lock:
+            self._refresh_folder()
+
+            entry = self._entries.get(map_id)
+
+            if entry is None:
+                raise KeyError(f"unknown map id {map_id}")
+
+            self._refresh_entry(entry)
+            return entry.map
+
+
+    def pick_random_map(self) -> tuple[int, Map]:
+        with self._lock:
+            self._refresh_folder()
+
+            if len(self._entries) == 0:
+                raise FileNotFoundError(f"no maps found in '{self.maps_folder}'")
+
+            chosen_map_id = random.choice(list(self._entries.keys()))
+
+            entry = self._entries[chosen_map_id]
+            self._refresh_entry(entry)
+
+            return (chosen_map_id, entry.map)
+
+
+    def _refresh_folder(self):
+        folder_modified_time_ns = self.maps_folder.stat().st_mtime_ns
+
+        if folder_modified_time_ns == self._folder_modified_time_ns:
+            return
         
+        self._folder_modified_time_ns = folder_modified_time_ns
 
-def pick_random_map() -> tuple[int, Map]:
-    chosen_map_id = random.randint(1, MAP_AMT)
-    map_ =  Map(f"{MAPS_FOLDER}/map_{str(chosen_map_id).zfill(3)}.txt")
+        found_ids: set[int] = set()
+
+        for path in self.maps_folder.glob("map_*.txt"):
+            try:
+                map_id = int(path.stem.removeprefix("map_"))
+            except ValueError:
+                print(f"ERROR: Ignoring map file with an invalid name: '{path.name}'")
+                continue
+
+            found_ids.add(map_id)
+
+            if map_id not in self._entries:
+                try:
+                    self._entries[map_id] = _MapEntry(path, path.stat().st_mtime_ns, Map(str(path)))
+                    print(f"LOG: Loaded map {map_id} from '{path.name}'")
 
-    return (chosen_map_id, map_)
\ No newline at end of file
+                except (OSError, ValueError, AssertionError) as e:
+                    found_ids.discard(map_id)
+                    print(f"ERROR: Could not load map '{path.name}': {e}")
+
+        for map_id in self._entries.keys() - found_ids:
+            print(f"LOG: Map {map_id} was removed")
+            del self._entries[map_id]
+
+
+    def _refresh_entry(self, entry: _MapEntry):
+        try:
+            modified_time_ns = entry.path.stat().st_mtime_ns
+
+            if modified_time_ns == entry.modified_time_ns:
+                return
+
+            # Updated before compiling, so that a broken file is only tried once per change.
+            entry.modified_time_ns = modified_time_ns
+
+            # Only the entry's reference is replaced, the races that use the old map keep using it.
+            entry.map = Map(str(entry.path))
+            print(f"LOG: Reloaded map '{entry.path.name}'")
+
+        except (OSError, ValueError, AssertionError) as e:
+            print(f"ERROR: Could not reload map '{entry.path.name}', keeping the previous version: {e}")
+
+
+MAP_REGISTRY = MapRegistry(MAPS_FOLDER)
+
+
+def pick_random_map() -> tuple[int, Map]:
+    return MAP_REGISTRY.pick_random_map()
@@ -1,57 +1,96 @@
-from secret_game.secret_game_types import SecretGamePlayer, Vector, SecretGameResult, assert_str_is_turn_state, MAP_RESOLUTION, DEFAULT_SPEED, TURN_SPEED
-from secret_game.map import Map
+from secret_game.secret_game_types import (
+    SecretGamePlayer, 
+    SecretGameResult, 
+    assert_str_is_turn_state, 
+    MAP_RESOLUTION, 
+    DEFAULT_SPEED, 
+    TURN_SPEED, 
+    SIMULATION_HZ, 
+    NETWORK_SEND_HZ, 
+    MAX_SIMULATION_LAG_SECS,
+)
+from secret_game.map import Map, traverse_map_cells
+from secret_game.batched_physics import BatchedRacePhysics, BatchedRace
+from secret_game.tile import TileCode
 from command_reader import ClientCommandReader
+from wire_protocol import encode_command, encode_car_state_frame
+from send_batcher import SendBatcher
 import time
 import math
 
+# The tiles under the car's corners, relative to the tile of its top-left corner.
+CORNER_TILE_OFFSETS = ((0, 0), (1, 0), (0, 1), (1, 1))
+
 class SecretGameGame:
     REQUIRED_LAPS = 3
 
-    def __init__(self, players: list[SecretGamePlayer], map: Map):
+    def __init__(
+        self, 
+        players: list[SecretGamePlayer], 
+        map: Map, 
+        simulation_hz: int = SIMULATION_HZ, 
+        send_hz: int = NETWORK_SEND_HZ, 
+        physics: BatchedRacePhysics | None = None,
+    ):
         self.players = players
         self.map = map
 
+        # When set, the race is simulated by the shared batched physics engine instead of by this game.
+        self.physics = physics
+        self.batched_race: BatchedRace | None = None
+
         self.is_running = True
 
-        self._last_timestamp = None
-        self.deltatime = 0.1
+        # The race is simulated with a fixed timestep, independently from how often the game is stepped.
+        self.deltatime = 1 / simulation_hz
+
+        # The time that has passed but has not been simulated yet.
+        self.accumulated_time = 0.0
+        self._last_timestamp: float | None = None
+
+        # The cars' positions are sent at their own (lower) rate.
+        self.send_interval = 1 / send_hz
+        self.next_send_at = 0.0
 
         self.result: SecretGameResult | None = None
 
+        # The countdown number that is sent next and when it should be sent. Both are 
+        # set when the game starts.
+        self.next_countdown: int | None = None
+        self.next_countdown_at = 0.0
+
+        # When the race starts after the countdown finishes.
+        self.race_start_at: float | None = None
+
         self.command_reader = ClientCommandReader(
             connections=[p.conn for p in self.players],
             valid_cmd_prefixes=('!car-turn',),
         )
 
+        # Everything sent during a step is written at the end of the step, once per connection.
+        self.send_batcher = SendBatcher([p.conn for p in self.players])
 
-    def send_race_countdown_command(self, player: SecretGamePlayer, count_down: int):
-        player.conn.send(f"?countdown:{count_down}\\".encode())
-
-
-    def send_race_start_command(self, player: SecretGamePlayer):
-        player.conn.send(f"?race-start\\".encode())
 
+    def queue_command(self, player_idx: int, cmd: str):
+        """
+        Queues a command to be sent to a player at the end of the current step.
+        """
+        self.send_batcher.queue(player_idx, encode_command(cmd, self.players[player_idx].protocol))
 
-    def calc_deltatime(self):
-        now = time.perf_counter()
 
-        # There is no "last timestamp" in the first frame, so we use a default deltatime value of 10^-4 seconds.
-        if self._last_timestamp is None:
-            self.deltatime = 0.0001
+    def send_race_countdown_command(self, player_idx: int, count_down: int):
+        self.queue_command(player_idx, f"?countdown:{count_down}\\")
 
-        else:
-            self.deltatime = now - self._last_timestamp
 
-        self._last_timestamp = now
+    def send_race_start_command(self, player_idx: int):
+        self.queue_command(player_idx, "?race-start\\")
 
 
     def move_player(self, player: SecretGamePlayer):
-        movement = Vector(
-            x=math.cos(player.facing_angle) * player.speed * self.deltatime,
-            y=math.sin(player.facing_angle) * player.speed * self.deltatime,
-        )
+        distance = player.speed * self.deltatime
+
         assert player.position
-        player.position += movement
+        player.position.translate(math.cos(player.facing_angle) * distance, math.sin(player.facing_angle) * distance)
 
 
     def turn_player(self, player: SecretGamePlayer):
@@ -64,62 +103,70 @@ class SecretGameGame:
         player.facing_angle %= math.tau
 
 
-    def check_collision(self, player_idx: int):
+    def check_collision(self, player_idx: int, previous_x: float, previous_y: float):
+        """
+        Checks every tile that the player's car touched while moving from its previous position to its current one 
+        (so that fast cars or long ticks cannot skip walls, Dead Zones or lap checkpoints).
+        """
         player = self.players[player_idx]
         assert player.position
 
-        corners = [
-            player.position,
-            player.position + Vector(x=MAP_RESOLUTION,y=0),
-            player.position + Vector(x=0, y=MAP_RESOLUTION),
-            player.position + Vector(x=MAP_RESOLUTION, y=MAP_RESOLUTION),
-        ]
+        tile_codes = self.map.tile_codes
+        map_width = self.map.width
+        map_height = self.map.height
 
         hit_wall = False
+        died = False
+
+        for cell_x, cell_y in traverse_map_cells(previous_x, previous_y, player.position.x, player.position.y):
+            # The car is exactly one tile big, so its corners are always in the 2x2 tiles starting at its top-left corner's tile.
+            for offset_x, offset_y in CORNER_TILE_OFFSETS:
+                map_x = cell_x + offset_x
+                map_y = cell_y + offset_y
 
-        for corner_pos in corners:
-            corner_map_pos = (int(corner_pos.x / MAP_RESOLUTION), int(corner_pos.y / MAP_RESOLUTION))
-            tile = self.map.get_tile(corner_map_pos[0], corner_map_pos[1])
+                if not (0 <= map_x < map_width and 0 <= map_y < map_height):
+                    continue
 
-            if tile is None:
-                continue
+                tile_code = tile_codes[map_y * map_width + map_x]
 
-            if tile.kind == 'wall':
-                print(f"LOG: Player '{player.username}' hit a wall")
-                hit_wall = True
+                if tile_code == TileCode.WALL:
+                    print(f"LOG: Player '{player.username}' hit a wall")
+                    hit_wall = True
 
-            elif tile.kind == 'line':
-                if player.lap_state == 'initial':
-                    player.lap_state = 'looking_for_checkpoint_a'
+                elif tile_code == TileCode.LINE:
+                    if player.lap_state == 'initial':
+                        player.lap_state = 'looking_for_checkpoint_a'
                 
-                elif player.lap_state == 'looking_for_line':
-                    player.lap_state = 'looking_for_checkpoint_a'
+                    elif player.lap_state == 'looking_for_line':
+                        player.lap_state = 'looking_for_checkpoint_a'
 
-                    player.completed_laps += 1
-                    self.send_lap_completed_commands() # send update to both players
+                        player.completed_laps += 1
+                        self.send_lap_completed_commands() # send update to both players
 
-                    print(f"Player '{player.username}' has completed {player.completed_laps} laps")
+                        print(f"Player '{player.username}' has completed {player.completed_laps} laps")
 
-            elif tile.kind == 'lap_check_a':
-                if player.lap_state == 'looking_for_checkpoint_a':
-                    player.lap_state = 'looking_for_checkpoint_b'
+                elif tile_code == TileCode.LAP_CHECK_A:
+                    if player.lap_state == 'looking_for_checkpoint_a':
+                        player.lap_state = 'looking_for_checkpoint_b'
 
-            elif tile.kind == 'lap_check_b':
-                if player.lap_state == 'looking_for_checkpoint_b':
-                    player.lap_state = 'looking_for_line'
+                elif tile_code == TileCode.LAP_CHECK_B:
+                    if player.lap_state == 'looking_for_checkpoint_b':
+                        player.lap_state = 'looking_for_line'
 
-            elif tile.kind == 'dead_zone':
-                print(f"LOG: Player '{player.username}' died")
+                elif tile_code == TileCode.DEAD_ZONE:
+                    print(f"LOG: Player '{player.username}' died")
                 
-                if player_idx == 0:
-                    respawn_pos = self.map.p1_spawn_map_pos
-                else:
-                    respawn_pos = self.map.p2_spawn_map_pos
+                    # Reset player state when they enter a Dead Zone.
+                    player.position = self.map.get_spawn_position(player_idx)
+                    player.facing_angle = 0.0
+                    player.lap_state = 'initial'
+
+                    # The rest of the movement is discarded.
+                    died = True
+                    break
 
-                # Reset player state when they enter a Dead Zone.
-                player.position = respawn_pos
-                player.facing_angle = 0.0
-                player.lap_state = 'initial'
+            if died:
+                break
 
         if hit_wall:
             player.speed = DEFAULT_SPEED / 4
@@ -137,25 +184,40 @@ class SecretGameGame:
         return f"?pos:{player_idx}:{int(pos.x)}:{int(pos.y)}\\"
 
 
-    def send_position_commands(self):
-        move_cmds = [self.build_pos_cmd_for_player(i) for i in range(len(self.players))]
-
-        for move_cmd in move_cmds:
-            for player in self.players:
-                player.conn.sendall(move_cmd.encode())
-
-
     def build_angle_cmd_for_player(self, player_idx: int) -> str:
         angle = self.players[player_idx].facing_angle
         return f"?angle:{player_idx}:{angle:.4f}\\"
 
 
-    def send_angle_commands(self):
-        angle_cmds = [self.build_angle_cmd_for_player(i) for i in range(len(self.players))]
+    def build_car_state_frame_for_player(self, player_idx: int) -> bytes:
+        player = self.players[player_idx]
+        assert player.position
+        return encode_car_state_frame(player_idx, int(player.position.x), int(player.position.y), player.facing_angle)
+
+
+    def send_car_state_commands(self):
+        """
+        Sends every car's position and angle to the players. Text protocol players receive `?pos` and `?angle` 
+        commands, binary protocol players receive a single car state frame per car. Each version is only built once.
+        """
+        car_amt = len(self.players)
+        car_state_data: dict[str, bytes] = {}
+
+        for player_idx, player in enumerate(self.players):
+            data = car_state_data.get(player.protocol)
+
+            if data is None:
+                if player.protocol == 'text':
+                    cmds = [self.build_pos_cmd_for_player(i) for i in range(car_amt)] + [self.build_angle_cmd_for_player(i) for i in range(car_amt)]
+                    data = ''.join(cmds).encode()
+
+                else:
+                    data = b"".join(self.build_car_state_frame_for_player(i) for i in range(car_amt))
+
+                car_state_data[player.protocol] = data
 
-        for angle_cmd in angle_cmds:
-            for player in self.players:
-                player.conn.sendall(angle_cmd.encode())
+            # Only the latest car state matters, so an unsent one is superseded by the next.
+            self.send_batcher.queue(player_idx, data, key='car-state')
 
 
     def build_lap_completed_cmd_for_player(self, player_idx: int) -> str:
@@ -167,84 +229,214 @@ class SecretGameGame:
         lap_cmds = [self.build_lap_completed_cmd_for_player(i) for i in range(len(self.players))]
 
         for lap_cmd in lap_cmds:
-            for player in self.players:
-                player.conn.sendall(lap_cmd.encode())
+            for player_idx in range(len(self.players)):
+                self.queue_command(player_idx, lap_cmd)
     
     
-    def run(self):
+    def start(self):
+        """
+        Starts the race countdown. The countdown itself is sent by `step`.
+        """
+        self.next_countdown = 3
+        self.next_countdown_at = time.perf_counter() + 1
+
+
+    def abort(self):
         """
-        Runs the given game.
+        Abruptly ends the game (i.e. when a player disconnects).
         """
-        try:
-            self.run_main_game_loop()
+        self.is_running = False
+        self.result = SecretGameResult(winner_idx=None, abrupt_end=True)
+
 
-        # End the game if a connection error occurs.
-        except ConnectionResetError:
-            self.result = SecretGameResult(winner_idx=None, abrupt_end=True)
+    def is_over(self) -> bool:
+        return not self.is_running
 
+
+    def end(self):
+        """
+        Sends the game over message to both players.
+        """
         # Game ended.
         print("LOG: A Secret Game ended")
 
-        for player in self.players:
-            # The result of the game must have been determined already.
-            assert self.result
+        if self.physics and self.batched_race:
+            self.physics.remove_race(self.batched_race)
+            self.batched_race = None
 
-            try:
-                # There is a winner.
-                if self.result.winner_idx is not None:
-                    player.conn.sendall(f"?game-over:secret_game:winner-determined:{self.result.winner_idx}\\".encode())
+        stats = self.send_batcher.stats
+        print(f"LOG: Secret Game sends: {stats.get_syscalls_per_tick():.2f} writes and {stats.get_bytes_per_tick():.1f} bytes per tick over {stats.ticks} ticks")
+        print(f"LOG: Secret Game send buffers: {stats.partial_flushes} partial flushes, {stats.superseded_msgs} superseded car states, {stats.max_buffered_bytes} bytes max buffered")
 
-                # The game abruptly ended before finishing normally.
-                elif self.result.abrupt_end:
-                    player.conn.sendall("?game-over:secret_game:abrupt-end\\".encode())
+        # The result of the game must have been determined already.
+        assert self.result
 
-                # Since the winner is None, but there wasn't an abrupt end, that means that 
-                # there was a tie.
-                else:
-                    player.conn.sendall("?game-over:secret_game:tie\\".encode())
+        for player_idx in range(len(self.players)):
+            # There is a winner.
+            if self.result.winner_idx is not None:
+                self.queue_command(player_idx, f"?game-over:secret_game:winner-determined:{self.result.winner_idx}\\")
+
+            # The game abruptly ended before finishing normally.
+            elif self.result.abrupt_end:
+                self.queue_command(player_idx, "?game-over:secret_game:abrupt-end\\")
 
-            # Do not bother trying to send a game over message if the client's socket is disconnected.
-            except ConnectionResetError: pass
+            # Since the winner is None, but there wasn't an abrupt end, that means that 
+            # there was a tie.
+            else:
+                self.queue_command(player_idx, "?game-over:secret_game:tie\\")
 
+        self.send_batcher.flush_final()
 
-    def run_main_game_loop(self):
+
+    def on_input(self, player_idx: int, client_cmd: str):
+        """
+        Handles a single command sent by the player at `player_idx`.
+        """
+        self.handle_player_client_response(player_idx, client_cmd)
+
+
+    def step(self, now: float) -> float | None:
         """
-        Runs the main part of the game loop.
+        Advances the countdown or the race. Returns the time (in `time.perf_counter` seconds) 
+        at which the game needs to be stepped again.
         """
-        for i in range(3, -1, -1):
-            time.sleep(1)
+        next_step_at = self.step_phases(now)
+
+        # Everything that was queued during this step goes out in a single write per connection.
+        self.send_batcher.flush()
 
-            for player in self.players: 
-                self.send_race_countdown_command(player, count_down=i)
+        return self.send_batcher.limit_deadline(now, next_step_at)
 
-        time.sleep(0.5)
-        for player in self.players:
-            self.send_race_start_command(player)
 
-        while self.is_running:
-            self.calc_deltatime()
+    def step_phases(self, now: float) -> float:
+        # The race countdown (3, 2, 1, 0), followed by the race start half a second later.
+        if self.next_countdown is not None:
+            if now < self.next_countdown_at:
+                return self.next_countdown_at
 
-            self.send_position_commands()
-            self.send_angle_commands()
+            for player_idx in range(len(self.players)): 
+                self.send_race_countdown_command(player_idx, count_down=self.next_countdown)
+
+            if self.next_countdown > 0:
+                self.next_countdown -= 1
+                self.next_countdown_at += 1
+            else:
+                self.next_countdown = None
+                self.race_start_at = self.next_countdown_at + 0.5
+
+            return self.next_countdown_at if self.next_countdown is not None else self.race_start_at
+
+        if self.race_start_at is not None:
+            if now < self.race_start_at:
+                return self.race_start_at
 
             for player_idx in range(len(self.players)):
-                player = self.players[player_idx]
-                self.move_player(player)
-                self.turn_player(player)
-                self.check_collision(player_idx)
+                self.send_race_start_command(player_idx)
 
-                self.handle_player_client_response(player_idx)
+            self.race_start_at = None
+            self._last_timestamp = now
+            self.next_send_at = now
+
+            if self.physics:
+                self.batched_race = self.physics.add_race(self.players, self.map, SecretGameGame.REQUIRED_LAPS, now)
+
+        if self.physics and self.batched_race:
+            return self.advance_batched_race(now)
+
+        return self.advance_race(now)
+
+
+    def advance_race(self, now: float) -> float:
+        """
+        Simulates all the fixed-length ticks that are due and sends the cars' state if it is time to. Returns 
+        when the next tick or send is due, so the game sleeps in between instead of spinning.
+        """
+        assert self._last_timestamp is not None
+
+        self.accumulated_time += now - self._last_timestamp
+        self._last_timestamp = now
+
+        # Drop the ticks that cannot be caught up on (i.e. after the server stalled).
+        if self.accumulated_time > MAX_SIMULATION_LAG_SECS:
+            print(f"LOG: Secret Game fell behind by {self.accumulated_time:.3f}s, skipping ticks")
+            self.accumulated_time = self.deltatime
+
+        while self.accumulated_time >= self.deltatime and self.is_running:
+            self.step_race()
+            self.accumulated_time -= self.deltatime
+
+        self.send_car_state_if_due(now)
+
+        next_tick_at = now + (self.deltatime - self.accumulated_time)
+        return min(next_tick_at, self.next_send_at)
+
+
+    def advance_batched_race(self, now: float) -> float:
+        """
+        The `advance_race` equivalent for races simulated by the batched physics engine: advances the whole batch 
+        (if no other race has done so already) and reads this race's cars back.
+        """
+        assert self.physics and self.batched_race
+
+        next_tick_at = self.physics.advance(now)
+
+        previous_laps = [player.completed_laps for player in self.players]
+        winner_idx = self.physics.sync_race(self.batched_race, self.players)
+
+        if any(player.completed_laps != laps for player, laps in zip(self.players, previous_laps)):
+            self.send_lap_completed_commands()
+
+            for player, laps in zip(self.players, previous_laps):
+                if player.completed_laps != laps:
+                    print(f"Player '{player.username}' has completed {player.completed_laps} laps")
+
+        if winner_idx is not None:
+            self.result = SecretGameResult(winner_idx=winner_idx, abrupt_end=False)
+            self.is_running = False
+
+        self.send_car_state_if_due(now)
+
+        return min(next_tick_at, self.next_send_at)
+
+
+    def send_car_state_if_due(self, now: float):
+        if now >= self.next_send_at and self.is_running:
+            self.send_car_state_commands()
+
+            # Keep a steady send rate, unless the sends fell behind.
+            self.next_send_at += self.send_interval
+
+            if self.next_send_at <= now:
+                self.next_send_at = now + self.send_interval
+
+
+    def step_race(self):
+        """
+        Runs one fixed-length tick of the race simulation.
+        """
+        for player_idx in range(len(self.players)):
+            player = self.players[player_idx]
+            assert player.position
+
+            previous_x = player.position.x
+            previous_y = player.position.y
+
+            self.move_player(player)
+            self.turn_player(player)
+            self.check_collision(player_idx, previous_x, previous_y)
+
+            if self.check_if_completed_all_laps(player):
+                self.result = SecretGameResult(winner_idx=player_idx, abrupt_end=False)
+                self.is_running = False
+                break
 
-                if self.check_if_completed_all_laps(player):
-                    self.result = SecretGameResult(winner_idx=player_idx, abrupt_end=False)
-                    self.is_running = False
-                    break
 
+    def handle_player_client_response(self, player_idx: int, client_cmd: str):
+        if client_cmd.startswith("!car-turn"):
+            fields = client_cmd.split(':')
+            new_turn_state = fields[1]
 
-    def handle_player_client_response(self, player_idx: int):
-        for client_cmd in self.command_reader.yield_commands(player_idx):
-            if client_cmd.startswith("!car-turn"):
-                fields = client_cmd.split(':')
-                new_turn_state = fields[1]
+            self.players[player_idx].turn_state = assert_str_is_turn_state(new_turn_state)
 
-                self.players[player_idx].turn_state = assert_str_is_turn_state(new_turn_state)
+            if self.physics and self.batched_race:
+                self.physics.set_turn_state(self.batched_race, player_idx, self.players[player_idx].turn_state)
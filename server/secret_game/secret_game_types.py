@@ -1,6 +1,6 @@
 from dataclasses import dataclass, field
 import math
-from server_types import Connection
+from server_types import Connection, WireProtocol
 from typing import Self, Literal
 
 MAP_RESOLUTION = 32
@@ -8,8 +8,20 @@ DEFAULT_SPEED = 10 * MAP_RESOLUTION
 
 TURN_SPEED = math.pi # radians per second
 
+# The race is simulated in fixed steps at this rate (so that the physics do not depend on the server's load).
+SIMULATION_HZ = 60
+
+# The rate at which the cars' positions and angles are sent to the players. The client interpolates between
+# these updates (and predicts its own car), so this can be much lower than the simulation rate.
+NETWORK_SEND_HZ = 20
+
+# If the server falls behind by more than this, the missed ticks are dropped instead of being caught up on.
+MAX_SIMULATION_LAG_SECS = 0.25
+
 TurnState = Literal['straight', 'left', 'right']
 
+LapState = Literal['initial', 'looking_for_line', 'looking_for_checkpoint_a', 'looking_for_checkpoint_b']
+
 def assert_str_is_turn_state(s: str) -> TurnState:
     if s not in {'straight', 'left', 'right'}:
         raise ValueError(f"invalid turn state '{s}'")
@@ -17,8 +29,12 @@ def assert_str_is_turn_state(s: str) -> TurnState:
     return s # type: ignore
 
 
-@dataclass
+@dataclass(slots=True)
 class Vector:
+    """
+    A mutable 2D vector. The hot paths (i.e. the race simulation) update vectors in place with `translate` 
+    and `set` instead of creating new ones with `+`.
+    """
     x: float
     y: float
 
@@ -27,6 +43,16 @@ class Vector:
             x=self.x + other.x,
             y=self.y + other.y,
         )
+    
+
+    def translate(self, dx: float, dy: float):
+        self.x += dx
+        self.y += dy
+
+
+    def set(self, x: float, y: float):
+        self.x = x
+        self.y = y
 
 def real_position_from_map_position(map_pos: tuple[int, int]) -> Vector:
     mx, my = map_pos
@@ -45,7 +71,12 @@ class SecretGamePlayer:
     turn_state: TurnState = 'straight'
 
     completed_laps = 0
-    lap_state: Literal['initial', 'looking_for_line', 'looking_for_checkpoint_a', 'looking_for_checkpoint_b'] = 'initial' 
+    lap_state: LapState = 'initial'
+
+    protocol: WireProtocol = 'text'
+
+    # Whether the client answers the server's pings while waiting for an opponent.
+    heartbeat: bool = False
 
 
 @dataclass
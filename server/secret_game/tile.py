@@ -1,39 +1,33 @@
-from dataclasses import dataclass
-from typing import Literal
+class TileCode:
+    """
+    The small-int codes that compiled maps store for each tile (one byte per tile).
+    """
+    TRACK = 0
+    WALL = 1
+    DEAD_ZONE = 2
+    LINE = 3
+    LAP_CHECK_A = 4
+    LAP_CHECK_B = 5
+    SPAWNPOINT_P1 = 6
+    SPAWNPOINT_P2 = 7
 
-TileKind = Literal['wall', 'dead_zone', 'line', 'lap_check_a', 'lap_check_b', 'spawnpoint_p1', 'spawnpoint_p2', 'track']
 
-@dataclass
-class Tile:
-    map_pos: tuple[int, int]
-    kind: TileKind
+TILE_CHAR_CODES: dict[str, int] = {
+    ' ': TileCode.TRACK,
+    '#': TileCode.WALL,
+    'X': TileCode.DEAD_ZONE,
+    'L': TileCode.LINE,
+    'A': TileCode.LAP_CHECK_A,
+    'B': TileCode.LAP_CHECK_B,
+    '1': TileCode.SPAWNPOINT_P1,
+    '2': TileCode.SPAWNPOINT_P2,
+}
 
 
-def parse_tile_kind(ch: str) -> TileKind:
-    match ch:
-        case '#':
-            return 'wall'
-        
-        case 'X':
-            return 'dead_zone'
-        
-        case 'L':
-            return 'line'
-        
-        case 'A':
-            return 'lap_check_a'
-        
-        case 'B':
-            return 'lap_check_b'
-        
-        case '1':
-            return 'spawnpoint_p1'
-        
-        case '2':
-            return 'spawnpoint_p2'
-        
-        case ' ':
-            return 'track'
-        
-        case unknown:
-            raise ValueError(f"could not parse tile kind, got '{unknown}'")
\ No newline at end of file
+def parse_tile_code(ch: str) -> int:
+    code = TILE_CHAR_CODES.get(ch)
+
+    if code is None:
+        raise ValueError(f"could not parse tile kind, got '{ch}'")
+    
+    return code
@@ -0,0 +1,312 @@
+"""
+This module contains the batcher that coalesces the commands a game sends during a tick into a single write per connection,
+and buffers whatever a slow client cannot take right away.
+"""
+
+import socket
+from collections import deque
+from dataclasses import dataclass
+from typing import Literal
+
+from server_types import Connection
+
+# What happens to a queued message when a newer message with the same key (i.e. the state of the cars) is queued:
+# * `keep`: both are sent.
+# * `coalesce`: the newer message replaces the older one if it has not started being written yet.
+# * `drop`: the newer message is dropped while the connection still has data left over from a previous flush,
+#   so that a slow client only receives fresh state once it catches up.
+SupersededPolicy = Literal['keep', 'coalesce', 'drop']
+
+SUPERSEDED_POLICY: SupersededPolicy = 'coalesce'
+
+# A client whose unwritten data grows over this many bytes is considered too slow, and gets disconnected.
+MAX_BUFFERED_BYTES_PER_CONN = 256 * 1024
+
+# How often a game retries writing the data left over in a connection's buffer.
+FLUSH_RETRY_SECS = 0.02
+
+# Not available on Windows (where the socket is made non-blocking during the write instead).
+MSG_DONTWAIT: int | None = getattr(socket, 'MSG_DONTWAIT', None)
+
+class SlowConsumerError(BrokenPipeError):
+    """
+    Raised by `SendBatcher.flush` after disconnecting a client that is not reading its data fast enough. Since it
+    is a `BrokenPipeError`, the games handle it like any other disconnect.
+    """
+
+    def __init__(self, conn_idxs: list[int]):
+        super().__init__(f"disconnected slow client(s) {conn_idxs}")
+        self.conn_idxs = conn_idxs
+
+
+@dataclass
+class SendStats:
+    """
+    Counters for the writes done by a `SendBatcher`. A tick is a flush that wrote to at least one connection.
+    """
+    ticks: int = 0
+    syscalls: int = 0
+    bytes_sent: int = 0
+
+    # Flushes that could not write all of a connection's data without blocking.
+    partial_flushes: int = 0
+    # Messages that were replaced or dropped because a newer message superseded them.
+    superseded_msgs: int = 0
+    max_buffered_bytes: int = 0
+    slow_consumer_disconnects: int = 0
+
+
+    def get_syscalls_per_tick(self) -> float:
+        return self.syscalls / self.ticks if self.ticks > 0 else 0.0
+
+
+    def get_bytes_per_tick(self) -> float:
+        return self.bytes_sent / self.ticks if self.ticks > 0 else 0.0
+
+
+class OutboundBuffer:
+    """
+    The unwritten messages of a connection, in order. The first message may have been partially written already.
+    """
+    __slots__ = ('msgs', 'first_msg_offset', 'keyed_msgs', 'buffered_bytes', 'has_backlog')
+
+    def __init__(self):
+        # Each message is a `[key, data]` pair, so that a superseded message can be replaced in place.
+        self.msgs: deque[list] = deque()
+        self.first_msg_offset = 0
+
+        # The messages that can still be replaced (i.e. have not started being written), by key.
+        self.keyed_msgs: dict[str, list] = {}
+
+        self.buffered_bytes = 0
+
+        # Whether there was data left over after the last flush.
+        self.has_backlog = False
+
+
+    def append(self, data: bytes, key: str | None):
+        msg = [key, data]
+        self.msgs.append(msg)
+        self.buffered_bytes += len(data)
+
+        if key is not None:
+            self.keyed_msgs[key] = msg
+
+
+    def replace(self, key: str, data: bytes) -> bool:
+        """
+        Replaces the unwritten message with the given key. Returns `False` if there is no such message.
+        """
+        msg = self.keyed_msgs.get(key)
+
+        if msg is None:
+            return False
+
+        self.buffered_bytes += len(data) - len(msg[1])
+        msg[1] = data
+        return True
+
+
+    def get_unwritten_data(self) -> bytes:
+        if len(self.msgs) == 1:
+            return self.msgs[0][1][self.first_msg_offset:]
+
+        return b''.join(data for _, data in self.msgs)[self.first_msg_offset:]
+
+
+    def consume(self, written_amt: int):
+        """
+        Removes the first `written_amt` unwritten bytes.
+        """
+        self.buffered_bytes -= written_amt
+        remaining = written_amt + self.first_msg_offset
+
+        while len(self.msgs) > 0 and remaining >= len(self.msgs[0][1]):
+            msg = self.msgs.popleft()
+            remaining -= len(msg[1])
+
+            if msg[0] is not None and self.keyed_msgs.get(msg[0]) is msg:
+                del self.keyed_msgs[msg[0]]
+
+        self.first_msg_offset = remaining
+
+        # A partially written message cannot be replaced anymore.
+        if remaining > 0:
+            key = self.msgs[0][0]
+
+            if key is not None:
+                self.keyed_msgs.pop(key, None)
+
+
+class SendBatcher:
+    """
+    Buffers the outgoing data of each connection until `flush` is called, which then writes as much of it as possible
+    without blocking (with one write per connection with pending data, instead of one per command). Whatever could
+    not be written stays buffered for the next flush, so a client with a full TCP window never stalls the game (or
+    the other games on its thread). Messages with a key are handled according to the `SupersededPolicy` while they
+    are buffered, and a client whose buffer grows over `max_buffered_bytes` is disconnected.
+
+    Since every tick is already coalesced into a single write, Nagle's algorithm would only delay the
+    tick's data, so `TCP_NODELAY` is set on every connection.
+    """
+
+    def __init__(
+        self,
+        connections: list[Connection],
+        superseded_policy: SupersededPolicy = SUPERSEDED_POLICY,
+        max_buffered_bytes: int = MAX_BUFFERED_BYTES_PER_CONN,
+    ):
+        self.connections = connections
+        self._buffers = [OutboundBuffer() for _ in connections]
+
+        self.superseded_policy = superseded_policy
+        self.max_buffered_bytes = max_buffered_bytes
+
+        self.stats = SendStats()
+
+        for conn in connections:
+            set_no_delay(conn)
+
+
+    def queue(self, conn_idx: int, data: bytes, key: str | None = None):
+        """
+        Queues data for the connection. Data with a `key` is state that is superseded by the next data with
+        the same key (i.e. the cars' positions).
+        """
+        buffer = self._buffers[conn_idx]
+
+        if key is not None and self.superseded_policy == 'coalesce':
+            if buffer.replace(key, data):
+                self.stats.superseded_msgs += 1
+                return
+
+        elif key is not None and self.superseded_policy == 'drop':
+            if buffer.has_backlog:
+                self.stats.superseded_msgs += 1
+                return
+
+        buffer.append(data, key if self.superseded_policy == 'coalesce' else None)
+
+
+    def has_backlog(self, conn_idx: int | None = None) -> bool:
+        """
+        Returns `True` if the last flush could not write all the data of the connection (or of any connection).
+        """
+        if conn_idx is not None:
+            return self._buffers[conn_idx].has_backlog
+
+        return any(buffer.has_backlog for buffer in self._buffers)
+
+
+    def limit_deadline(self, now: float, deadline: float | None) -> float | None:
+        """
+        Returns the game's next deadline, moved up so that the game is stepped again in time to retry writing
+        the data left over by the last flush (if there is any).
+        """
+        if not self.has_backlog():
+            return deadline
+
+        retry_at = now + FLUSH_RETRY_SECS
+        return retry_at if deadline is None else min(deadline, retry_at)
+
+
+    def flush(self):
+        """
+        Writes as much of the pending data of every connection as possible without blocking. Raises the same
+        errors as `send`, or `SlowConsumerError` after disconnecting the clients that went over their budget.
+        """
+        wrote_any = False
+        slow_conn_idxs = []
+
+        for conn_idx in range(len(self.connections)):
+            wrote_any = self._write_buffered(conn_idx) or wrote_any
+
+            if self._buffers[conn_idx].buffered_bytes > self.max_buffered_bytes:
+                slow_conn_idxs.append(conn_idx)
+
+        if wrote_any:
+            self.stats.ticks += 1
+
+        if len(slow_conn_idxs) > 0:
+            for conn_idx in slow_conn_idxs:
+                print(f"ERROR: Disconnecting a client with {self._buffers[conn_idx].buffered_bytes} unread bytes (over the {self.max_buffered_bytes} byte budget)")
+                disconnect(self.connections[conn_idx])
+
+                self.stats.slow_consumer_disconnects += 1
+
+            raise SlowConsumerError(slow_conn_idxs)
+
+
+    def flush_final(self):
+        """
+        Flushes one last time when the game ends (i.e. for the game over message). Clients that are
+        disconnected or too slow to take all their data right away miss whatever is left.
+        """
+        for conn_idx in range(len(self.connections)):
+            try:
+                self._write_buffered(conn_idx)
+
+            # Do not bother with the clients that are disconnected (the game is over anyway).
+            except OSError: pass
+
+
+    def _write_buffered(self, conn_idx: int) -> bool:
+        """
+        Writes as much of the connection's buffer as possible without blocking. Returns `True` if anything was written.
+        """
+        buffer = self._buffers[conn_idx]
+
+        if buffer.buffered_bytes == 0:
+            return False
+
+        written_amt = send_without_blocking(self.connections[conn_idx], buffer.get_unwritten_data())
+
+        self.stats.syscalls += 1
+        self.stats.bytes_sent += written_amt
+
+        buffer.consume(written_amt)
+        buffer.has_backlog = buffer.buffered_bytes > 0
+
+        if buffer.has_backlog:
+            self.stats.partial_flushes += 1
+            self.stats.max_buffered_bytes = max(self.stats.max_buffered_bytes, buffer.buffered_bytes)
+
+        return written_amt > 0
+
+
+def send_without_blocking(conn: Connection, data: bytes) -> int:
+    """
+    Writes as much of the data as fits in the connection's send buffer. Returns the amount of bytes written.
+    """
+    try:
+        if MSG_DONTWAIT is not None:
+            return conn.send(data, MSG_DONTWAIT)
+
+        conn.setblocking(False)
+
+        try:
+            return conn.send(data)
+        finally:
+            conn.setblocking(True)
+
+    except BlockingIOError:
+        return 0
+
+
+def disconnect(conn: Connection):
+    """
+    Shuts down the connection (without closing the socket, which is still owned by the game).
+    """
+    try:
+        conn.shutdown(socket.SHUT_RDWR)
+
+    # The client already disconnected.
+    except OSError: pass
+
+
+def set_no_delay(conn: Connection):
+    try:
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    # Not a TCP socket (i.e. a socket pair).
+    except OSError: pass
@@ -9,6 +9,9 @@ from typing import Literal
 # the name of the module, which is also named `socket`.
 Connection = socket
 
+# The version of the protocol used for the client-bound commands of a connection (see `wire_protocol.py`).
+WireProtocol = Literal['text', 'bin1']
+
 class ColorCode:
     """
     This class which defines some terminal color codes as constants.
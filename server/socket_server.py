@@ -2,10 +2,12 @@
 Do not run this script directly. Instead, call it as a library (e.g. `import socket_server`).
 """
 
+import os
 import socket
 import threading
 import time
 from pathlib import Path
+from typing import Callable
 
 from server_types import Connection, BUF_SIZE
 from stratego.stratego_game import StrategoGame
@@ -17,6 +19,13 @@ from word_golf.word_golf_game import WordGolfGame
 from secret_game.secret_game_types import SecretGamePlayer
 from secret_game.secret_game_game import SecretGameGame
 from secret_game.map import pick_random_map
+from secret_game.batched_physics import BatchedRacePhysics, is_batched_physics_available
+
+from matchmaking import MatchQueue, EvictionReason
+from heartbeat import HeartbeatMonitor, WaitingPlayer, is_connection_alive, enable_keepalive, is_only_pongs, HEARTBEAT_INTERVAL_SECS, GAME_REQUEST_TIMEOUT_SECS, GAME_REQUEST_SETTLE_SECS
+from game_pool import GamePool
+from event_loop import EventLoop
+from wire_protocol import encode_command, parse_protocol_from_game_request, parse_game_request_options, DELTA_BOARD_SYNC_OPTION, FOG_OF_WAR_OPTION, HEARTBEAT_OPTION
 
 # Standard loopback interface address (localhost).
 # 127.0.0.1 makes it so that the server is only accesible from the same machine.
@@ -24,171 +33,411 @@ from secret_game.map import pick_random_map
 HOST = "0.0.0.0"  
 PORT = 49300        # Port to listen on (non-privileged ports are > 1023)
 
-WAITING_TIMEOUT_IN_SECS = 1 
+STRATEGO_MATCH_QUEUE = MatchQueue[StrategoPlayer]("stratego")
+
+WORD_GOLF_MATCH_QUEUE = MatchQueue[WordGolfPlayer]("word_golf")
+
+SECRET_GAME_MATCH_QUEUE = MatchQueue[SecretGamePlayer]("secret_game")
 
-LOCK = threading.Lock()
+# How long to wait after sending `?game-start` before a Word Golf or Secret Game game 
+# starts sending commands, so that the clients have time to process the game's start.
+GAME_START_PROCESSING_DELAY_SECS = 0.5
 
-WAITING_STRATEGO_PLAYERS: list[StrategoPlayer] = []
+# The shared physics engine for all Secret Game races, if batched physics are enabled (see `enable_batched_physics`).
+SECRET_GAME_PHYSICS: BatchedRacePhysics | None = None
 
-WAITING_WORD_GOLF_PLAYERS: list[WordGolfPlayer] = []
+# The amount of threads that run the games (see `get_game_pool`), no matter how many games are running.
+GAME_POOL_THREAD_AMT = os.cpu_count() or 1
 
-WAITING_SECRET_GAME_PLAYERS: list[SecretGamePlayer] = []
+_game_pool: GamePool | None = None
+_game_pool_lock = threading.Lock()
 
-CLIENT_SOCKET_TIMEOUT = 0.001 # seconds
+# Watches the connections of the players that are waiting for an opponent (see `watch_waiting_player`). Started by `run`.
+_waiting_players_loop: EventLoop | None = None
+
+# Pings the waiting players (only used on the waiting players' loop).
+_heartbeat_monitor = HeartbeatMonitor()
 
 def handle_client(conn: Connection, addr):
-    # This timeout is for communicating with existing clients.
-    conn.settimeout(CLIENT_SOCKET_TIMEOUT)
-    client_deciding_game = True
+    data = read_game_request(conn)
+
+    # The client disconnected before choosing a game.
+    if data is None:
+        return
 
-    while client_deciding_game:
+    player = create_player_from_game_request(conn, data)
+
+    if isinstance(player, StrategoPlayer):
+        move_player_to_stratego_queue(player)
+
+    elif isinstance(player, WordGolfPlayer):
+        move_player_to_word_golf_queue(player)
+
+    elif isinstance(player, SecretGamePlayer):
+        move_player_to_secret_game_queue(player)
+
+    else:
+        conn.close()
+
+
+def read_game_request(conn: Connection) -> str | None:
+    """
+    Waits for the client's `?game` command and returns it. Returns `None` (after closing the connection) 
+    if the client disconnects before choosing a game.
+    """
+    # A client that connects but never chooses a game is dropped.
+    conn.settimeout(GAME_REQUEST_TIMEOUT_SECS)
+    buffer = b''
+
+    while True:
         try:
-            data = conn.recv(BUF_SIZE).decode()
+            raw_data = conn.recv(BUF_SIZE)
 
-            if data.startswith("?game"):
-                client_deciding_game = False
-                print(f"LOG: got data ({data})")
+        except socket.timeout:
+            # The client stopped sending after the last field of its request, so the request is complete.
+            if has_game_request_fields(buffer):
+                break
 
-            else:
-                print(f"ERROR: unknown client response: '{data}'")
+            print(f"LOG: Dropping a client that did not choose a game in {GAME_REQUEST_TIMEOUT_SECS} seconds")
+            conn.close()
+            return None
 
-        except socket.timeout: continue
+        except ConnectionError:
+            raw_data = b''
+
+        # The client disconnected before choosing a game.
+        if not raw_data:
+            conn.close()
+            return None
+
+        buffer += raw_data
+
+        if not is_game_request_start(buffer):
+            print(f"ERROR: unknown client response: '{buffer.decode(errors='replace')}'")
+            buffer = b''
+            continue
 
+        # Waits for the rest of the last field, in case it was split across several reads.
+        if has_game_request_fields(buffer):
+            conn.settimeout(GAME_REQUEST_SETTLE_SECS)
+
+    # Undecodable bytes are replaced, so that they are rejected like any other malformed request.
+    data = buffer.decode(errors='replace')
+    print(f"LOG: got data ({data})")
+
+    # Client sockets are blocking. The games run on the game pool's event loops, which only read a 
+    # connection once it has data (see `GameTask.on_readable`), so a read never blocks or times out.
+    conn.settimeout(None)
+
+    return data
+
+
+def is_game_request_start(data: bytes) -> bool:
+    """
+    Returns `True` if the data is (the start of) a `?game` request, which may still be missing its end.
+    """
+    return data.startswith(b"?game") or b"?game".startswith(data)
+
+
+def has_game_request_fields(data: bytes) -> bool:
+    """
+    Returns `True` once the `?game` request has reached its last field (i.e. `?game:word_golf:` and then the username).
+    """
+    return data.startswith(b"?game") and data.count(b':') >= 2
+
+
+def create_player_from_game_request(conn: Connection, data: str) -> StrategoPlayer | WordGolfPlayer | SecretGamePlayer | None:
+    """
+    Wraps the client's connection in the player type of the game requested in the 
+    given `?game` command. Returns `None` if the request is malformed or the game is unknown.
+    """
     fields = data.split(':')
+
+    # i.e. `?game:word_golf`, without a username.
+    if len(fields) < 3:
+        print(f"ERROR: malformed game request '{data}'")
+        return None
+
+    protocol = parse_protocol_from_game_request(fields[0])
+    options = parse_game_request_options(fields[0])
+    heartbeat = HEARTBEAT_OPTION in options
     game = fields[1]
     username = fields[2]
     
     if game == "stratego":
         starting_deck_repr = ':'.join(fields[3:])
         # The player's color has not been decided yet.
-        stratego_player = StrategoPlayer(conn, username, starting_deck_repr, color=None)
-
-        move_player_to_stratego_queue(stratego_player)
+        return StrategoPlayer(
+            conn, 
+            username, 
+            starting_deck_repr, 
+            color=None, 
+            protocol=protocol, 
+            delta_board_sync=DELTA_BOARD_SYNC_OPTION in options,
+            fog_of_war=FOG_OF_WAR_OPTION in options,
+            heartbeat=heartbeat,
+        )
 
     elif game == "word_golf":
-        word_golf_player = WordGolfPlayer(conn, username)
-
-        move_player_to_word_golf_queue(word_golf_player)
+        return WordGolfPlayer(conn, username, protocol=protocol, heartbeat=heartbeat)
 
     elif game == "secret_game":
-        secret_game_player = SecretGamePlayer(conn, username, position=None)
-
-        move_player_to_secret_game_queue(secret_game_player)
+        return SecretGamePlayer(conn, username, position=None, protocol=protocol, heartbeat=heartbeat)
 
     else:
         print(f"ERROR: unknown game '{game}'")
+        return None
 
 
 def move_player_to_stratego_queue(player: StrategoPlayer):
-    with LOCK:
-        WAITING_STRATEGO_PLAYERS.append(player)
+    # The game is started by the queue's matchmaker once an opponent joins.
+    watch_waiting_player(STRATEGO_MATCH_QUEUE, player)
 
-     # Wait for an opponent to join.
-    while len(WAITING_STRATEGO_PLAYERS) < 2:
-        time.sleep(WAITING_TIMEOUT_IN_SECS) # Wait and check again
-    
-    # Once a second player joins, start a new game.
-    with LOCK:
-        player1 = WAITING_STRATEGO_PLAYERS.pop()
-        player2 = WAITING_STRATEGO_PLAYERS.pop()
-
-        # Set player colors.
-        player1.color = 'r'
-        player2.color = 'b'
-    
-    time.sleep(WAITING_TIMEOUT_IN_SECS)
 
-    # Logic to start the game
-    start_stratego_game(player1, player2)
+def move_player_to_word_golf_queue(player: WordGolfPlayer):
+    # The game is started by the queue's matchmaker once an opponent joins.
+    watch_waiting_player(WORD_GOLF_MATCH_QUEUE, player)
 
 
-def move_player_to_word_golf_queue(player: WordGolfPlayer):
-    with LOCK:
-        WAITING_WORD_GOLF_PLAYERS.append(player)
+def move_player_to_secret_game_queue(player: SecretGamePlayer):
+    # The game is started by the queue's matchmaker once an opponent joins.
+    watch_waiting_player(SECRET_GAME_MATCH_QUEUE, player)
 
-     # Wait for an opponent to join.
-    while len(WAITING_WORD_GOLF_PLAYERS) < 2:
-        time.sleep(WAITING_TIMEOUT_IN_SECS) # Wait and check again
-    
-    # Once a second player joins, start a new game.
-    with LOCK:
-        player1 = WAITING_WORD_GOLF_PLAYERS.pop()
-        player2 = WAITING_WORD_GOLF_PLAYERS.pop()
 
-    
-    time.sleep(WAITING_TIMEOUT_IN_SECS)
+def get_match_queue(player: WaitingPlayer) -> MatchQueue:
+    if isinstance(player, StrategoPlayer):
+        return STRATEGO_MATCH_QUEUE
+    elif isinstance(player, WordGolfPlayer):
+        return WORD_GOLF_MATCH_QUEUE
+    else:
+        return SECRET_GAME_MATCH_QUEUE
 
-    # Logic to start the game
-    start_word_golf_game(player1, player2)
 
+def watch_waiting_player(match_queue: MatchQueue, player: WaitingPlayer):
+    """
+    Adds the player to the queue, and removes them from it if they disconnect (or stop answering the heartbeats)
+    while waiting. The connection is watched by the waiting players' loop, so no thread is blocked for each waiting player.
+    """
+    loop = _waiting_players_loop
+    assert loop, "the server must be running"
 
-def move_player_to_secret_game_queue(player: SecretGamePlayer):
-    with LOCK:
-        WAITING_SECRET_GAME_PLAYERS.append(player)
+    enable_keepalive(player.conn)
+
+    def watch():
+        # The player only joins the queue once they are watched, so that they cannot be paired up (and stop 
+        # being watched) before.
+        loop.add_reader(player.conn, lambda: on_waiting_player_readable(loop, match_queue, player))
+        _heartbeat_monitor.watch(player)
+        match_queue.join(player)
+
+    loop.call_soon_threadsafe(watch)
 
-     # Wait for an opponent to join.
-    while len(WAITING_SECRET_GAME_PLAYERS) < 2:
-        time.sleep(WAITING_TIMEOUT_IN_SECS) # Wait and check again
-    
-    # Once a second player joins, start a new game.
-    with LOCK:
-        player1 = WAITING_SECRET_GAME_PLAYERS.pop()
-        player2 = WAITING_SECRET_GAME_PLAYERS.pop()
 
-    time.sleep(WAITING_TIMEOUT_IN_SECS)
+def on_waiting_player_readable(loop: EventLoop, match_queue: MatchQueue, player: WaitingPlayer):
+    """
+    Called on the waiting players' loop. The data is only peeked at until the player is known to be waiting, so 
+    that a command sent right after the game starts is not stolen from the game.
+    """
+    # The player was paired up, and is about to stop being watched.
+    if not match_queue.is_waiting(player):
+        return
+
+    try:
+        peeked_data = player.conn.recv(1, socket.MSG_PEEK)
+    except ConnectionError:
+        peeked_data = b''
+
+    if not peeked_data:
+        evict_waiting_player(loop, match_queue, player, 'disconnected')
+        return
+
+    _heartbeat_monitor.on_heard(player)
+
+    if not is_only_pongs(player.conn.recv(BUF_SIZE)):
+        print(f"ERROR: ignoring data sent by '{player.username}' before their game started")
+
+
+def evict_waiting_player(loop: EventLoop, match_queue: MatchQueue, player: WaitingPlayer, reason: EvictionReason):
+    """
+    Called on the waiting players' loop. Stops watching the player and removes them from their queue (unless 
+    they were already paired up, in which case their game is going to notice the disconnect instead).
+    """
+    loop.remove_reader(player.conn)
+    _heartbeat_monitor.unwatch(player)
+
+    if match_queue.cancel(player, reason):
+        print(f"LOG: Evicted '{player.username}' while waiting for a game ({reason}). Queue: {match_queue.stats}")
+        player.conn.close()
+
+
+def on_dead_player_at_pairing(player: WaitingPlayer):
+    """
+    Called on a matchmaker thread after the player was evicted by the liveness check.
+    """
+    loop = _waiting_players_loop
+    assert loop
+
+    def forget():
+        loop.remove_reader(player.conn)
+        _heartbeat_monitor.unwatch(player)
+        player.conn.close()
+
+    loop.call_soon_threadsafe(forget)
+
+
+def run_heartbeats(loop: EventLoop):
+    """
+    Pings the waiting players every `HEARTBEAT_INTERVAL_SECS` (on the waiting players' loop) and evicts the idle ones.
+    """
+    for player, reason in _heartbeat_monitor.tick(time.perf_counter()):
+        evict_waiting_player(loop, get_match_queue(player), player, reason)
 
-    # Logic to start the game
-    start_secret_game_game(player1, player2)
+    loop.call_later(HEARTBEAT_INTERVAL_SECS, lambda: run_heartbeats(loop))
 
 
-def start_stratego_game(player_1: StrategoPlayer, player_2: StrategoPlayer):
+def is_waiting_player_alive(player: WaitingPlayer) -> bool:
+    return is_connection_alive(player.conn)
+
+
+def check_paired_players_alive(players: list[WaitingPlayer], rejoin: Callable[[WaitingPlayer], None]) -> bool:
+    """
+    Checks that the players who were paired up are still connected, right before their game starts. If not, the
+    dead players' connections are closed and the others are handed to `rejoin` (to wait for another opponent).
+    """
+    players_alive = [(player, is_connection_alive(player.conn)) for player in players]
+
+    if all(is_alive for _, is_alive in players_alive):
+        return True
+
+    for player, is_alive in players_alive:
+        if is_alive:
+            print(f"LOG: The opponent of '{player.username}' disconnected before their game started. Requeuing them")
+            rejoin(player)
+        else:
+            player.conn.close()
+
+    return False
+
+
+def close_unstarted_game(players: list[WaitingPlayer], error: Exception):
+    """
+    Closes the connections of the players whose game failed to start (i.e. a player disconnected while being sent
+    `?game-start`). The other players may have received `?game-start` already, so they cannot wait for another opponent.
+    """
+    print(f"ERROR: could not start game: {error!r}")
+
+    for player in players:
+        player.conn.close()
+
+
+def start_paired_game(start_game: Callable[..., None], player_1, player_2):
+    """
+    Called on a matchmaker thread. Stops watching the players' connections and then starts their game 
+    (both on the waiting players' loop).
+    """
+    loop = _waiting_players_loop
+    assert loop
+
+    def start():
+        for player in (player_1, player_2):
+            loop.remove_reader(player.conn)
+            _heartbeat_monitor.unwatch(player)
+
+        if not check_paired_players_alive([player_1, player_2], rejoin=lambda player: watch_waiting_player(get_match_queue(player), player)):
+            return
+
+        try:
+            start_game(player_1, player_2)
+
+        # i.e. a player disconnected right before their game started.
+        except (ConnectionResetError, BrokenPipeError) as e:
+            close_unstarted_game([player_1, player_2], e)
+
+    loop.call_soon_threadsafe(start)
+
+
+def get_game_pool() -> GamePool:
+    """
+    Returns the process-wide pool that runs the games, creating it the first time. It is created lazily so that 
+    each worker process (see `multi_worker.py`) creates its own pool after being forked.
+    """
+    global _game_pool
+
+    if _game_pool is None:
+        with _game_pool_lock:
+            if _game_pool is None:
+                _game_pool = GamePool.with_threads(GAME_POOL_THREAD_AMT)
+
+    return _game_pool
+
+
+def start_stratego_game(player_1: StrategoPlayer, player_2: StrategoPlayer, on_finish: Callable[[], None] | None = None):
+    """
+    Starts a Stratego game on the game pool. Returns right away. `on_finish` is called after the game ends.
+    """
+    game = create_stratego_game(player_1, player_2)
+    get_game_pool().submit(game, on_finish=on_finish)
+
+
+def create_stratego_game(player_1: StrategoPlayer, player_2: StrategoPlayer) -> StrategoGame:
     print("LOG: Two players found. Starting Stratego game...")
 
-    assert player_1.color, player_2.color
+    # Set player colors.
+    player_1.color = 'r'
+    player_2.color = 'b'
 
     # Send a message to both players to start the game.
-    player_1.conn.sendall(f"?game-start:stratego:{player_1.color}:{player_2.username}".encode())
-    player_2.conn.sendall(f"?game-start:stratego:{player_2.color}:{player_1.username}".encode())
+    player_1.conn.sendall(encode_command(f"?game-start:stratego:{player_1.color}:{player_2.username}", player_1.protocol))
+    player_2.conn.sendall(encode_command(f"?game-start:stratego:{player_2.color}:{player_1.username}", player_2.protocol))
 
     print(f"LOG: {player_1.username} ({player_1.color}) has deck {player_1.starting_deck_repr}")
     print(f"LOG: {player_2.username} ({player_2.color}) has deck {player_2.starting_deck_repr}")
 
-    # The game for this thread. 
-    game = StrategoGame(player_1, player_2)
+    return StrategoGame(player_1, player_2)
+
+
+def start_word_golf_game(player_1: WordGolfPlayer, player_2: WordGolfPlayer, on_finish: Callable[[], None] | None = None):
+    """
+    Starts a Word Golf game on the game pool. Returns right away. `on_finish` is called after the game ends.
+    """
+    game = create_word_golf_game(player_1, player_2)
 
-    # Run the game in a loop.
-    game.run()
+    # Give the clients time to process the game's start.
+    get_game_pool().submit(game, start_delay=GAME_START_PROCESSING_DELAY_SECS, on_finish=on_finish)
 
 
-def start_word_golf_game(player_1: WordGolfPlayer, player_2: WordGolfPlayer):
+def create_word_golf_game(player_1: WordGolfPlayer, player_2: WordGolfPlayer) -> WordGolfGame:
     print("LOG: Two players found. Starting Word Golf game...")
 
     # Send a message to both players to start the game.
-    player_1.conn.sendall(f"?game-start:word_golf:{player_2.username}".encode())
-    player_2.conn.sendall(f"?game-start:word_golf:{player_1.username}".encode())
-
-    # Give the clients time to process the game's start.
-    time.sleep(0.5)
+    player_1.conn.sendall(encode_command(f"?game-start:word_golf:{player_2.username}", player_1.protocol))
+    player_2.conn.sendall(encode_command(f"?game-start:word_golf:{player_1.username}", player_2.protocol))
 
     print(f"LOG: {player_1.username} joined a Word golf game")
     print(f"LOG: {player_2.username} joined a Word golf game")
 
-    # The game for this thread. 
-    game = WordGolfGame([player_1, player_2])
+    return WordGolfGame([player_1, player_2])
+
 
-    # Run the game in a loop.
-    game.run()
+def start_secret_game_game(player_1: SecretGamePlayer, player_2: SecretGamePlayer, on_finish: Callable[[], None] | None = None):
+    """
+    Starts a Secret Game game on the game pool. Returns right away. `on_finish` is called after the game ends.
+    """
+    game = create_secret_game_game(player_1, player_2)
 
+    # Give the clients time to process the game's start.
+    get_game_pool().submit(game, start_delay=GAME_START_PROCESSING_DELAY_SECS, on_finish=on_finish)
 
-def start_secret_game_game(player_1: SecretGamePlayer, player_2: SecretGamePlayer):
+
+def create_secret_game_game(player_1: SecretGamePlayer, player_2: SecretGamePlayer) -> SecretGameGame:
     print("LOG: Two players found. Starting Secret Game game...")
 
     players = [player_1, player_2]
 
     chosen_map_id, map_ = pick_random_map()
 
-    player_1.position = map_.p1_spawn_map_pos
-    player_2.position = map_.p2_spawn_map_pos
+    player_1.position = map_.get_spawn_position(0)
+    player_2.position = map_.get_spawn_position(1)
 
     # Send a message to both players to start the game.
     for i in range(len(players)):
@@ -196,19 +445,26 @@ def start_secret_game_game(player_1: SecretGamePlayer, player_2: SecretGamePlaye
             f":{player_1.username}:{player_1.position.x}:{player_1.position.y}" + \
             f":{player_2.username}:{player_2.position.x}:{player_2.position.y}"
         
-        players[i].conn.sendall(cmd.encode())
-
-    # Give the clients time to process the game's start.
-    time.sleep(0.5)
+        players[i].conn.sendall(encode_command(cmd, players[i].protocol))
 
     print(f"LOG: {player_1.username} joined a Secret Game game")
     print(f"LOG: {player_2.username} joined a Secret Game game")
 
-    # The game for this thread. 
-    game = SecretGameGame([player_1, player_2], map_)
+    return SecretGameGame([player_1, player_2], map_, physics=SECRET_GAME_PHYSICS)
+
+
+def enable_batched_physics():
+    """
+    Makes every new Secret Game race use a shared, vectorized physics engine. Requires NumPy.
+    """
+    global SECRET_GAME_PHYSICS
 
-    # Run the game in a loop.
-    game.run()
+    if not is_batched_physics_available():
+        print("ERROR: Batched physics require NumPy, which is not installed. Using the regular physics instead")
+        return
+
+    SECRET_GAME_PHYSICS = BatchedRacePhysics()
+    print("LOG: Using batched Secret Game physics")
 
 
 def get_local_ip():
@@ -229,26 +485,70 @@ def get_local_ip():
         return "127.0.0.1"
 
 
-def run():
-    local_ip = get_local_ip()
-
+def create_listener(reuse_port: bool = False) -> Connection:
+    """
+    Creates the socket that accepts the clients on `PORT`. With `reuse_port`, several processes can listen 
+    on the same port at once (and the kernel spreads the new connections between them).
+    """
     # AF_INET: socket family is IPv4
     # SOCK_STREAM: socket type is TCP (lossless)
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.bind((HOST, PORT))
-        s.listen()
-        # This timeout is only for the accept calls (for connecting new clients).
-        s.settimeout(2.0)
-        print(f"LOG: Server listening on {local_ip}:{PORT}")
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+    if reuse_port:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+    s.bind((HOST, PORT))
+    s.listen()
+    # This timeout is only for the accept calls (for connecting new clients).
+    s.settimeout(2.0)
+
+    return s
+
+
+def accept_clients(listener: Connection, handle: Callable[[Connection, tuple], None]):
+    """
+    Accepts clients forever, handling each one on a new thread.
+    """
+    while True:
+        try:
+            conn, addr = listener.accept()
+            print(f"LOG: Handling connection from {addr}")
 
-        while True:
-            try:
-                conn, addr = s.accept()
-                print(f"LOG: Handling connection from {addr}")
+            # Start a new thread for each client.
+            thread = threading.Thread(target=handle, args=(conn, addr))
+            thread.daemon = True
+            thread.start()
 
-                # Start a new thread for each client.
-                thread = threading.Thread(target=handle_client, args=(conn, addr))
-                thread.daemon = True
-                thread.start()
+        except socket.timeout: continue
 
-            except socket.timeout: continue
+
+def run():
+    global _waiting_players_loop
+
+    local_ip = get_local_ip()
+
+    loop = EventLoop("waiting-players")
+    loop.call_later(HEARTBEAT_INTERVAL_SECS, lambda: run_heartbeats(loop))
+    loop.start_in_thread()
+    _waiting_players_loop = loop
+
+    # Dead players are evicted right before being paired up, so that their opponent keeps waiting for a live one instead.
+    STRATEGO_MATCH_QUEUE.start(
+        on_match=lambda p1, p2: start_paired_game(start_stratego_game, p1, p2),
+        is_alive=is_waiting_player_alive,
+        on_evict=on_dead_player_at_pairing,
+    )
+    WORD_GOLF_MATCH_QUEUE.start(
+        on_match=lambda p1, p2: start_paired_game(start_word_golf_game, p1, p2),
+        is_alive=is_waiting_player_alive,
+        on_evict=on_dead_player_at_pairing,
+    )
+    SECRET_GAME_MATCH_QUEUE.start(
+        on_match=lambda p1, p2: start_paired_game(start_secret_game_game, p1, p2),
+        is_alive=is_waiting_player_alive,
+        on_evict=on_dead_player_at_pairing,
+    )
+
+    with create_listener() as s:
+        print(f"LOG: Server listening on {local_ip}:{PORT}")
+        accept_clients(s, handle_client)
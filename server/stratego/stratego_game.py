@@ -1,4 +1,5 @@
 import time
+from typing import Literal
 from .stratego_types import (
     parse_piece_from_encoded_str, 
     get_piece_value, 
@@ -8,9 +9,12 @@ from .stratego_types import (
     COLS, 
     DECK_ROWS, 
     MOVE_RESULT_VIEW_DURATION_SECS,
+    BOARD_SNAPSHOT_INTERVAL_TURNS,
+    HIDDEN_PIECE_ENCODING,
     StrategoColor, 
     StrategoMoveResult, 
     Pair, 
+    BoardViewKey,
 )
 from .stratego_player import StrategoPlayer
 from .stratego_game_result import StrategoGameResult
@@ -18,6 +22,8 @@ from .stratego_game_result import StrategoGameResult
 from server_types import row_col_to_flat_index, get_sign, ColorCode
 
 from command_reader import ClientCommandReader
+from send_batcher import SendBatcher
+from wire_protocol import encode_command, encode_turn_info_frame, encode_board_snapshot_frame, encode_board_delta_frame
 
 class StrategoGame:
     """
@@ -45,15 +51,45 @@ class StrategoGame:
 
         self.result: StrategoGameResult | None = None
 
+        # The game is either waiting for the current player's move, or showing the 
+        # result of the last attack until `phase_deadline`.
+        self.phase: Literal['awaiting_move', 'showing_move_result'] = 'awaiting_move'
+        self.phase_deadline: float | None = None
+
+        # Incremented every time the players are sent the board (for players using delta board sync).
+        self.board_seq = 0
+
+        # The board sequence number of the last snapshot sent to each player. A resync request for a board that 
+        # the player already got a snapshot of is ignored (i.e. when several deltas arrive after a missed one).
+        self.snapshot_board_seqs = [0 for _ in self.players]
+
+        # The cells that changed since the board was last sent.
+        self.changed_cells: set[Pair] = set()
+
+        # The positions of the pieces whose identity is known by both players (i.e. after an attack).
+        self.revealed_cells: set[Pair] = set()
+
+        # Flattened views of the board: the full board, and the board as seen by each player (with fog of war).
+        # They are updated cell by cell as the board changes, instead of being rebuilt every turn.
+        self.board_views: dict[BoardViewKey, list[str]] = {}
+
+        # The socket representation of each view, cached until the board changes.
+        self.board_view_reprs: dict[BoardViewKey, str] = {}
+
         self.command_reader = ClientCommandReader(
             connections=[p.conn for p in self.players],
             valid_cmd_prefixes=(
                 '!move',
+                '!board-resync',
             ),
         )
 
+        # Everything sent while handling input or stepping is written at the end of the step, once per connection.
+        self.send_batcher = SendBatcher([p.conn for p in self.players])
+
         self.add_player_starting_decks_to_board()
         self.add_lakes_to_board()
+        self.build_board_views()
 
         self.debug_print_board()
 
@@ -151,117 +187,307 @@ class StrategoGame:
         #     print()
 
 
+    def set_board_cell(self, pos: Pair, value: str):
+        """
+        Updates a cell of the board and marks it as changed (for players using delta board sync).
+        """
+        self.board[pos[0]][pos[1]] = value
+
+        # An empty cell no longer has a revealed piece.
+        if value == '':
+            self.revealed_cells.discard(pos)
+
+        self.changed_cells.add(pos)
+        self.update_board_views(pos)
+
+
+    def reveal_cell(self, pos: Pair):
+        """
+        Reveals the identity of the piece at the given position to both players.
+        """
+        self.revealed_cells.add(pos)
+
+        self.changed_cells.add(pos)
+        self.update_board_views(pos)
+
+
+    def get_cell_view(self, pos: Pair, view_key: BoardViewKey) -> str:
+        """
+        Gets a cell as seen in the given view. Opponent pieces that have not been revealed lose their identity (i.e. `"b?"`).
+        """
+        cell = self.board[pos[0]][pos[1]]
+
+        if view_key == 'full' or cell in {'', 'XX'} or cell[0] == view_key or pos in self.revealed_cells:
+            return cell
+
+        return f"{cell[0]}{HIDDEN_PIECE_ENCODING}"
+
+
+    def build_board_views(self):
+        view_keys: list[BoardViewKey] = ['full', 'r', 'b']
+
+        for view_key in view_keys:
+            self.board_views[view_key] = [self.get_cell_view((r, c), view_key) for r in range(ROWS) for c in range(COLS)]
+
+        self.board_view_reprs.clear()
+
+
+    def update_board_views(self, pos: Pair):
+        # Maps 2D coords to 1D coords on a flattened array.
+        flat_idx = row_col_to_flat_index(pos[0], pos[1], COLS)
+
+        for view_key, view in self.board_views.items():
+            view[flat_idx] = self.get_cell_view(pos, view_key)
+
+        self.board_view_reprs.clear()
+
+
+    def get_board_view_key(self, player: StrategoPlayer) -> BoardViewKey:
+        if player.fog_of_war:
+            return player.color # type: ignore
+
+        return 'full'
+
+
+    def get_board_view_repr(self, view_key: BoardViewKey) -> str:
+        """
+        Gets a socket-friendly string format for a view of the board. The string is only built once per board change.
+        """
+        view_repr = self.board_view_reprs.get(view_key)
+
+        if view_repr is None:
+            view_repr = ':'.join(self.board_views[view_key])
+            self.board_view_reprs[view_key] = view_repr
+
+        return view_repr
+
+
     def get_board_socket_repr(self) -> str:
         """
         Gets a socket-friendly string format for the board.
         """
+        return self.get_board_view_repr('full')
+    
 
-        flattened_board = ['' for _ in range(ROWS * COLS)]
+    def start(self):
+        """
+        Starts the game by sending the first turn's info to both players.
+        """
+        self.send_turn_info()
+        self.send_batcher.flush()
 
-        for r in range(ROWS):
-            for c in range(COLS):
-                # Maps 2D coords to 1D coords on a flattened array.
-                # A flat array is needed to send the board over the socket.
-                flat_idx = row_col_to_flat_index(r, c, COLS)
 
-                flattened_board[flat_idx] = self.board[r][c]
+    def abort(self):
+        """
+        Abruptly ends the game (i.e. when a player disconnects).
+        """
+        self.is_running = False
+        self.phase = 'awaiting_move'
+        self.result = StrategoGameResult(None, abrupt_end=True)
 
-        return ':'.join(flattened_board)
-    
 
-    def run(self):
+    def is_over(self) -> bool:
         """
-        Runs the given game.
+        Returns `True` once the game has stopped running and the last move result 
+        has been shown to the players.
         """
-        try:
-            self.run_main_game_loop()
+        return not self.is_running and self.phase != 'showing_move_result'
 
-        # End the game if a connection error occurs.
-        except ConnectionResetError:
-            self.result = StrategoGameResult(None, abrupt_end=True)
 
+    def end(self):
+        """
+        Sends the game over message to both players.
+        """
         # Game ended.
         print("LOG: Stratego game ended")
 
+        # The result of the game must have been determined already.
+        assert self.result
+
+        for player_idx in range(len(self.players)):
+            # There is a winner.
+            if self.result.winner is not None:
+                self.queue_command(player_idx, f"?game-over:stratego:winner-determined:{self.result.winner}\\")
+
+            # The game abruptly ended before finishing normally.
+            elif self.result.abrupt_end:
+                self.queue_command(player_idx, "?game-over:stratego:abrupt-end\\")
+
+            else:
+                print("ERROR: Unknown win condition")
+
+        self.send_batcher.flush_final()
+
+
+    def queue_command(self, player_idx: int, cmd: str):
+        """
+        Queues a command to be sent to a player at the end of the current step.
+        """
+        self.send_batcher.queue(player_idx, encode_command(cmd, self.players[player_idx].protocol))
+
+
+    def queue_data(self, player: StrategoPlayer, data: bytes):
+        self.send_batcher.queue(self.players.index(player), data)
+
+
+    def send_turn_info(self):
+        """
+        Sends the board and the current turn to both players. Players using delta board sync only 
+        receive the cells that changed since the last turn, except on the first turn and every 
+        `BOARD_SNAPSHOT_INTERVAL_TURNS` turns, where they receive a full snapshot.
+        """
+        self.board_seq += 1
+
+        changed_flat_idxs = sorted(row_col_to_flat_index(r, c, COLS) for r, c in self.changed_cells)
+        self.changed_cells.clear()
+
+        send_snapshot = self.board_seq == 1 or self.board_seq % BOARD_SNAPSHOT_INTERVAL_TURNS == 0
+
         for player in self.players:
-            # The result of the game must have been determined already.
-            assert self.result
+            if not player.delta_board_sync:
+                self.send_full_turn_info(player)
 
-            try:
-                # There is a winner.
-                if self.result.winner is not None:
-                    player.conn.sendall(f"?game-over:stratego:winner-determined:{self.result.winner}\\".encode())
+            elif send_snapshot:
+                self.send_board_snapshot(player)
 
-                # The game abruptly ended before finishing normally.
-                elif self.result.abrupt_end:
-                    player.conn.sendall("?game-over:stratego:abrupt-end\\".encode())
+            else:
+                view = self.board_views[self.get_board_view_key(player)]
+                self.send_board_delta(player, [(flat_idx, view[flat_idx]) for flat_idx in changed_flat_idxs])
+
+
+    def send_full_turn_info(self, player: StrategoPlayer):
+        view_key = self.get_board_view_key(player)
+
+        if player.protocol == 'text':
+            data = f"?turn-info:{self.turn}:{self.get_board_view_repr(view_key)}\\"
+            self.queue_data(player, data.encode())
+
+        else:
+            self.queue_data(player, encode_turn_info_frame(self.turn, self.board_views[view_key]))
 
-                else:
-                    print("ERROR: Unknown win condition")
 
-            # Do not bother trying to send a game over message if the client's socket is disconnected.
-            except ConnectionResetError: pass
+    def send_board_snapshot(self, player: StrategoPlayer):
+        view_key = self.get_board_view_key(player)
+        self.snapshot_board_seqs[self.players.index(player)] = self.board_seq
+
+        if player.protocol == 'text':
+            data = f"?board-snapshot:{self.board_seq}:{self.turn}:{self.get_board_view_repr(view_key)}\\"
+            self.queue_data(player, data.encode())
+
+        else:
+            self.queue_data(player, encode_board_snapshot_frame(self.board_seq, self.turn, self.board_views[view_key]))
+
+
+    def send_board_delta(self, player: StrategoPlayer, changes: list[tuple[int, str]]):
+        if player.protocol == 'text':
+            change_fields = ''.join(f":{flat_idx}:{cell}" for flat_idx, cell in changes)
+            data = f"?board-delta:{self.board_seq}:{self.turn}{change_fields}\\"
+            self.queue_data(player, data.encode())
+
+        else:
+            self.queue_data(player, encode_board_delta_frame(self.board_seq, self.turn, changes))
 
 
-    def run_main_game_loop(self):
+    def on_input(self, player_idx: int, data: str):
         """
-        Runs the main part of the game loop.
+        Handles a single command sent by the player at `player_idx`. Moves received 
+        while the previous move result is still being shown are ignored.
         """
-        while self.is_running:
-            # Send turn info.
-            for player in self.players:
-                data = f"?turn-info:{self.turn}:{self.get_board_socket_repr()}\\"
-                player.conn.sendall(data.encode())
+        # A player using delta board sync can ask for a full snapshot at any time (i.e. after missing an update).
+        if data.startswith("!board-resync"):
+            player = self.players[player_idx]
 
-            move_result: StrategoMoveResult | None = None
+            if not player.delta_board_sync:
+                return
 
-            while move_result is None:
-                for player_idx in range(len(self.players)):
-                    move_result = self.handle_player_client_response(player_idx)
+            if self.snapshot_board_seqs[player_idx] == self.board_seq:
+                print(f"LOG: Ignoring a repeated board resync from '{player.username}' (already sent snapshot #{self.board_seq})")
+                return
 
-                    if move_result is not None:
-                        break # early-exit out of for loop
+            self.send_board_snapshot(player)
+            return
 
-            print(move_result)
+        if self.phase != 'awaiting_move' or not self.is_running:
+            print(f"LOG: Ignoring '{data}' since the game is not waiting for a move")
+            return
 
-            # Send the move result command to the players (this is for animating the results). 
-            for player in self.players:
-                player.conn.sendall(move_result_to_command(move_result).encode())
-            
-            # Wait a duration so that the client has time to display the sent move result to the user.
-            if move_result.kind != 'movement':
-                time.sleep(MOVE_RESULT_VIEW_DURATION_SECS)
-                
-            # Toggle the turn.
-            self.toggle_turn()
+        move_result = self.handle_player_client_response(player_idx, data)
 
+        if move_result is None:
+            return
 
-    def handle_player_client_response(self, player_idx: int) -> StrategoMoveResult | None:
-        for data in self.command_reader.yield_commands(player_idx):
-            player = self.get_current_player()
+        print(move_result)
 
-            if data.startswith("!move"):
-                if player.color != self.turn:
-                    username = self.turn_map[player.color].username # type: ignore
-                    print(f"LOG: Player '{username}' ({player.color}) tried to move even though it was not their turn.")
-                    return None # player cannot move if it's not their turn
+        # Send the move result command to the players (this is for animating the results). 
+        # Players with fog of war also get the identity of the pieces involved in an attack.
+        for player_idx, player in enumerate(self.players):
+            self.queue_command(player_idx, move_result_to_command(move_result, reveal_pieces=player.fog_of_war))
 
-                fields = data.split(':')
-                from_row = int(fields[1])
-                from_col = int(fields[2])
-                to_row = int(fields[3])
-                to_col = int(fields[4])
+        # Wait a duration so that the client has time to display the sent move result to the user.
+        if move_result.kind != 'movement':
+            self.phase = 'showing_move_result'
+            self.phase_deadline = time.perf_counter() + MOVE_RESULT_VIEW_DURATION_SECS
 
-                move_result = self.process_move((from_row, from_col), (to_row, to_col))
+        else:
+            self.end_turn()
 
-                if move_result is None:
-                    print(f"LOG: ({self.turn}) performed an invalid move")
 
-                return move_result
-                    
-            else:
-                print(f"ERROR: Invalid response '{data}'")
-                return None # unknown command from client
+    def step(self, now: float) -> float | None:
+        """
+        Advances the game's timed phases. Returns the time (in `time.perf_counter` seconds) 
+        at which the game needs to be stepped again, or `None` if it only needs to be stepped 
+        after receiving input.
+        """
+        if self.phase == 'showing_move_result':
+            assert self.phase_deadline is not None
+
+            if now >= self.phase_deadline:
+                self.end_turn()
+
+        # Everything queued while handling input (or by the turn change) goes out in a single write per connection.
+        self.send_batcher.flush()
+
+        return self.send_batcher.limit_deadline(now, self.phase_deadline)
+
+
+    def end_turn(self):
+        """
+        Toggles the turn and lets the players know about the new turn (unless the game ended).
+        """
+        self.phase = 'awaiting_move'
+        self.phase_deadline = None
+
+        self.toggle_turn()
+
+        if self.is_running:
+            self.send_turn_info()
+
+
+    def handle_player_client_response(self, player_idx: int, data: str) -> StrategoMoveResult | None:
+        player = self.players[player_idx]
+
+        if data.startswith("!move"):
+            if player.color != self.turn:
+                username = self.turn_map[player.color].username # type: ignore
+                print(f"LOG: Player '{username}' ({player.color}) tried to move even though it was not their turn.")
+                return None # player cannot move if it's not their turn
+
+            fields = data.split(':')
+            from_row = int(fields[1])
+            from_col = int(fields[2])
+            to_row = int(fields[3])
+            to_col = int(fields[4])
+
+            move_result = self.process_move((from_row, from_col), (to_row, to_col))
+
+            if move_result is None:
+                print(f"LOG: ({self.turn}) performed an invalid move")
+
+            return move_result
+                
+        else:
+            print(f"ERROR: Invalid response '{data}'")
+            return None # unknown command from client
 
 
     # TODO: This function needs more testing.
@@ -370,8 +596,14 @@ class StrategoGame:
         
         # Player is moving into an empty tile (valid).
         elif element_from[0] == current_player.color and element_to == "":
-            self.board[from_pos[0]][from_pos[1]] = ""
-            self.board[to_pos[0]][to_pos[1]] = element_from
+            was_revealed = from_pos in self.revealed_cells
+
+            self.set_board_cell(from_pos, "")
+            self.set_board_cell(to_pos, element_from)
+
+            # A revealed piece stays revealed after moving.
+            if was_revealed:
+                self.reveal_cell(to_pos)
 
             return StrategoMoveResult(kind='movement', attacking_pos=from_pos, defending_pos=to_pos)
         
@@ -389,29 +621,51 @@ class StrategoGame:
 
             if own_piece_value > opp_piece_value or spy_attacking_marshal or miner_attacking_bomb:
                 # Replace the defeated piece with the attacking player's piece.
-                self.board[to_pos[0]][to_pos[1]] = element_from
+                self.set_board_cell(to_pos, element_from)
 
                 # Remove the attacking piece from its old position.
-                self.board[from_pos[0]][from_pos[1]] = ""
+                self.set_board_cell(from_pos, "")
 
                 if opp_piece_name == 'flag':
                     winning_color: StrategoColor = element_from[0] # type: ignore
                     self.declare_winner(winning_color)
 
-                move_result = StrategoMoveResult(kind='attack_success', attacking_pos=from_pos, defending_pos=to_pos)
+                move_result = StrategoMoveResult(
+                    kind='attack_success', 
+                    attacking_pos=from_pos, 
+                    defending_pos=to_pos, 
+                    attacking_piece=element_from, 
+                    defending_piece=element_to,
+                )
 
             elif own_piece_value < opp_piece_value:
                 # Remove the current player's piece.
-                self.board[from_pos[0]][from_pos[1]] = ""
+                self.set_board_cell(from_pos, "")
 
-                move_result = StrategoMoveResult(kind='attack_fail', attacking_pos=from_pos, defending_pos=to_pos)
+                move_result = StrategoMoveResult(
+                    kind='attack_fail', 
+                    attacking_pos=from_pos, 
+                    defending_pos=to_pos, 
+                    attacking_piece=element_from, 
+                    defending_piece=element_to,
+                )
 
             else:
                 # Remove both pieces.
-                self.board[to_pos[0]][to_pos[1]] = ""
-                self.board[from_pos[0]][from_pos[1]] = ""
-
-                move_result = StrategoMoveResult(kind='attack_fail', attacking_pos=from_pos, defending_pos=to_pos)
+                self.set_board_cell(to_pos, "")
+                self.set_board_cell(from_pos, "")
+
+                move_result = StrategoMoveResult(
+                    kind='attack_fail', 
+                    attacking_pos=from_pos, 
+                    defending_pos=to_pos, 
+                    attacking_piece=element_from, 
+                    defending_piece=element_to,
+                )
+
+            # The piece that won the attack (if any) has been revealed to both players.
+            if self.board[to_pos[0]][to_pos[1]] != "":
+                self.reveal_cell(to_pos)
 
             return move_result
         
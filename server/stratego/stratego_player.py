@@ -1,4 +1,4 @@
-from server_types import Connection
+from server_types import Connection, WireProtocol
 from .stratego_types import StrategoColor
 
 class StrategoPlayer:
@@ -11,14 +11,22 @@ class StrategoPlayer:
     - `username` the username that the client sent to identify itself; is not unique
     - `starting_deck_repr` contains a colon-delimited string that represents the a player's starting deck (i.e. `"1:2:4:1:0"`)
     - `color` represents the player's color; this is decided automatically by the server
+    - `protocol` the protocol version that the client asked for when joining
+    - `delta_board_sync` whether the client asked to only receive the changed cells of the board each turn
+    - `fog_of_war` whether the client asked to only receive the identity of its own pieces and of the revealed opponent pieces
+    - `heartbeat` whether the client answers the server's pings while waiting for an opponent
 
     Note that the starting decks are in a flat-array format. This means that all the rows of the deck are collapsed onto one row. 
     Also note that the deck is sent by the client and its pieces do not have color, as the client does not know the player's 
     color beforehand, as it is decided by the server.
     """
 
-    def __init__(self, conn: Connection, username: str, starting_deck_repr: str, color: StrategoColor | None):
+    def __init__(self, conn: Connection, username: str, starting_deck_repr: str, color: StrategoColor | None, protocol: WireProtocol = 'text', delta_board_sync: bool = False, fog_of_war: bool = False, heartbeat: bool = False):
         self.conn = conn
+        self.protocol = protocol
+        self.delta_board_sync = delta_board_sync
+        self.fog_of_war = fog_of_war
+        self.heartbeat = heartbeat
         self.username = username
         self.color = color
 
@@ -14,12 +14,19 @@ PieceName = Literal['bomb', 'captain', 'coronel', 'flag', 'general', 'lieutenant
 
 Pair = tuple[int, int]
 
+# The board as seen by a player (with fog of war), or the full board.
+BoardViewKey = StrategoColor | Literal['full']
+
 @dataclass
 class StrategoMoveResult:
     kind: Literal['movement', 'attack_success', 'attack_fail', 'tie']
     attacking_pos: Pair
     defending_pos: Pair
 
+    # The pieces involved in an attack (before the attack). Empty for movements.
+    attacking_piece: str = ''
+    defending_piece: str = ''
+
 
 # === Constants ===
 
@@ -34,6 +41,13 @@ DECK_ROWS = 4
 # and before starting the next turn.
 MOVE_RESULT_VIEW_DURATION_SECS = 2.5
 
+# Replaces the piece encoding of opponent pieces that have not been revealed yet (i.e. `"b?"`).
+HIDDEN_PIECE_ENCODING = '?'
+
+# Players using delta board sync receive a full board snapshot (instead of only 
+# the changed cells) every this many turns, so that they can resync.
+BOARD_SNAPSHOT_INTERVAL_TURNS = 10
+
 ENCODED_STR_TO_PIECE: dict[str, PieceName] = {
     'S': 'spy',
     '1': 'marshal',
@@ -101,7 +115,15 @@ def toggle_color(color: StrategoColor) -> StrategoColor:
     return 'r' if color == 'b' else 'b'
 
 
-def move_result_to_command(move_result: StrategoMoveResult) -> str:
+def move_result_to_command(move_result: StrategoMoveResult, reveal_pieces: bool = False) -> str:
+    """
+    Turns the move result into a `?move-result` command. With `reveal_pieces`, attacks also 
+    contain the identity of both pieces (for players that do not see the opponent's pieces).
+    """
     r_atk, c_atk = move_result.attacking_pos
     r_def, c_def = move_result.defending_pos
+
+    if reveal_pieces and move_result.kind != 'movement':
+        return f"?move-result:{move_result.kind}:{r_atk}:{c_atk}:{r_def}:{c_def}:{move_result.attacking_piece}:{move_result.defending_piece}\\"
+
     return f"?move-result:{move_result.kind}:{r_atk}:{c_atk}:{r_def}:{c_def}\\"
@@ -0,0 +1,96 @@
+"""
+Tests for driving games on the game pool's event loops.
+
+Run from the `server` folder: `uv run -m unittest discover tests`
+"""
+
+import socket
+import sys
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from event_loop import EventLoop
+from game_pool import GamePool
+from word_golf.word_golf_game import WordGolfGame
+from word_golf.word_golf_types import WordGolfPlayer
+
+TIMEOUT_SECS = 5.0
+
+class MalformedInputTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = EventLoop("test-game-pool")
+        self.loop.start_in_thread()
+        self.pool = GamePool([self.loop])
+
+        self.conn_pairs = [socket.socketpair() for _ in range(2)]
+        self.clients = [client_conn for _, client_conn in self.conn_pairs]
+
+        for client in self.clients:
+            client.settimeout(TIMEOUT_SECS)
+
+        players = [WordGolfPlayer(server_conn, f"player_{i + 1}") for i, (server_conn, _) in enumerate(self.conn_pairs)]
+        self.pool.submit(WordGolfGame(players))
+
+
+    def tearDown(self):
+        for server_conn, client_conn in self.conn_pairs:
+            server_conn.close()
+            client_conn.close()
+
+
+    def read_until(self, client: socket.socket, expected: bytes) -> bytes:
+        """
+        Reads from the client's connection until the expected data arrives (or the server closes the connection).
+        """
+        received = b''
+
+        while expected not in received:
+            data = client.recv(4096)
+
+            if not data:
+                break
+
+            received += data
+
+        return received
+
+
+    def wait_for_game_amt(self, game_amt: int):
+        deadline = time.perf_counter() + TIMEOUT_SECS
+
+        while self.pool.get_running_game_amt() != game_amt and time.perf_counter() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(self.pool.get_running_game_amt(), game_amt)
+
+
+    def test_command_without_prefix_is_skipped(self):
+        self.read_until(self.clients[0], b"?stashed-words")
+
+        # The rest of the read is still handled after the invalid command.
+        self.clients[0].sendall(b"junk\\!guess:ZZZZZ\\")
+
+        received = self.read_until(self.clients[0], b"?alert:invalid-guess")
+        self.assertIn(b"?alert:invalid-guess:not-a-word:ZZZZZ", received)
+        self.assertEqual(self.pool.get_running_game_amt(), 1)
+
+
+    def test_undecodable_command_ends_game(self):
+        self.read_until(self.clients[0], b"?stashed-words")
+
+        self.clients[0].sendall(b"!guess:\xff\xfe\\")
+
+        for client in self.clients:
+            self.assertIn(b"?game-over:word_golf:abrupt-end", self.read_until(client, b"?game-over"))
+
+            # The game closed the connection.
+            self.assertEqual(self.read_until(client, b"unreachable"), b'')
+
+        self.wait_for_game_amt(0)
+
+
+if __name__ == "__main__":
+    unittest.main()
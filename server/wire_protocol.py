@@ -0,0 +1,139 @@
+"""
+This module contains the encoding of client-bound commands for each wire protocol version.
+
+* `text` (default): every command is a UTF-8 string terminated by `\\`.
+* `bin1`: negotiated by adding the `bin1` option to the game request (`?game+bin1:...` instead of `?game:...`). Every client-bound message
+  (starting with `?game-start`) is a length-prefixed frame: a header with the payload length (`u16`) and the
+  frame kind (`u8`), followed by the payload. The frequent Stratego board and Secret Game car updates have
+  compact struct-packed frames, every other command is sent as-is inside a `TEXT` frame. Server-bound commands
+  are the same in both versions.
+
+Game request options are appended to the first field of the `?game` command with a `+` (e.g. `?game+bin1+delta`).
+
+The client has the matching decoder in `client/networking/binary_protocol.py`.
+"""
+
+import struct
+
+from server_types import WireProtocol
+
+BINARY_PROTOCOL: WireProtocol = 'bin1'
+
+# Asks for Stratego board updates to only contain the changed cells.
+DELTA_BOARD_SYNC_OPTION = 'delta'
+
+# Asks for a Stratego board where only the player's own pieces and the revealed pieces carry their identity.
+FOG_OF_WAR_OPTION = 'fog'
+
+# Asks for `?ping` commands while waiting for an opponent, which the client answers with `!pong` (see `heartbeat.py`).
+HEARTBEAT_OPTION = 'heartbeat'
+PING_CMD = "?ping\\"
+PONG_CMD = "!pong"
+
+FRAME_HEADER = struct.Struct('!HB')
+
+# Board sequence number and turn color of a Stratego board delta or snapshot.
+BOARD_SYNC_HEADER = struct.Struct('!Ic')
+
+# Player index, x, y and facing angle of a Secret Game car.
+CAR_STATE_PAYLOAD = struct.Struct('!Biif')
+
+class FrameKind:
+    """
+    The kinds of `bin1` frames.
+    """
+    TEXT = 0
+    TURN_INFO = 1
+    CAR_STATE = 2
+    BOARD_DELTA = 3
+    BOARD_SNAPSHOT = 4
+
+
+# Each Stratego board cell is a single byte: 0 for an empty cell, 1 for a lake, otherwise the piece's
+# encoding character, with the high bit set for blue pieces.
+EMPTY_CELL_BYTE = 0
+LAKE_CELL_BYTE = 1
+BLUE_CELL_BIT = 0x80
+
+def parse_game_request_options(request_field: str) -> list[str]:
+    """
+    Returns the options in the first field of a `?game` command (i.e. `?game+bin1+delta` -> `['bin1', 'delta']`).
+    """
+    return request_field.split('+')[1:]
+
+
+def parse_protocol_from_game_request(request_field: str) -> WireProtocol:
+    """
+    Returns the protocol asked for by the first field of a `?game` command. Unknown versions fall back to text.
+    """
+    if BINARY_PROTOCOL in parse_game_request_options(request_field):
+        return BINARY_PROTOCOL
+
+    return 'text'
+
+
+def encode_frame(kind: int, payload: bytes) -> bytes:
+    return FRAME_HEADER.pack(len(payload), kind) + payload
+
+
+def encode_command(cmd: str, protocol: WireProtocol) -> bytes:
+    """
+    Encodes a text command (with its trailing `\\`, if it has one) for the given protocol.
+    """
+    if protocol == 'text':
+        return cmd.encode()
+
+    return encode_frame(FrameKind.TEXT, cmd.removesuffix('\\').encode())
+
+
+def encode_board_cell(cell: str) -> int:
+    if cell == '':
+        return EMPTY_CELL_BYTE
+
+    elif cell == 'XX':
+        return LAKE_CELL_BYTE
+
+    color_bit = BLUE_CELL_BIT if cell[0] == 'b' else 0
+    return color_bit | ord(cell[1])
+
+
+def encode_turn_info_frame(turn: str, cells: list[str]) -> bytes:
+    """
+    Encodes the `bin1` version of `?turn-info`: the turn's color followed by one byte per board cell.
+    The cells are given as a flattened board.
+    """
+    payload = bytearray(turn.encode())
+    payload.extend(encode_board_cell(cell) for cell in cells)
+
+    return encode_frame(FrameKind.TURN_INFO, bytes(payload))
+
+
+def encode_board_snapshot_frame(seq: int, turn: str, cells: list[str]) -> bytes:
+    """
+    Encodes the `bin1` version of `?board-snapshot`: the board's sequence number and turn, followed by one byte per board cell.
+    """
+    payload = bytearray(BOARD_SYNC_HEADER.pack(seq, turn.encode()))
+    payload.extend(encode_board_cell(cell) for cell in cells)
+
+    return encode_frame(FrameKind.BOARD_SNAPSHOT, bytes(payload))
+
+
+def encode_board_delta_frame(seq: int, turn: str, changes: list[tuple[int, str]]) -> bytes:
+    """
+    Encodes the `bin1` version of `?board-delta`: the board's sequence number and turn, followed by 
+    the flat index and the new value (one byte each) of every changed cell.
+    """
+    payload = bytearray(BOARD_SYNC_HEADER.pack(seq, turn.encode()))
+
+    for flat_idx, cell in changes:
+        payload.append(flat_idx)
+        payload.append(encode_board_cell(cell))
+
+    return encode_frame(FrameKind.BOARD_DELTA, bytes(payload))
+
+
+def encode_car_state_frame(player_idx: int, x: int, y: int, angle: float) -> bytes:
+    """
+    Encodes the `bin1` replacement for a player's `?pos` and `?angle` commands.
+    """
+    return encode_frame(FrameKind.CAR_STATE, CAR_STATE_PAYLOAD.pack(player_idx, x, y, angle))
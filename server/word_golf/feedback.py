@@ -0,0 +1,116 @@
+"""
+This module contains the Word Golf feedback generation.
+
+A guess's feedback is encoded compactly as a `FeedbackCode`: one base-3 digit (a `FeedbackMark`) per letter, so the
+feedback of a 5 letter word fits in a single byte. It is only expanded into the feedback string sent to the clients
+(i.e. `OA!PXPXLXE`) through a precomputed table with the template of every code.
+"""
+
+# The base-3 encoded feedback of a guess (the first letter is the least significant digit).
+FeedbackCode = int
+
+class FeedbackMark:
+    """
+    The feedback for a single letter of a guess.
+    """
+    # Not present in the actual word (or all its occurrences were already guessed in the right position).
+    WRONG = 0
+    # Present in the actual word, but in a different position.
+    MISPLACED = 1
+    # In the right position.
+    CORRECT = 2
+
+
+FEEDBACK_MARK_CHARS = ('X', '!', 'O')
+
+MAX_WORD_LEN = 16
+
+# The bit of each letter position (in a position bit mask) and the value of each letter's digit (in a feedback code).
+POSITION_BITS = tuple(1 << i for i in range(MAX_WORD_LEN))
+DIGIT_VALUES = tuple(3 ** i for i in range(MAX_WORD_LEN))
+
+class AnswerProfile:
+    """
+    The precomputed data of a word that a player has to guess: the positions (as a bit mask) of each of its letters.
+    """
+    __slots__ = ('word', 'letter_positions')
+
+    def __init__(self, word: str):
+        if len(word) > MAX_WORD_LEN:
+            raise ValueError(f"words can have at most {MAX_WORD_LEN} letters, got '{word}'")
+        
+        self.word = word
+        self.letter_positions: dict[str, int] = {}
+
+        for i, letter in enumerate(word):
+            self.letter_positions[letter] = self.letter_positions.get(letter, 0) | POSITION_BITS[i]
+
+
+    def gen_feedback_code(self, guess: str) -> FeedbackCode:
+        """
+        Generates the feedback of a guess (which must have the same length as the word).
+
+        A letter in the wrong position is only marked as misplaced if the word has an occurrence of the letter
+        that was not guessed in the right position. i.e. if the actual word is "HONEY" and the guess is "LINEN", then
+        the second 'N' is marked as wrong even though it is in the word.
+        """
+        word = self.word
+        letter_positions = self.letter_positions
+
+        correct_positions = 0
+
+        for i in range(len(word)):
+            if guess[i] == word[i]:
+                correct_positions |= POSITION_BITS[i]
+
+        # The positions of the word that have not been guessed correctly.
+        unguessed_positions = ~correct_positions
+
+        code = 0
+
+        for i in range(len(word)):
+            if correct_positions & POSITION_BITS[i]:
+                code += FeedbackMark.CORRECT * DIGIT_VALUES[i]
+
+            elif letter_positions.get(guess[i], 0) & unguessed_positions:
+                code += FeedbackMark.MISPLACED * DIGIT_VALUES[i]
+
+        return code
+
+
+def gen_feedback_templates(word_len: int) -> list[str]:
+    """
+    Returns the feedback string template (i.e. `O%s!%sX%sX%sX%s`, to be filled with the guess's letters) of 
+    every feedback code for words with the given length.
+    """
+    templates = []
+
+    for code in range(3 ** word_len):
+        template = []
+
+        for _ in range(word_len):
+            template.append(FEEDBACK_MARK_CHARS[code % 3] + "%s")
+            code //= 3
+
+        templates.append("".join(template))
+
+    return templates
+
+
+# The feedback templates of each word length, indexed by feedback code.
+_feedback_templates: dict[int, list[str]] = {}
+
+def get_feedback_templates(word_len: int) -> list[str]:
+    templates = _feedback_templates.get(word_len)
+
+    if templates is None:
+        templates = _feedback_templates.setdefault(word_len, gen_feedback_templates(word_len))
+
+    return templates
+
+
+def feedback_code_to_str(code: FeedbackCode, guess: str) -> str:
+    """
+    Expands a feedback code into the feedback string sent to the clients: each letter of the guess, preceded by its mark.
+    """
+    return get_feedback_templates(len(guess))[code] % tuple(guess)
@@ -0,0 +1,80 @@
+"""
+This module contains the Word Golf word dictionary, which is loaded once per process and shared by every game.
+"""
+
+from pathlib import Path
+import random
+import sys
+import threading
+from typing import Iterable, Self
+
+from .feedback import AnswerProfile
+
+WORD_DB_PATH = Path(__file__).parent / "word.db.txt"
+
+class WordDictionary:
+    """
+    The words that can be chosen for (and guessed in) a Word Golf game. Every word is interned, membership
+    checks are O(1) and the answer profile of every word is computed once, up front.
+
+    Immutable after being created, so it can be shared between games (and threads) without locking.
+    """
+
+    def __init__(self, words: Iterable[str]):
+        # Duplicates are dropped (keeping the file's order), so that a game cannot be given the same word twice.
+        self.words: tuple[str, ...] = tuple(dict.fromkeys(sys.intern(word) for word in words if word != ''))
+        self._word_set = frozenset(self.words)
+
+        self._answer_profiles: dict[str, AnswerProfile] = {word: AnswerProfile(word) for word in self.words}
+
+
+    @classmethod
+    def from_file(cls, path: Path) -> Self:
+        with open(path, "r") as f:
+            return cls(line.strip().upper() for line in f)
+
+
+    def __contains__(self, word: str) -> bool:
+        return word in self._word_set
+
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+
+    def choose_words(self, amt: int) -> list[str]:
+        """
+        Randomly chooses `amt` different words.
+        """
+        return random.sample(self.words, amt)
+
+
+    def get_answer_profile(self, word: str) -> AnswerProfile:
+        """
+        Returns the profile used for generating the feedback of guesses for the word. Only words outside of 
+        the dictionary are profiled on the spot.
+        """
+        profile = self._answer_profiles.get(word)
+
+        if profile is None:
+            profile = AnswerProfile(word)
+
+        return profile
+
+
+_word_dictionary: WordDictionary | None = None
+_word_dictionary_lock = threading.Lock()
+
+def get_word_dictionary() -> WordDictionary:
+    """
+    Returns the process-wide word dictionary, loading it from `word.db.txt` the first time.
+    """
+    global _word_dictionary
+
+    if _word_dictionary is None:
+        with _word_dictionary_lock:
+            if _word_dictionary is None:
+                _word_dictionary = WordDictionary.from_file(WORD_DB_PATH)
+                print(f"LOG: Loaded {len(_word_dictionary)} Word Golf words")
+
+    return _word_dictionary
@@ -1,14 +1,29 @@
-from pathlib import Path
-import random
+import time
 from command_reader import ClientCommandReader
-
-from .word_golf_types import WordGolfPlayer, WordGolfOccurrence, WordGolfGameResult
+from wire_protocol import encode_command
+from send_batcher import SendBatcher
+from message_scheduler import MessageScheduler
+
+from .word_golf_types import (
+    WordGolfPlayer, 
+    WordGolfOccurrence, 
+    WordGolfGameResult, 
+    InvalidGuessReason, 
+    WordGolfSyncSection, 
+    ALL_WORD_GOLF_SYNC_SECTIONS,
+)
+from .word_dictionary import get_word_dictionary
+from .feedback import feedback_code_to_str
 
 class WordGolfGame:
     # The maximum number of tries that a player has for guessing a word.
     MAX_FEEDBACK_HIST_LEN = 6
     QUEUED_WORD_AMT = 10
 
+    # The alert budget of each player. `None` delivers every alert as soon as it is raised.
+    MAX_ALERTS_PER_SEC: float | None = None
+    ALERT_BURST = 3
+
     def __init__(self, players: list[WordGolfPlayer]):
         if len(players) != 2:
             raise Exception(f"Expected 2 Word Golf players, not {len(players)}")
@@ -28,6 +43,20 @@ class WordGolfGame:
 
         self.result: WordGolfGameResult | None = None
 
+        # Set when an occurrence changed the state that needs to be synced with the clients. What 
+        # changed is tracked per player (see `mark_dirty`).
+        self.update_needed = False
+
+        # Everything sent during a step is written at the end of the step, once per connection.
+        self.send_batcher = SendBatcher([p.conn for p in self.players])
+
+        # Alerts are delivered on every step, independently of the state syncs.
+        self.alert_scheduler = MessageScheduler(
+            player_amt=len(self.players),
+            max_per_sec=WordGolfGame.MAX_ALERTS_PER_SEC,
+            burst=WordGolfGame.ALERT_BURST,
+        )
+
         self.command_reader = ClientCommandReader(
             connections=[p.conn for p in self.players],
             valid_cmd_prefixes=(
@@ -38,87 +67,67 @@ class WordGolfGame:
         
 
     def choose_words_for_game(self) -> list[str]:
-        WORD_DB_PATH = Path(__file__).parent / "word.db.txt"
-        
-        with open(WORD_DB_PATH, "r") as f:
-            words = f.read().split('\n')
-
         # Randomly choose 10 words.
-        chosen_words = random.sample(words, WordGolfGame.QUEUED_WORD_AMT)
-        return chosen_words
+        return get_word_dictionary().choose_words(WordGolfGame.QUEUED_WORD_AMT)
     
 
     def gen_feedback(self, actual_word: str, guess: str) -> str:
-        feedback = []
-
-        # These dictionaries are for implementing the 
-        # heuristics for marking an out of place letter as 
-        # wrong. 
-        # i.e. if the actual word is "HONEY" and the guess is "LINEN", then 
-        # the second 'N' has a feedback of X even though its in the word.
-        actual_letter_freq = {}
-        correct_guess_amt = {}
-
-        for i in range(len(actual_word)):
-            actual_letter_freq.setdefault(actual_word[i], 0)
-            # This is to make sure that `correct_guess_amt` has entries for 
-            # all the letters in the actual word.
-            correct_guess_amt.setdefault(actual_word[i], 0)
-            actual_letter_freq[actual_word[i]] += 1
-            
-            if guess[i] == actual_word[i]:
-                correct_guess_amt[guess[i]] += 1
-
-        for i in range(len(actual_word)):
-            # Correct letter guess.
-            if actual_word[i] == guess[i]:
-                feedback.append(f'O{guess[i]}')
-            
-            # Letter from guess is in the actual word, but in a different position.
-            # AND that there are still remaining "unguessed" occurrences of the letter 
-            # left. 
-            # NOTE: We need to query with `guess[i]` instead of `actual_word[i]`.
-            elif guess[i] in actual_word and correct_guess_amt[guess[i]] < actual_letter_freq[guess[i]]:
-                feedback.append(f'!{guess[i]}')
-
-            # Letter from guess is not in the actual word.
-            else:
-                feedback.append(f'X{guess[i]}')
-
-        return "".join(feedback)
+        """
+        Generates the feedback string of a guess, using the actual word's precomputed profile (see `word_golf/feedback.py`).
+        """
+        profile = get_word_dictionary().get_answer_profile(actual_word)
+        return feedback_code_to_str(profile.gen_feedback_code(guess), guess)
     
 
     def gen_feedback_history_cmd_for_player(self, player: WordGolfPlayer) -> str:
         return f"?feedback-history:{':'.join(player.feedback_history)}\\"
 
 
-    def send_feedback_history_to_player(self, player: WordGolfPlayer):
+    def queue_command(self, player_idx: int, cmd: str):
+        """
+        Queues a command to be sent to a player at the end of the current step.
+        """
+        self.send_batcher.queue(player_idx, encode_command(cmd, self.players[player_idx].protocol))
+
+
+    def mark_dirty(self, player_idx: int, section: WordGolfSyncSection):
+        """
+        Marks a section of the player's state as changed, so that it is sent with the next update.
+        """
+        self.players[player_idx].dirty_sections.add(section)
+
+
+    def mark_update_dirty(self):
+        """
+        Marks the points and queued word amounts as changed. Every player receives both their own and their opponent's.
+        """
+        for player_idx in range(len(self.players)):
+            self.mark_dirty(player_idx, 'update')
+
+
+    def send_feedback_history_to_player(self, player_idx: int):
         # Send the feedback history only to the current player.
-        feedback_hist_cmd = self.gen_feedback_history_cmd_for_player(player)
-        player.conn.sendall(feedback_hist_cmd.encode())
+        feedback_hist_cmd = self.gen_feedback_history_cmd_for_player(self.players[player_idx])
+        self.queue_command(player_idx, feedback_hist_cmd)
 
 
     def gen_stashed_words_cmd_for_player(self, player: WordGolfPlayer) -> str:
         return f"?stashed-words:{':'.join(player.stashed_words)}\\"
     
 
-    def send_stashed_words_to_player(self, player: WordGolfPlayer):
-        # Send the feedback history only to the current player.
-        feedback_hist_cmd = self.gen_stashed_words_cmd_for_player(player)
-        player.conn.sendall(feedback_hist_cmd.encode())
+    def send_stashed_words_to_player(self, player_idx: int):
+        # Send the stashed words only to the current player.
+        stashed_words_cmd = self.gen_stashed_words_cmd_for_player(self.players[player_idx])
+        self.queue_command(player_idx, stashed_words_cmd)
 
 
-    def add_alert_for_player(self, player_idx: int, alert_cmd_fields: list[str]):
+    def send_alert_to_player(self, player_idx: int, alert_cmd_fields: list[str]):
+        """
+        Schedules an alert for the player. It is sent at the end of the current step (after the step's updates), 
+        unless the player is over their alert budget.
+        """
         alert_cmd = f"?alert:{':'.join(alert_cmd_fields)}\\"
-        self.players[player_idx].pending_alerts.append(alert_cmd)
-
-
-    def send_pending_alert_to_player(self, player: WordGolfPlayer):
-        if len(player.pending_alerts) == 0:
-            return
-        
-        oldest_alert_cmd = player.pending_alerts.popleft()
-        player.conn.sendall(oldest_alert_cmd.encode())
+        self.alert_scheduler.schedule(player_idx, alert_cmd)
 
 
     def get_player_opponent_idx(self, player_idx: int) -> int:
@@ -128,158 +137,229 @@ class WordGolfGame:
         return (player_idx + 1) % 2
 
     
-    def run(self):
+    def start(self):
+        """
+        Starts the game by syncing the initial state with both players.
+        """
+        for player in self.players:
+            player.dirty_sections.update(ALL_WORD_GOLF_SYNC_SECTIONS)
+
+        self.send_updates()
+        self.send_batcher.flush()
+
+
+    def abort(self):
         """
-        Runs the given game.
+        Abruptly ends the game (i.e. when a player disconnects).
         """
-        try:
-            self.run_main_game_loop()
+        self.is_running = False
+        self.result = WordGolfGameResult(winner_username=None, abrupt_end=True)
+
 
-        # End the game if a connection error occurs.
-        except ConnectionResetError:
-            self.result = WordGolfGameResult(winner_username=None, abrupt_end=True)
-            pass
+    def is_over(self) -> bool:
+        return not self.is_running
 
+
+    def end(self):
+        """
+        Sends the game over message to both players.
+        """
         # Game ended.
         print("LOG: Word Golf game ended")
 
-        for player in self.players:
-            # The result of the game must have been determined already.
-            assert self.result
+        alert_stats = self.alert_scheduler.get_total_stats()
+        print(f"LOG: Word Golf alerts: {alert_stats.delivered} delivered, {alert_stats.get_average_latency_secs() * 1000:.2f} ms average latency, {alert_stats.max_latency_secs * 1000:.2f} ms max latency")
 
-            try:
-                # There is a winner.
-                if self.result.winner_username is not None:
-                    player.conn.sendall(f"?game-over:word_golf:winner-determined:{self.result.winner_username}\\".encode())
+        # The result of the game must have been determined already.
+        assert self.result
 
-                # The game abruptly ended before finishing normally.
-                elif self.result.abrupt_end:
-                    player.conn.sendall("?game-over:word_golf:abrupt-end\\".encode())
+        for player_idx in range(len(self.players)):
+            # There is a winner.
+            if self.result.winner_username is not None:
+                self.queue_command(player_idx, f"?game-over:word_golf:winner-determined:{self.result.winner_username}\\")
 
-                # Since the winner is None, but there wasn't an abrupt end, that means that 
-                # there was a tie.
-                else:
-                    player.conn.sendall("?game-over:word_golf:tie\\".encode())
+            # The game abruptly ended before finishing normally.
+            elif self.result.abrupt_end:
+                self.queue_command(player_idx, "?game-over:word_golf:abrupt-end\\")
 
-            # Do not bother trying to send a game over message if the client's socket is disconnected.
-            except ConnectionResetError: pass
+            # Since the winner is None, but there wasn't an abrupt end, that means that 
+            # there was a tie.
+            else:
+                self.queue_command(player_idx, "?game-over:word_golf:tie\\")
 
+        self.send_batcher.flush_final()
 
-    def run_main_game_loop(self):
+
+    def send_updates(self):
         """
-        Runs the main part of the game loop.
+        Sends updates to each player to sync state. Only the sections of the state that changed since they
+        were last sent are included.
         """
-        while self.is_running:
-            # Send updates to each player to sync state.
-            for curr_idx in range(len(self.players)):
-                # The index of the player that is not the "current" player.
-                other_idx = (curr_idx + 1) % 2
+        for curr_idx in range(len(self.players)):
+            dirty_sections = self.players[curr_idx].dirty_sections
+
+            if 'update' in dirty_sections:
+                self.send_update_to_player(curr_idx)
 
-                curr_points = self.players[curr_idx].points
-                curr_queued_word_amt = len(self.players[curr_idx].queued_words)
+            if 'feedback_history' in dirty_sections:
+                self.send_feedback_history_to_player(curr_idx)
 
-                other_points = self.players[other_idx].points
-                other_queued_word_amt = len(self.players[other_idx].queued_words)
+            if 'stashed_words' in dirty_sections:
+                self.send_stashed_words_to_player(curr_idx)
 
-                data = f"?update:{curr_points}:{curr_queued_word_amt}:{other_points}:{other_queued_word_amt}\\"
+            dirty_sections.clear()
 
-                self.players[curr_idx].conn.sendall(data.encode())
 
-                self.send_feedback_history_to_player(self.players[curr_idx])
+    def send_update_to_player(self, curr_idx: int):
+        """
+        Sends the player's and their opponent's points and queued word amounts.
+        """
+        # The index of the player that is not the "current" player.
+        other_idx = self.get_player_opponent_idx(curr_idx)
+
+        curr_points = self.players[curr_idx].points
+        curr_queued_word_amt = len(self.players[curr_idx].queued_words)
+
+        other_points = self.players[other_idx].points
+        other_queued_word_amt = len(self.players[other_idx].queued_words)
+
+        data = f"?update:{curr_points}:{curr_queued_word_amt}:{other_points}:{other_queued_word_amt}\\"
 
-                self.send_stashed_words_to_player(self.players[curr_idx])
+        self.queue_command(curr_idx, data)
 
-                # This has an in-built delay that only triggers when there are 
-                # pending alerts.
-                self.send_pending_alert_to_player(self.players[curr_idx])
 
-            # Receive data from both players until the game determines that client-state needs 
-            # to be updated (by setting `update_needed = True`).
-            update_needed = False
-            while not update_needed:
-                for curr_idx in range(len(self.players)):
-                    # The index of the player that is not the "current" player.
-                    other_idx = self.get_player_opponent_idx(curr_idx)
+    def on_input(self, curr_idx: int, player_cmd: str):
+        """
+        Handles a single command sent by the player at `curr_idx`.
+        """
+        if not self.is_running:
+            return
 
-                    # Based on what this returns, decide whether to update the client's state.
-                    occurrence = self.handle_player_client_response(curr_idx)
+        # Based on what this returns, decide whether to update the client's state.
+        occurrence = self.handle_player_client_response(curr_idx, player_cmd)
 
-                    if occurrence is not None:
-                        self.manage_occurrence_after_player_action(occurrence)
-                        update_needed = True
+        if occurrence is not None:
+            self.manage_occurrence_after_player_action(occurrence)
+            self.update_needed = True
 
-                # Stop trying to read player data if the game stopped running.
-                if not self.is_running:
-                    # TODO: after this, the players don't receive updates.
-                    # ^^^ this is likely to cause problems so it's a good idea to send 
-                    # out one last update before ending the game
-                    break
 
+    def step(self, now: float) -> float | None:
+        """
+        Syncs the client-state if any occurrence changed it since the last step and delivers the scheduled alerts. 
+        Returns when the next alert that is over its player's budget can be sent (or when the data that a slow 
+        client could not take yet should be retried), or `None` if there is none (i.e. only step again after input).
+        """
+        # TODO: after the game stops running, the players don't receive updates.
+        # ^^^ this is likely to cause problems so it's a good idea to send 
+        # out one last update before ending the game
+        if self.update_needed and self.is_running:
+            self.send_updates()
 
-    def handle_player_client_response(self, curr_player_idx: int) -> WordGolfOccurrence | None:
-        for player_cmd in self.command_reader.yield_commands(curr_player_idx):
-            if player_cmd.startswith("!guess"):
-                fields = player_cmd.split(':')
-                guess = fields[1].upper()
+        self.update_needed = False
 
-                if guess in self.players[curr_player_idx].already_guessed_words:
-                    print(f"LOG: Player #{curr_player_idx} has already tried guessing: '{guess}'")
-                    return None
-                
-                # Mark the guessed word as already guessed (for avoiding re-sending the same word).
-                self.players[curr_player_idx].already_guessed_words.add(guess)
+        # Alerts go after the updates, since the client clears its alerts when it receives an update.
+        alert_due_at = self.alert_scheduler.deliver(now, self.queue_command)
 
-                # Get the actual word that the player needs to guess.
-                actual_word = self.players[curr_player_idx].queued_words[-1]
+        # Everything that was queued during this step goes out in a single write per connection.
+        self.send_batcher.flush()
 
-                print(f"LOG: received guess '{guess}'; actual word was '{actual_word}'")
+        # The alerts' latency runs until they are written, which is later for the clients with a backlog.
+        written_at = time.perf_counter()
 
-                occurence: WordGolfOccurrence | None = None
+        for player_idx in range(len(self.players)):
+            if not self.send_batcher.has_backlog(player_idx):
+                self.alert_scheduler.record_written(player_idx, written_at)
 
-                feedback = self.gen_feedback(actual_word, guess)
+        return self.send_batcher.limit_deadline(now, alert_due_at)
 
-                if actual_word == guess:
-                    occurence = WordGolfOccurrence(kind='correct_guess', player_idx=curr_player_idx)
-                else:
-                    occurence = WordGolfOccurrence(kind='wrong_guess', player_idx=curr_player_idx)
 
-                # Save the feedback on the player's feedback history.
-                self.players[curr_player_idx].feedback_history.append(feedback)
+    def handle_player_client_response(self, curr_player_idx: int, player_cmd: str) -> WordGolfOccurrence | None:
+        if player_cmd.startswith("!guess"):
+            fields = player_cmd.split(':')
+            guess = fields[1].upper() if len(fields) > 1 else ''
 
-                if len(self.players[curr_player_idx].feedback_history) == WordGolfGame.MAX_FEEDBACK_HIST_LEN:
-                    if occurence.kind != 'correct_guess':
-                        occurence = WordGolfOccurrence(kind='ran_out_of_guesses', player_idx=curr_player_idx)
+            # Get the actual word that the player needs to guess.
+            actual_word = self.players[curr_player_idx].queued_words[-1]
 
-                return occurence
+            # Reject invalid guesses before changing any state.
+            invalid_reason = self.get_invalid_guess_reason(actual_word, guess)
+
+            if invalid_reason is not None:
+                print(f"LOG: Player #{curr_player_idx} made an invalid guess '{guess}' ({invalid_reason})")
+                self.send_alert_to_player(curr_player_idx, ["invalid-guess", invalid_reason, guess])
+                return None
+
+            if guess in self.players[curr_player_idx].already_guessed_words:
+                print(f"LOG: Player #{curr_player_idx} has already tried guessing: '{guess}'")
+                return None
             
-            elif player_cmd.startswith("!send-stashed-word"):
-                fields = player_cmd.split(':')
-                stashed_word_to_send = fields[1]
-
-                # Player is trying to send a word that they do not have stashed.
-                if stashed_word_to_send not in self.players[curr_player_idx].stashed_words:
-                    print(f"LOG: Player #{curr_player_idx} is trying to send word '{stashed_word_to_send}' that they do not have stashed.")
-                    return None
-                
-                # Remove the word from the stash.
-                self.players[curr_player_idx].stashed_words.remove(stashed_word_to_send)
-
-                occurence = WordGolfOccurrence(
-                    kind='sending_stashed_word',
-                    player_idx=curr_player_idx,
-                    stashed_word=stashed_word_to_send,
-                )
-                return occurence
+            # Mark the guessed word as already guessed (for avoiding re-sending the same word).
+            self.players[curr_player_idx].already_guessed_words.add(guess)
+
+            print(f"LOG: received guess '{guess}'; actual word was '{actual_word}'")
+
+            occurence: WordGolfOccurrence | None = None
+
+            feedback = self.gen_feedback(actual_word, guess)
 
+            if actual_word == guess:
+                occurence = WordGolfOccurrence(kind='correct_guess', player_idx=curr_player_idx)
             else:
-                print(f"ERROR: Invalid client response '{player_cmd}'")
-                return None # unknown command from client
+                occurence = WordGolfOccurrence(kind='wrong_guess', player_idx=curr_player_idx)
+
+            # Save the feedback on the player's feedback history.
+            self.players[curr_player_idx].feedback_history.append(feedback)
+            self.mark_dirty(curr_player_idx, 'feedback_history')
+
+            if len(self.players[curr_player_idx].feedback_history) == WordGolfGame.MAX_FEEDBACK_HIST_LEN:
+                if occurence.kind != 'correct_guess':
+                    occurence = WordGolfOccurrence(kind='ran_out_of_guesses', player_idx=curr_player_idx)
+
+            return occurence
+        
+        elif player_cmd.startswith("!send-stashed-word"):
+            fields = player_cmd.split(':')
+            stashed_word_to_send = fields[1]
+
+            # Player is trying to send a word that they do not have stashed.
+            if stashed_word_to_send not in self.players[curr_player_idx].stashed_words:
+                print(f"LOG: Player #{curr_player_idx} is trying to send word '{stashed_word_to_send}' that they do not have stashed.")
+                return None
+            
+            # Remove the word from the stash.
+            self.players[curr_player_idx].stashed_words.remove(stashed_word_to_send)
+            self.mark_dirty(curr_player_idx, 'stashed_words')
+
+            occurence = WordGolfOccurrence(
+                kind='sending_stashed_word',
+                player_idx=curr_player_idx,
+                stashed_word=stashed_word_to_send,
+            )
+            return occurence
+
+        else:
+            print(f"ERROR: Invalid client response '{player_cmd}'")
+            return None # unknown command from client
+
+
+    def get_invalid_guess_reason(self, actual_word: str, guess: str) -> InvalidGuessReason | None:
+        """
+        Returns why a guess is invalid, or `None` if it is a valid guess. Both checks are constant time.
+        """
+        if len(guess) != len(actual_word):
+            return 'wrong-length'
+        
+        if guess not in get_word_dictionary():
+            return 'not-a-word'
+        
+        return None
 
 
     def manage_occurrence_after_player_action(self, occurrence: WordGolfOccurrence):
         if occurrence.kind == 'wrong_guess':
             print(f"LOG: Player #{occurrence.player_idx} guesses the wrong word (+1 point)")
             self.players[occurrence.player_idx].points += 1
+            self.mark_update_dirty()
 
         elif occurrence.kind == 'correct_guess':
             print(f"LOG: Player #{occurrence.player_idx} correctly guessed their word (-5 points)")
@@ -287,12 +367,14 @@ class WordGolfGame:
             # Remove points from the player. Clamps to 0 if the result is negative.
             curr_pts = self.players[occurrence.player_idx].points
             self.players[occurrence.player_idx].points = max(curr_pts - 5, 0)
+            self.mark_update_dirty()
 
             self.switch_player_current_word(occurrence)
 
         elif occurrence.kind == 'ran_out_of_guesses':
             print(f"LOG: Player #{occurrence.player_idx} ran out of guesses (+3 points)")
             self.players[occurrence.player_idx].points += 3
+            self.mark_update_dirty()
 
             self.switch_player_current_word(occurrence)
 
@@ -306,9 +388,10 @@ class WordGolfGame:
 
             # Add the stashed word to the start of the queue.
             self.players[opponent_idx].queued_words.insert(0, occurrence.stashed_word)
+            self.mark_update_dirty()
 
             # Add an alert notifying the opponent of the received stashed word.
-            self.add_alert_for_player(opponent_idx, ["received-word"])
+            self.send_alert_to_player(opponent_idx, ["received-word"])
 
         else:
             print(f"ERROR: unhandled occurence kind '{occurrence.kind}'")
@@ -320,6 +403,7 @@ class WordGolfGame:
         # Reset the 'already guessed words' set and the feedback history.
         curr_player.already_guessed_words = set()
         curr_player.feedback_history = []
+        self.mark_dirty(player_idx, 'feedback_history')
 
 
     def switch_player_current_word(self, occurrence: WordGolfOccurrence):
@@ -329,6 +413,7 @@ class WordGolfGame:
 
         if len(self.players[player_idx].queued_words) > 1:
             guessed_word = self.players[player_idx].queued_words.pop()
+            self.mark_update_dirty()
             print(f"LOG: Player '{self.players[player_idx].username}' is no longer guessing '{guessed_word}' now their word is '{self.players[player_idx].queued_words[-1]}'")
             
             if guessed_word not in self.already_solved_words:
@@ -339,6 +424,7 @@ class WordGolfGame:
                 # added to their stash.
                 if occurrence.kind == 'correct_guess':
                     self.players[player_idx].stashed_words.add(guessed_word)
+                    self.mark_dirty(player_idx, 'stashed_words')
 
         # The current player has run out of queued words.
         else:
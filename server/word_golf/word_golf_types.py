@@ -1,7 +1,11 @@
 from dataclasses import dataclass, field
 from typing import Literal
-from server_types import Connection
-from collections import deque
+from server_types import Connection, WireProtocol
+
+# The parts of a player's state that are synced with their client (each one with its own command).
+WordGolfSyncSection = Literal['update', 'feedback_history', 'stashed_words']
+
+ALL_WORD_GOLF_SYNC_SECTIONS: set[WordGolfSyncSection] = {'update', 'feedback_history', 'stashed_words'}
 
 @dataclass
 class WordGolfPlayer:
@@ -19,8 +23,17 @@ class WordGolfPlayer:
 
     stashed_words: set[str] = field(default_factory=lambda: set())
 
-    pending_alerts: deque[str] = field(default_factory=lambda: deque())
+    # The sections that changed since they were last sent to the player.
+    dirty_sections: set[WordGolfSyncSection] = field(default_factory=lambda: set())
+
+    protocol: WireProtocol = 'text'
+
+    # Whether the client answers the server's pings while waiting for an opponent.
+    heartbeat: bool = False
+
 
+# Sent with the `invalid-guess` alert.
+InvalidGuessReason = Literal['wrong-length', 'not-a-word']
 
 @dataclass
 class WordGolfOccurrence: